@@ -0,0 +1,128 @@
+import os
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from catboost import CatBoostClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from AI_MITRE.Catboost.inference.engine import MitreEngine
+from AI_MITRE.Catboost.inference.tactic_predictor import TacticPredictor
+from AI_MITRE.Catboost.inference.technique_predictor import TechniquePredictor
+from AI_MITRE.Catboost.preprocessing.normalize_elastic import normalize_elastic_log
+from scripts.benchmark_mitre import synthetic_hits
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catboost", "models")
+TECHNIQUE_MODEL = os.path.join(MODELS_DIR, "catboost_technique_model.cbm")
+TECHNIQUE_ENCODER = os.path.join(MODELS_DIR, "label_encoder_technique.pkl")
+
+
+# ===== Models (dùng chung cho test engine) =====
+@pytest.fixture(scope="session")
+def technique():
+    if not (os.path.isfile(TECHNIQUE_MODEL) and os.path.isfile(TECHNIQUE_ENCODER)):
+        pytest.skip("technique model not found")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return TechniquePredictor(TECHNIQUE_MODEL, TECHNIQUE_ENCODER)
+
+
+def train_tiny_model(out_dir, name: str, X: pd.DataFrame, y, cat_features):
+    """
+    Model CatBoost nhỏ (vài giây) + LabelEncoder, lưu vào out_dir
+    """
+    encoder = LabelEncoder().fit(y)
+    model = CatBoostClassifier(iterations=30, depth=4, verbose=False, allow_writing_files=False, random_seed=7)
+    model.fit(X, encoder.transform(y), cat_features=cat_features)
+
+    model_path = os.path.join(str(out_dir), f"catboost_{name}_model.cbm")
+    encoder_path = os.path.join(str(out_dir), f"label_encoder_{name}.pkl")
+    model.save_model(model_path)
+    joblib.dump(encoder, encoder_path)
+    return model_path, encoder_path
+
+
+@pytest.fixture(scope="session")
+def train_model():
+    return train_tiny_model
+
+
+@pytest.fixture(scope="session")
+def feature_frame(technique):
+    """
+    Feature (schema model technique) của 400 hit tổng hợp -> train model nhỏ
+    """
+    hits = synthetic_hits(400, repeat_ratio=0.0, seed=7)
+    rows = technique.schema.build_rows([normalize_elastic_log(hit) for hit in hits])
+    return pd.DataFrame(rows, columns=technique.feature_names)
+
+
+@pytest.fixture(scope="session")
+def tactic_files(technique, feature_frame, tmp_path_factory):
+    """
+    Model tactic nhỏ train trên hit tổng hợp, cùng schema với model technique
+    (repo không kèm file model tactic)
+    """
+    X = feature_frame
+
+    # tactic có / không có technique hợp lệ -> có cả 2 nhánh combine
+    mask = technique.tactic_mask
+    mapped = [t for t in mask.tactics if mask.matrix[mask.tactic_index[t]].any()]
+    labels = mapped[:3] + ["Unmapped Tactic"]
+    y = np.random.default_rng(7).choice(labels, size=len(X))
+
+    return train_tiny_model(tmp_path_factory.mktemp("tactic_model"), "tactic", X, y, technique.cat_features)
+
+
+@pytest.fixture(scope="session")
+def tactic(tactic_files):
+    return TacticPredictor(*tactic_files)
+
+
+@pytest.fixture(scope="session")
+def hits():
+    return synthetic_hits(120, repeat_ratio=0.5, seed=11)
+
+
+@pytest.fixture
+def make_engine(tactic, technique):
+    def make(**kwargs):
+        return MitreEngine(tactic_predictor=tactic, technique_predictor=technique, **kwargs)
+    return make
+
+
+@pytest.fixture
+def assert_same_results():
+    """
+    So sánh 2 list result dict (float so gần đúng)
+    """
+    def check(actual, expected):
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            if e is None:
+                assert a is None
+                continue
+            assert a.keys() == e.keys()
+            for key in a:
+                if isinstance(e[key], float):
+                    assert a[key] == pytest.approx(e[key], rel=1e-6)
+                else:
+                    assert a[key] == e[key]
+    return check
+
+
+@pytest.fixture
+def registry(tactic_files, technique, tmp_path):
+    """
+    Registry tạm: tactic "t1" + technique "k1" (ACTIVE)
+    """
+    from AI_MITRE.Catboost.inference.model_registry import ModelRegistry
+
+    reg = ModelRegistry(str(tmp_path / "registry"))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        reg.register("tactic", *tactic_files, version="t1", activate=True)
+        reg.register("technique", TECHNIQUE_MODEL, TECHNIQUE_ENCODER, version="k1", activate=True)
+    return reg
@@ -0,0 +1,157 @@
+import copy
+import os
+
+import pytest
+
+import AI_MITRE.Catboost.training.build_dataset as build_dataset
+from AI_MITRE.Catboost.training.build_dataset import LABEL_COL, PARTS_DIR, DatasetBuilder
+
+HEADER = "conn_state,duration,history,src_port_zeek,dest_port_zeek,orig_bytes,resp_bytes," \
+         "orig_pkts,resp_pkts,proto,service,ts,label_tactic,label_technique\n"
+
+
+def _row(i: int, tactic: str = "Reconnaissance", technique: str = "T1595") -> str:
+    return f"S0,0.{i},S,{40000 + i},80,{i},0,1,0,tcp,http,{1735000000 + i},{tactic},{technique}\n"
+
+
+def _write(path, rows, mode="w"):
+    with open(path, mode, encoding="utf-8") as f:
+        if mode == "w":
+            f.write(HEADER)
+        f.writelines(rows)
+
+
+def _parts(out_dir):
+    return sorted(os.listdir(os.path.join(out_dir, PARTS_DIR)))
+
+
+# ===== Append =====
+def test_append_only_reads_new_rows(tmp_path):
+    src = tmp_path / "conn.csv"
+    out = str(tmp_path / "dataset")
+    _write(src, [_row(i) for i in range(5)])
+
+    builder = DatasetBuilder(out)
+    stats = builder.update([str(src)])
+    assert stats["read"] == 5
+    assert stats["added"] == 5
+
+    # file không đổi -> bỏ qua
+    assert builder.update([str(src)])["read"] == 0
+
+    # append 3 dòng + 1 dòng chưa hoàn chỉnh (đang ghi dở)
+    with open(src, "a", encoding="utf-8") as f:
+        f.writelines([_row(i, "Execution", "T1059") for i in range(5, 8)])
+        f.write("S0,0.9,S,40009")
+    stats = DatasetBuilder(out).update([str(src)])
+    assert stats["read"] == 3
+    assert stats["added"] == 3
+
+    builder = DatasetBuilder(out)
+    df = builder.load()
+    assert len(df) == 8
+    assert builder.manifest["rows"] == 8
+    assert builder.manifest["class_counts"] == {"Reconnaissance": 5, "Execution": 3}
+    assert df[LABEL_COL].tolist() == ["Reconnaissance"] * 5 + ["Execution"] * 3
+
+
+def test_unlabeled_rows_are_dropped(tmp_path):
+    src = tmp_path / "conn.csv"
+    _write(src, [_row(0), _row(1, "none", "none"), _row(2, "", "")])
+
+    stats = DatasetBuilder(str(tmp_path / "dataset")).update([str(src)])
+    assert stats["read"] == 3
+    assert stats["labeled"] == 1
+    assert stats["added"] == 1
+
+
+# ===== Dedupe =====
+def test_dedupe_within_batch_and_across_runs(tmp_path):
+    out = str(tmp_path / "dataset")
+    a = tmp_path / "a.csv"
+    b = tmp_path / "b.csv"
+    _write(a, [_row(0), _row(1), _row(1)])
+
+    stats = DatasetBuilder(out).update([str(a)])
+    assert stats["duplicates"] == 1
+    assert stats["added"] == 2
+
+    # file khác, trùng dòng đã có -> chỉ dòng mới được thêm (sau khi mở lại builder)
+    _write(b, [_row(0), _row(1), _row(2)])
+    stats = DatasetBuilder(out).update([str(b)])
+    assert stats["duplicates"] == 2
+    assert stats["added"] == 1
+    assert len(DatasetBuilder(out).load()) == 3
+
+
+def test_dedupe_with_legacy_part_without_hash_file(tmp_path):
+    out = str(tmp_path / "dataset")
+    a = tmp_path / "a.csv"
+    _write(a, [_row(0), _row(1)])
+    DatasetBuilder(out).update([str(a)])
+
+    # part cũ (trước khi có file hash) -> hash tính lại từ Parquet
+    for name in _parts(out):
+        if name.endswith(build_dataset.HASHES_SUFFIX):
+            os.remove(os.path.join(out, PARTS_DIR, name))
+
+    b = tmp_path / "b.csv"
+    _write(b, [_row(1), _row(2)])
+    stats = DatasetBuilder(out).update([str(b)])
+    assert stats["duplicates"] == 1
+    assert stats["added"] == 1
+
+
+# ===== Crash recovery =====
+def test_crash_before_manifest_is_recovered(tmp_path, monkeypatch):
+    out = str(tmp_path / "dataset")
+    src = tmp_path / "conn.csv"
+    _write(src, [_row(i) for i in range(3)])
+    DatasetBuilder(out).update([str(src)])
+
+    _write(src, [_row(i) for i in range(3, 6)], mode="a")
+    builder = DatasetBuilder(out)
+    manifest_before = copy.deepcopy(builder.manifest)
+
+    # part + hash đã ghi, manifest chưa ghi
+    def crash(path, data):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(build_dataset, "_write_json_atomic", crash)
+        with pytest.raises(OSError):
+            builder.update([str(src)])
+
+    assert builder.manifest == manifest_before
+    assert len(_parts(out)) == 4
+
+    # mở lại: part lạ bị xoá, source đọc lại từ offset cũ
+    builder = DatasetBuilder(out)
+    assert len(_parts(out)) == 2
+    stats = builder.update([str(src)])
+    assert stats["read"] == 3
+    assert stats["added"] == 3
+
+    df = DatasetBuilder(out).load()
+    assert len(df) == 6
+    assert not df.duplicated().any()
+
+
+def test_failed_update_keeps_builder_usable(tmp_path, monkeypatch):
+    out = str(tmp_path / "dataset")
+    src = tmp_path / "conn.csv"
+    _write(src, [_row(i) for i in range(3)])
+    builder = DatasetBuilder(out)
+
+    def crash(path, data):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(build_dataset, "_write_json_atomic", crash)
+        with pytest.raises(OSError):
+            builder.update([str(src)])
+
+    # cùng instance, lỗi đã hết -> dòng không bị coi là trùng
+    stats = builder.update([str(src)])
+    assert stats["added"] == 3
+    assert len(DatasetBuilder(out).load()) == 3
@@ -0,0 +1,74 @@
+import numpy as np
+
+from AI_MITRE.Catboost.inference.combine_rule import (
+    TacticTechniqueMask,
+    combine_tactic_technique,
+    combine_tactic_technique_batch,
+    mask_for_labels,
+)
+
+# ===== Mapping / labels giả (không phụ thuộc file mapping thật) =====
+MAPPING = {
+    "Reconnaissance": ["T1595", "T1592"],
+    "Execution": ["T1059"],
+    "Exfiltration": ["T1041", "T9999"],  # T9999 không có trong labels
+    "Impact": [],
+}
+LABELS = ["T1595", "T1592", "T1059", "T1041"]
+
+
+def test_mask_matrix_follows_label_order():
+    mask = TacticTechniqueMask(LABELS, MAPPING)
+
+    assert mask.matrix.shape == (len(MAPPING) + 1, len(LABELS))
+    assert mask.matrix[mask.tactic_index["Reconnaissance"]].tolist() == [True, True, False, False]
+    assert mask.matrix[mask.tactic_index["Impact"]].tolist() == [False] * 4
+    # hàng cuối: tactic không có mapping
+    assert not mask.matrix[-1].any()
+
+
+def test_single_technique():
+    mask = TacticTechniqueMask(LABELS, MAPPING)
+    # Exfiltration chỉ còn T1041 sau khi lọc theo labels
+    assert mask.single_technique == {"Execution": "T1059", "Exfiltration": "T1041"}
+
+
+def test_rows_for_unknown_tactic():
+    mask = TacticTechniqueMask(LABELS, MAPPING)
+    rows = mask.rows_for(["Execution", "Unknown", "Execution"])
+    assert rows.shape == (3, len(LABELS))
+    assert rows[0].tolist() == [False, False, True, False]
+    assert not rows[1].any()
+    assert (rows[0] == rows[2]).all()
+
+
+def test_batch_masked_argmax():
+    mask = TacticTechniqueMask(LABELS, MAPPING)
+    probs = np.array([
+        [0.10, 0.20, 0.60, 0.10],  # Recon: T1059 cao nhất nhưng không hợp lệ -> T1592
+        [0.50, 0.20, 0.20, 0.10],  # Execution -> T1059
+        [0.25, 0.25, 0.25, 0.25],  # Impact: không technique hợp lệ -> None
+        [0.40, 0.30, 0.20, 0.10],  # tactic lạ -> None
+    ])
+    tactics = ["Reconnaissance", "Execution", "Impact", "Unknown"]
+
+    assert combine_tactic_technique_batch(tactics, probs, mask) == ["T1592", "T1059", None, None]
+    assert combine_tactic_technique_batch([], np.empty((0, 4)), mask) == []
+
+
+def test_single_row_matches_batch():
+    mask = mask_for_labels(tuple(LABELS))
+    tactics = list(mask.tactics[:5])
+    probs = np.random.default_rng(0).random((len(tactics), len(LABELS)))
+
+    batch = combine_tactic_technique_batch(tactics, probs, mask)
+    single = [combine_tactic_technique(t, p.tolist(), LABELS) for t, p in zip(tactics, probs)]
+    assert batch == single
+    assert combine_tactic_technique("Reconnaissance", [], LABELS) is None
+
+
+def test_mask_for_labels_is_cached():
+    mask_for_labels.cache_clear()
+    first = mask_for_labels(tuple(LABELS))
+    assert mask_for_labels(tuple(LABELS)) is first
+    assert mask_for_labels.cache_info().hits == 1
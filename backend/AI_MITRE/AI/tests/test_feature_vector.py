@@ -0,0 +1,67 @@
+import numpy as np
+from catboost import FeaturesData, Pool
+
+from AI_MITRE.Catboost.preprocessing.feature_vector import FeatureSchema, row_count
+from AI_MITRE.Catboost.preprocessing.normalize_elastic import normalize_elastic_log
+
+# giá trị "khó": None / NaN / inf / bool / số lẫn str
+ODD_VALUES = [None, "", "nan", "None", float("nan"), float("inf"), -1, 0, 1, 1.0, True, False, "tcp", "80"]
+
+
+def _list_pool(predictor, rows):
+    # đường cũ: Pool từ list-of-lists + feature_names / cat_features
+    return Pool(data=rows, feature_names=predictor.feature_names, cat_features=predictor.cat_features)
+
+
+def _rows(predictor, hits):
+    features = [normalize_elastic_log(hit) for hit in hits]
+    # mỗi giá trị lạ: 1 event có giá trị đó ở mọi feature
+    features += [{fname: value for fname in predictor.feature_names} for value in ODD_VALUES]
+    return predictor.schema.build_rows(features)
+
+
+def _assert_identical(predictor, hits):
+    rows = _rows(predictor, hits)
+    data = predictor.schema.encode(rows)
+    assert isinstance(data, FeaturesData)
+    assert row_count(data) == row_count(rows) == len(rows)
+
+    expected = predictor.model.predict_proba(_list_pool(predictor, rows))
+    actual = predictor.model.predict_proba(Pool(data=data))
+
+    # byte-identical, không phải gần đúng
+    assert actual.dtype == expected.dtype
+    assert actual.tobytes() == expected.tobytes()
+
+
+# ===== FeaturesData vs Pool(list) =====
+def test_technique_features_data_matches_list_pool(technique, hits):
+    _assert_identical(technique, hits)
+
+
+def test_tactic_features_data_matches_list_pool(tactic, hits):
+    _assert_identical(tactic, hits)
+
+
+def test_build_row_types(technique):
+    schema = technique.schema
+    row = schema.build_row({fname: value for fname, value in zip(schema.feature_names, ODD_VALUES * 10)})
+    for fname, value in zip(schema.feature_names, row):
+        assert isinstance(value, str if fname in schema.cat_features else float)
+
+
+def test_cat_value_cache_keeps_type():
+    schema = FeatureSchema(["proto", "port"], ["proto"])
+    # lần 1 (miss) và lần 2 (hit) cho cùng kết quả
+    first = [schema._cat_value(v) for v in ODD_VALUES]
+    assert [schema._cat_value(v) for v in ODD_VALUES] == first
+
+    # 1 / 1.0 / True hash bằng nhau nhưng str() khác nhau
+    assert (schema._cat_value(1), schema._cat_value(1.0), schema._cat_value(True)) == ("1", "1.0", "True")
+    assert schema._cat_value(None) == schema._cat_value("nan") == schema._cat_value("") == "unknown"
+
+
+def test_encode_empty_batch(technique):
+    data = technique.schema.encode([])
+    assert row_count(data) == 0
+    assert np.asarray(technique.predict_rows([])).size == 0
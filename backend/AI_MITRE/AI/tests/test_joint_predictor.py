@@ -0,0 +1,111 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from AI_MITRE.Catboost.inference.engine import MitreEngine
+from AI_MITRE.Catboost.inference.joint_predictor import (
+    JOINT_LABEL_SEP,
+    JointPredictor,
+    joint_label,
+    mapping_pairs,
+    split_joint_label,
+)
+from AI_MITRE.Catboost.preprocessing.normalize_elastic import normalize_elastic_log
+
+MAPPING = {
+    "Credential Access": ["T1110", "T1040"],
+    "Initial Access": ["T1190"],
+    "Reconnaissance": ["T1595", "T1592"],
+}
+
+
+# ===== Label cặp =====
+def test_joint_label_roundtrip():
+    label = joint_label("Credential Access", "T1110")
+    assert label == f"Credential Access{JOINT_LABEL_SEP}T1110"
+    assert split_joint_label(label) == ("Credential Access", "T1110")
+
+
+def test_mapping_pairs_split_back_to_mapping():
+    pairs = mapping_pairs(MAPPING)
+    assert len(pairs) == 5
+
+    split = [split_joint_label(p) for p in pairs]
+    assert {(tactic, tech) for tactic, techs in MAPPING.items() for tech in techs} == set(split)
+
+
+# ===== Model joint nhỏ =====
+@pytest.fixture(scope="session")
+def joint_files(technique, feature_frame, train_model, tmp_path_factory):
+    y = np.random.default_rng(3).choice(mapping_pairs(MAPPING), size=len(feature_frame))
+    return train_model(tmp_path_factory.mktemp("joint_model"), "joint", feature_frame, y, technique.cat_features)
+
+
+@pytest.fixture(scope="session")
+def joint(joint_files):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return JointPredictor(*joint_files)
+
+
+def test_joint_predictions_split_into_valid_pairs(joint, hits):
+    assert set(zip(joint.tactics, joint.techniques)) == {
+        split_joint_label(p) for p in mapping_pairs(MAPPING)
+    }
+
+    predictions = joint.predict_batch([normalize_elastic_log(hit) for hit in hits])
+    assert len(predictions) == len(hits)
+    for tactic, tactic_conf, technique, pair_conf in predictions:
+        assert technique in MAPPING[tactic]
+        # tactic_conf = tổng prob các cặp cùng tactic >= prob cặp được chọn
+        assert tactic_conf >= pair_conf - 1e-12
+        assert 0.0 < pair_conf <= tactic_conf <= 1.0 + 1e-12
+
+
+def test_tactic_conf_is_sum_of_pair_probs(joint, hits):
+    rows = joint.schema.build_rows([normalize_elastic_log(hit) for hit in hits[:10]])
+    probs = joint.model.predict_proba(joint._build_pool(rows))
+
+    for p, (tactic, tactic_conf, _, pair_conf) in zip(probs, joint.predict_rows(rows)):
+        assert pair_conf == pytest.approx(p.max())
+        assert tactic_conf == pytest.approx(p[joint.tactics == tactic].sum())
+
+
+# ===== Engine: joint vs cascade =====
+def test_engine_joint_mode_ignores_cascade(joint, hits):
+    engine = MitreEngine(joint_predictor=joint, cascade=True, min_tactic_conf=0.99)
+    assert engine.joint
+    assert not engine.cascade
+    assert engine.tactic_predictor is None and engine.technique_predictor is None
+
+    for result in engine.process_batch(hits):
+        # joint: cặp luôn khớp mapping, không có skip cascade dù tactic_conf thấp
+        assert result["technique"] in MAPPING[result["tactic"]]
+        assert result["technique"] == result["technique_raw"]
+        assert result["technique_skipped"] is None
+        assert result["explain"].startswith("Joint model")
+
+
+def test_engine_two_model_mode_keeps_cascade(make_engine):
+    engine = make_engine(cascade=True)
+    assert not engine.joint
+    assert engine.cascade
+    assert make_engine().cascade is False
+
+
+def test_registry_joint_active_selects_joint_engine(registry, joint_files):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        registry.register("joint", *joint_files, version="j1", activate=True)
+
+        assert registry.engine_versions() == {"joint": "j1"}
+        engine = MitreEngine(cascade=True, **registry.load_engine_predictors())
+        assert engine.joint and not engine.cascade
+
+        # tắt joint -> quay về tactic + technique (cascade có hiệu lực)
+        registry.deactivate("joint")
+        assert registry.engine_versions() == {"tactic": "t1", "technique": "k1"}
+        engine = MitreEngine(cascade=True, **registry.load_engine_predictors())
+        assert not engine.joint and engine.cascade
+
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from services.micro_batcher import MicroBatcher
+
+
+def _observe(batcher: MicroBatcher, events: int, latency: float, classify_seconds: float = 0.001):
+    # started_at lùi về quá khứ -> latency quan sát = latency
+    batcher.observe(events, time.perf_counter() - latency, classify_seconds)
+
+
+# ===== AIMD =====
+def test_increase_when_fast_and_full():
+    batcher = MicroBatcher(min_batch=10, max_batch=100, initial_batch=50, latency_slo_ms=1000, increase_step=10)
+
+    _observe(batcher, 50, 0.01)
+    assert batcher.batch_size == 60
+
+    # batch không đầy -> không tăng
+    _observe(batcher, 20, 0.01)
+    assert batcher.batch_size == 60
+
+
+def test_increase_capped_at_max_batch():
+    batcher = MicroBatcher(min_batch=10, max_batch=70, initial_batch=60, latency_slo_ms=1000, increase_step=50)
+    _observe(batcher, 60, 0.01)
+    assert batcher.batch_size == 70
+
+
+def test_decrease_when_slo_violated():
+    batcher = MicroBatcher(min_batch=10, max_batch=1000, initial_batch=100, latency_slo_ms=100, decrease_factor=0.5)
+
+    _observe(batcher, 100, 0.2)
+    assert batcher.batch_size == 50
+    assert batcher.slo_violations == 1
+    # window reset sau khi giảm
+    assert batcher.p99() == 0.0
+
+    for _ in range(5):
+        _observe(batcher, batcher.batch_size, 0.2)
+    assert batcher.batch_size == 10
+
+
+def test_no_change_between_half_slo_and_slo():
+    batcher = MicroBatcher(min_batch=10, max_batch=1000, initial_batch=100, latency_slo_ms=100)
+    _observe(batcher, 100, 0.07)
+    assert batcher.batch_size == 100
+    assert batcher.slo_violations == 0
+
+
+def test_wait_budget_uses_predicted_classify_time():
+    batcher = MicroBatcher(initial_batch=100, max_wait_ms=100, latency_slo_ms=500)
+    assert batcher.wait_budget() == pytest.approx(0.1)
+
+    # 4ms / event x 100 = 400ms -> còn 100ms
+    _observe(batcher, 100, 0.3, classify_seconds=0.4)
+    assert batcher.wait_budget() == pytest.approx(0.1)
+
+    # 5ms / event x 100 >= SLO -> không chờ
+    batcher = MicroBatcher(initial_batch=100, max_wait_ms=100, latency_slo_ms=500)
+    _observe(batcher, 100, 0.3, classify_seconds=0.6)
+    assert batcher.wait_budget() == 0.0
+
+
+def test_invalid_config():
+    with pytest.raises(ValueError):
+        MicroBatcher(min_batch=0)
+    with pytest.raises(ValueError):
+        MicroBatcher(min_batch=50, max_batch=10)
+    with pytest.raises(ValueError):
+        MicroBatcher(latency_slo_ms=0)
+
+
+# ===== Collect =====
+def _pages(total: int):
+    hits = [{"_id": str(i), "sort": [i]} for i in range(total)]
+
+    def fetch(search_after, size):
+        start = 0 if search_after is None else search_after[0] + 1
+        return hits[start:start + size]
+
+    return fetch
+
+
+def test_collect_fills_batch_from_backlog():
+    batcher = MicroBatcher(min_batch=10, initial_batch=25, max_wait_ms=1000)
+    hits, _ = batcher.collect(_pages(100))
+    assert [h["_id"] for h in hits] == [str(i) for i in range(25)]
+
+    hits, _ = batcher.collect(_pages(100), search_after=[24])
+    assert hits[0]["_id"] == "25"
+
+
+def test_collect_flushes_partial_batch_after_wait_budget():
+    batcher = MicroBatcher(min_batch=10, initial_batch=50, max_wait_ms=30, poll_interval=0.005)
+    t0 = time.perf_counter()
+    hits, _ = batcher.collect(_pages(7))
+    assert len(hits) == 7
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_collect_returns_empty_when_caught_up():
+    batcher = MicroBatcher(min_batch=10, initial_batch=50)
+    hits, _ = batcher.collect(_pages(0))
+    assert hits == []
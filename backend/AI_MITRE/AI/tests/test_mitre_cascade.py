@@ -0,0 +1,49 @@
+import numpy as np
+
+from AI_MITRE.Catboost.inference.engine import SKIP_LOW_TACTIC_CONF, SKIP_SINGLE_TECHNIQUE
+from services.mitre_worker import build_mitre_doc
+
+
+def _tactic_confs(make_engine, hits):
+    return [r["tactic_confidence"] for r in make_engine().process_batch(hits)]
+
+
+# ===== Cascade vs full =====
+def test_cascade_matches_full_when_technique_runs(make_engine, technique, hits):
+    full = make_engine().process_batch(hits)
+    cascade = make_engine(cascade=True).process_batch(hits)
+    single = technique.tactic_mask.single_technique
+
+    for c, f in zip(cascade, full):
+        assert c["tactic"] == f["tactic"]
+        if c["tactic"] in single:
+            # technique do tactic quyết định, model technique không chạy
+            assert c["technique_skipped"] == SKIP_SINGLE_TECHNIQUE
+            assert c["technique"] == single[c["tactic"]]
+            assert c["technique_confidence"] == c["tactic_confidence"]
+        else:
+            assert c["technique_skipped"] is None
+            assert c["technique"] == f["technique"]
+            assert c["technique_confidence"] == f["technique_confidence"]
+
+
+def test_low_tactic_confidence_skips_technique(make_engine, hits):
+    threshold = float(np.median(_tactic_confs(make_engine, hits)))
+    results = make_engine(cascade=True, min_tactic_conf=threshold).process_batch(hits)
+
+    low = [r for r in results if r["tactic_confidence"] < threshold]
+    assert low
+    for result in low:
+        assert result["technique"] is None
+        assert result["technique_skipped"] == SKIP_LOW_TACTIC_CONF
+
+        # worker: không ghi là mapped, giữ tactic + lý do
+        doc = build_mitre_doc(result)
+        assert doc["mitre_mapped"] is False
+        assert doc["mitre_reason"] == SKIP_LOW_TACTIC_CONF
+        assert doc["tactic"] == result["tactic"]
+
+    for result in results:
+        if result["tactic_confidence"] >= threshold:
+            assert result["technique"] is not None
+            assert build_mitre_doc(result)["mitre_mapped"] is True
@@ -0,0 +1,100 @@
+import pytest
+
+from AI_MITRE.Catboost.inference.combine_rule import is_mapped
+from AI_MITRE.Catboost.inference.engine import SKIP_LOW_TACTIC_CONF
+from services.mitre_worker import build_mitre_doc
+
+
+# ===== Batch / single =====
+def test_batch_matches_single(make_engine, tactic, hits, assert_same_results):
+    engine = make_engine()
+
+    batch = engine.process_batch(hits)
+    single = [engine.process_log(hit) for hit in hits]
+
+    assert_same_results(batch, single)
+    assert {r["tactic"] for r in batch} <= set(tactic.classes.tolist())
+
+
+def test_empty_batch(make_engine):
+    assert make_engine().process_batch([]) == []
+
+
+def test_batch_order_is_kept(make_engine, hits, assert_same_results):
+    engine = make_engine()
+    forward = engine.process_batch(hits)
+    backward = engine.process_batch(hits[::-1])
+    assert_same_results(backward[::-1], forward)
+
+
+# ===== Counter mapped / unmapped =====
+def _counters():
+    from core.metrics import get_metrics
+    return dict(get_metrics("mitre").snapshot()["counters"])
+
+
+def _delta(before, after, name):
+    return after.get(name, 0) - before.get(name, 0)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"cascade": True, "min_tactic_conf": 0.5},
+    {"drop_if_low_conf": True, "min_tactic_conf": 0.5},
+])
+def test_counters_match_mitre_mapped(make_engine, hits, kwargs):
+    engine = make_engine(**kwargs)
+
+    before = _counters()
+    results = engine.process_batch(hits)
+    after = _counters()
+
+    # cùng tiêu chí với mitre_mapped của document lưu
+    stored_mapped = sum(1 for r in results if build_mitre_doc(r)["mitre_mapped"])
+    assert _delta(before, after, "events") == len(hits)
+    assert _delta(before, after, "mapped") == stored_mapped
+    assert _delta(before, after, "mapped") + _delta(before, after, "unmapped") == len(hits)
+
+    # lý do chi tiết chỉ ở technique_skipped.*, không đếm 2 lần
+    assert _delta(before, after, SKIP_LOW_TACTIC_CONF) == 0
+    skipped = sum(1 for r in results if r and r["technique_skipped"] == SKIP_LOW_TACTIC_CONF)
+    assert _delta(before, after, f"technique_skipped.{SKIP_LOW_TACTIC_CONF}") == skipped
+
+
+def test_fallback_raw_technique_is_mapped(make_engine, hits):
+    before = _counters()
+    results = make_engine().process_batch(hits)
+    after = _counters()
+
+    fallback = [r for r in results if r["explain"].startswith("No MITRE mapping")]
+    assert fallback
+    assert _delta(before, after, "fallback_raw_technique") == len(fallback)
+    for result in fallback:
+        assert result["technique"] == result["technique_raw"]
+        assert is_mapped(result) and build_mitre_doc(result)["mitre_mapped"] is True
+
+
+def test_prefiltered_events_count_as_unmapped(monkeypatch, make_engine, hits, tmp_path):
+    import json
+
+    import services.mitre_worker as mitre_worker
+    from core.lazy import LazyResource
+    from services.mitre_prefilter import AlertPrefilter
+
+    path = tmp_path / "prefilter.json"
+    path.write_text(json.dumps({"rules": [{"name": "tcp80", "dst_port": [80]}]}), encoding="utf-8")
+    engine = make_engine()
+    monkeypatch.setattr(mitre_worker, "_prefilter", LazyResource("test_prefilter", lambda: AlertPrefilter(str(path))))
+    monkeypatch.setattr(mitre_worker, "_engine", LazyResource("test_engine", lambda: engine))
+
+    before = _counters()
+    results = mitre_worker.classify_batch([hits[:60], hits[60:]])
+    after = _counters()
+
+    docs = [build_mitre_doc(r) for page in results for r in page]
+    prefiltered = sum(1 for d in docs if d.get("mitre_reason") == mitre_worker.PREFILTERED)
+    assert 0 < prefiltered < len(hits)
+    assert _delta(before, after, "prefiltered") == prefiltered
+    assert _delta(before, after, "events") == len(hits)
+    assert _delta(before, after, "mapped") == sum(1 for d in docs if d["mitre_mapped"])
+    assert _delta(before, after, "mapped") + _delta(before, after, "unmapped") == len(hits)
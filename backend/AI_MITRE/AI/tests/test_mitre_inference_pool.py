@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import services.mitre_worker as mitre_worker
+from core.lazy import LazyResource
+
+
+@pytest.fixture
+def pool_worker(monkeypatch, registry):
+    # process con (spawn) import lại mitre_worker -> cấu hình registry qua env
+    monkeypatch.setenv("MITRE_MODEL_REGISTRY", registry.root)
+    monkeypatch.setattr(mitre_worker, "MODEL_REGISTRY_DIR", registry.root)
+    monkeypatch.setattr(mitre_worker, "INFERENCE_PROCESSES", 2)
+    monkeypatch.setattr(mitre_worker, "INFERENCE_START_METHOD", "spawn")
+    monkeypatch.setattr(mitre_worker, "_engine", LazyResource("mitre_engine", mitre_worker._build_engine))
+    yield mitre_worker
+    mitre_worker.reset_inference_pool()
+
+
+def _pages(hits):
+    return [hits[:40], hits[40:80], hits[80:]]
+
+
+def test_pool_matches_in_process(pool_worker, hits, assert_same_results):
+    pages = _pages(hits)
+    expected = [pool_worker.classify_hits(page) for page in pages]
+    restarts = pool_worker._metrics.snapshot()["counters"].get("inference_pool_restarts", 0)
+
+    pooled = pool_worker.classify_pages(pages)
+
+    assert len(pooled) == len(pages)
+    for actual, page_expected in zip(pooled, expected):
+        assert_same_results(actual, page_expected)
+
+    stats = pool_worker.engine_stats()
+    assert stats["inference_children"]
+    assert {child["model_version"]["tactic"] for child in stats["inference_children"]} == {"t1"}
+    assert pool_worker._metrics.snapshot()["counters"].get("inference_pool_restarts", 0) == restarts
+
+
+def test_reset_stops_workers_and_pool_restarts(pool_worker, hits, assert_same_results):
+    pages = _pages(hits)
+    first = pool_worker.classify_pages(pages)
+
+    pids = pool_worker.inference_worker_pids()
+    assert len(pids) == 2
+
+    pool_worker.reset_inference_pool()
+    for pid in pids:
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+
+    # lần classify sau tạo pool mới, kết quả không đổi
+    second = pool_worker.classify_pages(pages)
+    for a, b in zip(second, first):
+        assert_same_results(a, b)
+    assert pool_worker.inference_worker_pids().isdisjoint(pids)
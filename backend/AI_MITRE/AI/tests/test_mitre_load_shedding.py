@@ -0,0 +1,183 @@
+import itertools
+
+import pytest
+
+import services.mitre_backfill as mitre_backfill
+import services.mitre_worker as mitre_worker
+
+# log giả: 1 log / giây, sort = [epoch millis, _id] giống ES
+N_LOGS = 1000
+
+
+def _sort(i):
+    return [i * 1000, f"id-{i:04d}"]
+
+
+class FakeES:
+    def __init__(self):
+        self.logs = [{"_id": f"id-{i:04d}", "sort": _sort(i), "_source": {}} for i in range(N_LOGS)]
+        self.head = N_LOGS - 1
+
+    def latest_sort_key(self):
+        return _sort(self.head)
+
+    def fetch_logs(self, search_after=None, size=None):
+        visible = self.logs[:self.head + 1]
+        after = [hit for hit in visible if not search_after or tuple(hit["sort"]) > tuple(search_after)]
+        return after[:size]
+
+    def count_logs_between(self, start, end):
+        return sum(1 for hit in self.logs if (not start or hit["sort"][0] >= start[0]) and hit["sort"][0] < end[0])
+
+
+class FakeBackfillCollection:
+    def __init__(self):
+        self.docs = []
+        self._ids = itertools.count()
+
+    def create_index(self, keys):
+        pass
+
+    def insert_one(self, doc):
+        doc = dict(doc, _id=next(self._ids))
+        self.docs.append(doc)
+        return type("Result", (), {"inserted_id": doc["_id"]})()
+
+    def find_one(self, query, sort):
+        matched = [d for d in self.docs if all(d.get(k) == v for k, v in query.items())]
+        (field, direction), = sort
+        matched.sort(key=lambda d: d[field], reverse=direction < 0)
+        return matched[0] if matched else None
+
+    def update_one(self, query, update):
+        doc = next(d for d in self.docs if d["_id"] == query["_id"])
+        doc.update(update.get("$set", {}))
+        for key, value in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + value
+
+
+@pytest.fixture
+def shed(monkeypatch):
+    es, col = FakeES(), FakeBackfillCollection()
+    state = {"offsets": [], "saved": []}
+
+    monkeypatch.setattr(mitre_backfill, "get_backfill_collection", lambda: col)
+    monkeypatch.setattr(mitre_backfill, "_indexes_ready", False)
+
+    monkeypatch.setattr(mitre_worker, "LAG_SHED_SEC", 300.0)
+    monkeypatch.setattr(mitre_worker, "LAG_RESUME_SEC", 60.0)
+    monkeypatch.setattr(mitre_worker, "LAG_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(mitre_worker, "BACKFILL_PAGE_SIZE", 50)
+    monkeypatch.setattr(mitre_worker, "_last_lag_check", 0.0)
+    monkeypatch.setattr(mitre_worker, "_lag_state", dict(mitre_worker._lag_state, overloaded=False, sheds=0))
+
+    monkeypatch.setattr(mitre_worker, "latest_sort_key", es.latest_sort_key)
+    monkeypatch.setattr(mitre_worker, "fetch_logs", es.fetch_logs)
+    monkeypatch.setattr(mitre_worker, "count_logs_between", es.count_logs_between)
+    monkeypatch.setattr(mitre_worker, "set_mitre_offset", state["offsets"].append)
+    monkeypatch.setattr(mitre_worker, "classify_batch", lambda pages: [[None] * len(hits) for hits in pages])
+    monkeypatch.setattr(mitre_worker, "save_page", lambda hits, results: state["saved"].append([h["_id"] for h in hits]))
+
+    state.update(es=es, col=col)
+    return state
+
+
+def _ids(start, end):
+    return [f"id-{i:04d}" for i in range(start, end)]
+
+
+# ===== Shed =====
+def test_shed_records_range_and_jumps(shed):
+    offset = _sort(100)
+    jump = mitre_worker.maybe_shed(offset)
+
+    # lag 899s > 300s -> nhảy tới head - 60s
+    assert jump == [939 * 1000, ""]
+    assert shed["offsets"] == [jump]
+
+    (rng,) = shed["col"].docs
+    assert (rng["start"], rng["end"], rng["cursor"], rng["status"]) == (offset, jump, offset, "pending")
+    assert rng["estimated_events"] == 839
+    assert mitre_worker.lag_stats()["overloaded"] is True
+
+    # đang quá tải -> backfill không chạy
+    assert mitre_worker.backfill_step() == 0
+
+
+def test_no_shed_below_threshold(shed):
+    offset = _sort(N_LOGS - 1 - 300)
+    assert mitre_worker.maybe_shed(offset) == offset
+    assert shed["col"].docs == [] and shed["offsets"] == []
+
+
+def test_jump_never_moves_live_backwards(shed, monkeypatch):
+    # head - SHED_KEEP_RECENT_SEC nằm trước offset -> range rỗng: không ghi, không đổi offset
+    monkeypatch.setattr(mitre_worker, "SHED_KEEP_RECENT_SEC", 500.0)
+    offset = _sort(N_LOGS - 1 - 400)
+
+    assert mitre_worker.maybe_shed(offset) == offset
+    assert shed["col"].docs == [] and shed["offsets"] == []
+    assert mitre_worker.lag_stats()["overloaded"] is False
+
+
+# ===== Resume (LAG_RESUME_SEC) =====
+def test_resume_after_lag_below_resume_threshold(shed):
+    mitre_worker.maybe_shed(_sort(100))
+    assert mitre_worker.lag_stats()["overloaded"] is True
+
+    # resume < lag <= shed -> vẫn quá tải, không shed thêm
+    assert mitre_worker.maybe_shed(_sort(N_LOGS - 1 - 100)) == _sort(N_LOGS - 1 - 100)
+    assert mitre_worker.lag_stats()["overloaded"] is True
+    assert len(shed["col"].docs) == 1
+    assert mitre_worker.backfill_step() == 0
+
+    # lag < resume -> backfill được chạy
+    mitre_worker.maybe_shed(_sort(N_LOGS - 1 - 30))
+    assert mitre_worker.lag_stats()["overloaded"] is False
+    assert mitre_worker.backfill_step() == 50
+
+
+# ===== Backfill =====
+def test_backfill_drains_newest_range_first(shed):
+    es = shed["es"]
+
+    # shed 1: head 599, offset 100 -> range A = (100, 539)
+    es.head = 599
+    mitre_worker.maybe_shed(_sort(100))
+    # shed 2: head 999, offset 600 -> range B = (600, 939)
+    es.head = 999
+    mitre_worker.maybe_shed(_sort(600))
+    assert len(shed["col"].docs) == 2
+
+    mitre_worker.maybe_shed(_sort(N_LOGS - 1))
+    assert mitre_worker.lag_stats()["overloaded"] is False
+
+    while mitre_worker.backfill_step():
+        pass
+
+    written = [i for page in shed["saved"] for i in page]
+    # range mới nhất trước, mỗi log trong range đúng 1 lần, không vượt end
+    assert written == _ids(601, 939) + _ids(101, 539)
+    assert all(page for page in shed["saved"])
+    assert [d["status"] for d in shed["col"].docs] == ["done", "done"]
+    assert [d["processed"] for d in shed["col"].docs] == [438, 338]
+    assert mitre_worker.backfill_step() == 0
+
+
+# ===== Config =====
+@pytest.mark.parametrize("shed_sec, resume_sec", [(60.0, 30.0), (30.0, 10.0), (300.0, 400.0), (300.0, 0.0)])
+def test_invalid_lag_config(monkeypatch, shed_sec, resume_sec):
+    monkeypatch.setattr(mitre_worker, "LAG_SHED_SEC", shed_sec)
+    monkeypatch.setattr(mitre_worker, "LAG_RESUME_SEC", resume_sec)
+    with pytest.raises(ValueError):
+        mitre_worker.validate_lag_config()
+
+
+def test_valid_or_disabled_lag_config(monkeypatch):
+    monkeypatch.setattr(mitre_worker, "LAG_SHED_SEC", 0.0)
+    monkeypatch.setattr(mitre_worker, "LAG_RESUME_SEC", 999.0)
+    mitre_worker.validate_lag_config()
+
+    monkeypatch.setattr(mitre_worker, "LAG_SHED_SEC", 300.0)
+    monkeypatch.setattr(mitre_worker, "LAG_RESUME_SEC", 60.0)
+    mitre_worker.validate_lag_config()
@@ -0,0 +1,123 @@
+import json
+import os
+
+import pytest
+
+from services.mitre_prefilter import AlertPrefilter, PrefilterRule
+
+
+def _hit(dst_ap="10.1.0.5:80", rule="1:1000:1", cls="Attempted Information Leak", priority=2):
+    return {
+        "_id": "x",
+        "_source": {
+            "snort": {
+                "dst_ap": dst_ap,
+                "rule": rule,
+                "class": cls,
+                "priority": priority,
+            },
+        },
+    }
+
+
+def _write_rules(path, rules, mtime=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"rules": rules}, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+# ===== Rules =====
+def test_rule_conditions(tmp_path):
+    path = tmp_path / "prefilter.json"
+    _write_rules(path, [
+        {"name": "misc_activity", "class": ["Misc activity"]},
+        {"name": "upnp_ssdp", "dst_port": [1900]},
+        {"name": "multicast", "dst_cidr": ["224.0.0.0/4", "ff00::/8"]},
+        {"name": "decoder", "gid": [116]},
+        {"name": "noisy_sids", "sid": ["1:2000419", 2013504]},
+        {"name": "low_priority", "priority_gte": 4},
+        {"name": "disabled", "dst_port": [80], "enabled": False},
+    ])
+    prefilter = AlertPrefilter(str(path), check_interval=0)
+
+    assert len(prefilter) == 6
+    assert prefilter.match(_hit(cls=" misc ACTIVITY ")) == "misc_activity"
+    assert prefilter.match(_hit(dst_ap="10.1.0.5:1900")) == "upnp_ssdp"
+    assert prefilter.match(_hit(dst_ap="239.255.255.250:5000")) == "multicast"
+    assert prefilter.match(_hit(dst_ap="[ff02::c]:5000")) == "multicast"
+    assert prefilter.match(_hit(rule="116:402:1")) == "decoder"
+    assert prefilter.match(_hit(rule="1:2000419:3")) == "noisy_sids"
+    assert prefilter.match(_hit(rule="3:2013504:1")) == "noisy_sids"
+    assert prefilter.match(_hit(rule="3:2000419:1")) is None
+    assert prefilter.match(_hit(priority=4)) == "low_priority"
+
+    # không rule nào khớp (rule disabled bị bỏ)
+    assert prefilter.match(_hit()) is None
+
+    stats = prefilter.stats()
+    assert stats["checked"] == 10
+    assert stats["skipped"] == 8
+    assert stats["skipped_by_rule"]["noisy_sids"] == 2
+
+
+def test_conditions_in_one_rule_are_and():
+    rule = PrefilterRule({"name": "upnp_lan", "dst_port": [1900], "dst_cidr": ["239.0.0.0/8"]})
+    assert rule.matches({}, {"gid": 1, "sid": 1}, ("239.255.255.250", 1900))
+    assert not rule.matches({}, {"gid": 1, "sid": 1}, ("10.0.0.1", 1900))
+    assert not rule.matches({}, {"gid": 1, "sid": 1}, ("239.255.255.250", 80))
+
+
+def test_rule_without_condition_is_rejected():
+    with pytest.raises(ValueError):
+        PrefilterRule({"name": "empty"})
+
+
+# ===== Reload =====
+def test_reload_on_mtime_change(tmp_path):
+    path = tmp_path / "prefilter.json"
+    _write_rules(path, [{"name": "upnp_ssdp", "dst_port": [1900]}], mtime=1_000_000)
+    prefilter = AlertPrefilter(str(path), check_interval=0)
+    assert prefilter.match(_hit(dst_ap="10.1.0.5:80")) is None
+
+    # file không đổi -> không reload
+    assert prefilter.maybe_reload() is False
+
+    _write_rules(path, [{"name": "http", "dst_port": [80]}], mtime=1_000_100)
+    assert prefilter.maybe_reload() is True
+    assert prefilter.reloads == 2
+    assert prefilter.match(_hit(dst_ap="10.1.0.5:80")) == "http"
+    assert prefilter.match(_hit(dst_ap="10.1.0.5:1900")) is None
+
+
+def test_broken_file_keeps_old_rules(tmp_path):
+    path = tmp_path / "prefilter.json"
+    _write_rules(path, [{"name": "upnp_ssdp", "dst_port": [1900]}], mtime=1_000_000)
+    prefilter = AlertPrefilter(str(path), check_interval=0)
+
+    path.write_text("{not json", encoding="utf-8")
+    os.utime(path, (1_000_100, 1_000_100))
+    assert prefilter.maybe_reload() is False
+    assert prefilter.match(_hit(dst_ap="10.1.0.5:1900")) == "upnp_ssdp"
+
+    # rule thiếu điều kiện cũng giữ rule cũ
+    _write_rules(path, [{"name": "empty"}], mtime=1_000_200)
+    assert prefilter.maybe_reload() is False
+    assert len(prefilter) == 1
+
+
+def test_check_interval_limits_stat(tmp_path):
+    path = tmp_path / "prefilter.json"
+    _write_rules(path, [{"name": "upnp_ssdp", "dst_port": [1900]}], mtime=1_000_000)
+    prefilter = AlertPrefilter(str(path), check_interval=3600)
+
+    _write_rules(path, [{"name": "http", "dst_port": [80]}], mtime=1_000_100)
+    assert prefilter.maybe_reload() is False
+    assert prefilter.reload() is True
+    assert prefilter.match(_hit(dst_ap="10.1.0.5:80")) == "http"
+
+
+def test_missing_file_means_no_rules(tmp_path):
+    prefilter = AlertPrefilter(str(tmp_path / "missing.json"), check_interval=0)
+    assert len(prefilter) == 0
+    assert prefilter.match(_hit()) is None
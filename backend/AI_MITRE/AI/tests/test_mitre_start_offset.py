@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import services.mitre_worker as mitre_worker
+
+SAVED_OFFSET = [1735000000000, "saved-id"]
+LATEST_KEY = [1736000000000, "latest-id"]
+
+
+@pytest.fixture(autouse=True)
+def fake_offsets(monkeypatch):
+    # không cần Mongo / Elasticsearch
+    monkeypatch.setattr(mitre_worker, "get_mitre_offset", lambda: SAVED_OFFSET)
+    monkeypatch.setattr(mitre_worker, "latest_sort_key", lambda: LATEST_KEY)
+    monkeypatch.setattr(mitre_worker, "START_FROM", "resume")
+    monkeypatch.setattr(mitre_worker, "START_TIMESTAMP", None)
+
+
+def test_resume_uses_saved_offset():
+    assert mitre_worker.resolve_start_offset("resume") == SAVED_OFFSET
+    # mặc định = START_FROM
+    assert mitre_worker.resolve_start_offset() == SAVED_OFFSET
+
+
+def test_start_reads_from_beginning():
+    assert mitre_worker.resolve_start_offset("start") is None
+
+
+def test_now_skips_to_latest_log():
+    assert mitre_worker.resolve_start_offset("now") == LATEST_KEY
+
+
+def test_timestamp_mode():
+    expected = int(datetime(2025, 12, 29, 7, 0, tzinfo=timezone.utc).timestamp() * 1000)
+
+    assert mitre_worker.resolve_start_offset("timestamp", "2025-12-29T07:00:00Z") == [expected, ""]
+    # không có timezone -> UTC
+    assert mitre_worker.resolve_start_offset("timestamp", "2025-12-29T07:00:00") == [expected, ""]
+    assert mitre_worker.resolve_start_offset("timestamp", "2025-12-29T09:00:00+02:00") == [expected, ""]
+
+
+def test_timestamp_mode_from_env_default(monkeypatch):
+    monkeypatch.setattr(mitre_worker, "START_FROM", "timestamp")
+    monkeypatch.setattr(mitre_worker, "START_TIMESTAMP", "2025-12-29T07:00:00Z")
+    assert mitre_worker.resolve_start_offset()[1] == ""
+
+
+def test_timestamp_mode_requires_timestamp():
+    with pytest.raises(ValueError):
+        mitre_worker.resolve_start_offset("timestamp")
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        mitre_worker.resolve_start_offset("yesterday")
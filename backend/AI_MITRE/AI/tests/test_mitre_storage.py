@@ -0,0 +1,107 @@
+import pytest
+from pymongo import InsertOne, UpdateOne
+
+import services.mitre_storage as mitre_storage
+
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.bulk_calls = []
+        self.indexes = []
+
+    def create_index(self, keys):
+        self.indexes.append(keys)
+
+    def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise RuntimeError("mongo down")
+        self.bulk_calls.append((ops, ordered))
+
+
+def _use(monkeypatch, col):
+    monkeypatch.setattr(mitre_storage, "get_mitre_collection", lambda: col)
+    monkeypatch.setattr(mitre_storage, "_indexes_ready", False)
+
+
+def _meta(elastic_id, elastic_index="snort-alert-2025.12.11"):
+    return {"elastic_index": elastic_index, "elastic_id": elastic_id, "src_ip": "10.0.0.1", "msg": "scan"}
+
+
+RESULT = {"tactic": "Reconnaissance", "technique": "T1595", "confidence": 0.9, "mitre_mapped": True}
+
+
+def test_upsert_by_index_and_elastic_id(monkeypatch):
+    col = FakeCollection()
+    _use(monkeypatch, col)
+
+    mitre_storage.save_mitre_results([(_meta("id-1"), RESULT), (_meta("id-2"), RESULT)])
+
+    # index tạo lúc start worker, không phải trên đường ghi
+    assert col.indexes == []
+    assert len(col.bulk_calls) == 1
+    ops, ordered = col.bulk_calls[0]
+    assert ordered is False
+    assert all(isinstance(op, UpdateOne) for op in ops)
+
+    doc = ops[0]._doc
+    assert ops[0]._filter == {"elastic_id": "id-1", "elastic_index": "snort-alert-2025.12.11"}
+    assert ops[0]._upsert is True
+    # created_at chỉ ghi lần insert đầu tiên
+    assert "created_at" not in doc["$set"]
+    assert "created_at" in doc["$setOnInsert"]
+    assert doc["$set"]["technique"] == "T1595"
+    assert doc["$set"]["mitre_mapped"] is True
+
+
+def test_same_elastic_id_in_two_indices_are_separate(monkeypatch):
+    col = FakeCollection()
+    _use(monkeypatch, col)
+
+    mitre_storage.save_mitre_results([
+        (_meta("id-1", "snort-alert-2025.12.11"), RESULT),
+        (_meta("id-1", "snort-alert-2025.12.12"), RESULT),
+    ])
+
+    ops, _ = col.bulk_calls[0]
+    assert ops[0]._filter != ops[1]._filter
+
+
+def test_ensure_indexes_once(monkeypatch):
+    col = FakeCollection()
+    _use(monkeypatch, col)
+
+    mitre_storage.ensure_mitre_indexes()
+    mitre_storage.ensure_mitre_indexes()
+    # elastic_id đứng đầu -> mitre_lookup theo elastic_id vẫn dùng được index
+    assert col.indexes == [[("elastic_id", 1), ("elastic_index", 1)]]
+
+
+def test_missing_elastic_id_inserts(monkeypatch):
+    col = FakeCollection()
+    _use(monkeypatch, col)
+
+    mitre_storage.save_mitre_results([(_meta(None), RESULT), (_meta("id-1"), RESULT)])
+
+    ops, _ = col.bulk_calls[0]
+    assert isinstance(ops[0], InsertOne)
+    assert "created_at" in ops[0]._doc
+    assert isinstance(ops[1], UpdateOne)
+
+
+def test_empty_page_does_nothing(monkeypatch):
+    col = FakeCollection()
+    _use(monkeypatch, col)
+
+    mitre_storage.save_mitre_results([])
+    assert col.bulk_calls == []
+    assert col.indexes == []
+
+
+def test_write_error_is_raised(monkeypatch):
+    col = FakeCollection(fail=True)
+    _use(monkeypatch, col)
+
+    # lỗi phải được raise -> worker không commit offset
+    with pytest.raises(RuntimeError):
+        mitre_storage.save_mitre_results([(_meta("id-1"), RESULT)])
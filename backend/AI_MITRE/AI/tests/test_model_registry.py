@@ -0,0 +1,103 @@
+import warnings
+
+import pytest
+
+import services.mitre_worker as mitre_worker
+from core.lazy import LazyResource
+
+ACTIVE_T1 = {"tactic": "t1", "technique": "k1"}
+
+
+@pytest.fixture
+def reg(registry, tactic_files):
+    # thêm tactic t2 (cùng file) để đổi ACTIVE
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        registry.register("tactic", *tactic_files, version="t2")
+    return registry
+
+
+def _corrupt(reg, kind, version):
+    model_path, _ = reg.paths(kind, version)
+    with open(model_path, "ab") as f:
+        f.write(b"\0")
+
+
+# ===== Registry =====
+def test_checksum_mismatch_is_rejected(reg):
+    reg.verify("tactic", "t2")
+    _corrupt(reg, "tactic", "t2")
+
+    with pytest.raises(ValueError, match="checksum"):
+        reg.load_predictor("tactic", "t2")
+    with pytest.raises(ValueError, match="checksum"):
+        reg.activate("tactic", "t2")
+    assert reg.active_version("tactic") == "t1"
+
+
+def test_activate_switches_engine_versions(reg):
+    assert reg.engine_versions() == ACTIVE_T1
+
+    reg.activate("tactic", "t2")
+    assert reg.engine_versions() == {"tactic": "t2", "technique": "k1"}
+    assert reg.load_engine_predictors()["tactic_predictor"].model_version == "t2"
+
+    # versions truyền vào thắng ACTIVE (process con / load background)
+    assert reg.load_engine_predictors(ACTIVE_T1)["tactic_predictor"].model_version == "t1"
+
+    with pytest.raises(ValueError):
+        reg.activate("tactic", "t9")
+
+
+# ===== Hot swap (mitre_worker) =====
+@pytest.fixture
+def worker(monkeypatch, reg):
+    monkeypatch.setattr(mitre_worker, "MODEL_REGISTRY_DIR", reg.root)
+    monkeypatch.setattr(mitre_worker, "MODEL_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(mitre_worker, "_engine", LazyResource("mitre_engine", mitre_worker._build_engine))
+    monkeypatch.setattr(mitre_worker, "_pending_engine", None)
+    monkeypatch.setattr(mitre_worker, "_reload_thread", None)
+    monkeypatch.setattr(mitre_worker, "_failed_versions", None)
+    monkeypatch.setattr(mitre_worker, "_last_model_check", 0.0)
+    return mitre_worker
+
+
+def _reload(worker) -> bool:
+    """
+    1 vòng maybe_reload_engine: check ACTIVE -> load background -> swap
+    """
+    assert not worker.maybe_reload_engine()
+    if worker._reload_thread is not None:
+        worker._reload_thread.join(timeout=30)
+    return worker.maybe_reload_engine()
+
+
+def test_hot_swap_on_activate(worker, reg):
+    assert worker.get_engine().model_version == ACTIVE_T1
+    assert not _reload(worker)
+
+    reg.activate("tactic", "t2")
+    assert _reload(worker)
+    assert worker.get_engine().model_version == {"tactic": "t2", "technique": "k1"}
+
+
+def test_background_load_uses_requested_versions(worker, reg):
+    # ACTIVE đổi trong lúc load -> engine vẫn đúng version đã check
+    reg.activate("tactic", "t2")
+    worker._load_engine_background(ACTIVE_T1, None)
+    assert worker._pending_engine.model_version == ACTIVE_T1
+
+
+def test_corrupt_version_is_not_swapped(worker, reg):
+    engine = worker.get_engine()
+
+    reg.activate("tactic", "t2")
+    _corrupt(reg, "tactic", "t2")
+
+    assert not _reload(worker)
+    assert worker.get_engine() is engine
+    assert worker._failed_versions == {"tactic": "t2", "technique": "k1"}
+
+    # không thử lại version lỗi
+    assert not worker.maybe_reload_engine()
+    assert worker._reload_thread is None or not worker._reload_thread.is_alive()
@@ -0,0 +1,172 @@
+import hashlib
+import random
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from AI_MITRE.Catboost.inference.predict_technique_from_snort import normalize_snort_df, parse_snort_timestamps
+
+
+# ===== Bản per-row cũ (tham chiếu) =====
+def _parse_snort_timestamp_rowwise(ts_snort):
+    if pd.isna(ts_snort):
+        return None, None
+    ts = str(ts_snort).strip()
+
+    if "T" in ts and "Z" in ts:
+        try:
+            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            iso = dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+            return iso, str(dt.timestamp())
+        except Exception:
+            pass
+
+    if "-" in ts and len(ts) >= 15:
+        try:
+            now_year = datetime.now(timezone.utc).year
+            month = int(ts[0:2])
+            day = int(ts[3:5])
+            time_part = ts.split("-", 1)[1]
+            dt = datetime.strptime(f"{now_year}-{month:02d}-{day:02d} {time_part}", "%Y-%m-%d %H:%M:%S.%f")
+            dt = dt.replace(tzinfo=timezone.utc)
+            iso = dt.isoformat().replace("+00:00", "Z")
+            return iso, str(dt.timestamp())
+        except Exception:
+            return None, None
+
+    try:
+        f = float(ts)
+        dt = datetime.fromtimestamp(f, tz=timezone.utc)
+        iso = dt.isoformat().replace("+00:00", "Z")
+        return iso, str(f)
+    except Exception:
+        return None, None
+
+
+def _to_transport_rowwise(proto):
+    if not isinstance(proto, str):
+        return "unknown"
+    p = proto.lower()
+    if p in ("tcp", "udp", "icmp"):
+        return p
+    if p in ("eth", "ethernet", "arp"):
+        return "arp"
+    return "unknown"
+
+
+def _guess_service_rowwise(proto, dport, msg):
+    proto_l = str(proto).lower() if proto else ""
+    msg_l = str(msg).lower() if msg else ""
+    try:
+        dport = int(dport)
+    except Exception:
+        dport = None
+
+    if proto_l == "icmp":
+        return "icmp"
+    if "arp" in msg_l or proto_l in ("arp", "eth", "ethernet"):
+        return "arp"
+    if dport == 53 or "dns" in msg_l:
+        return "dns"
+    if dport in (80, 8080) or "http" in msg_l:
+        return "http"
+    if dport == 443 or "https" in msg_l:
+        return "https"
+    if dport == 22 or "ssh" in msg_l:
+        return "ssh"
+    return "unknown"
+
+
+def _short_event_id_rowwise(row):
+    s = f"{row.get('timestamp','')}|{row.get('src_ip','')}|{row.get('src_port',0)}|" \
+        f"{row.get('dst_ip','')}|{row.get('dst_port',0)}|{row.get('proto','')}"
+    return hashlib.md5(s.encode()).hexdigest()[:20]
+
+
+# ===== Input hỗn hợp =====
+FIXED_TIMESTAMPS = [
+    "2024-11-05T10:00:00.646Z",
+    "2024-11-05T10:00:00Z",
+    "2025-12-22T10:23:45.368558Z",
+    " 2024-02-29T23:59:59.999999Z ",
+    "1730800800.646",
+    "1766399025.368558",
+    "1766399025.3685575",
+    "1700000000",
+    "-1.5",
+    "11/05-10:00:00.123456",
+    "02/29-10:00:00.5",
+    "13/45-99:00:00.1",
+    "TZ-garbage",
+    "abc",
+    "nan",
+    "inf",
+    "",
+    None,
+]
+
+
+def _timestamps(n_random: int = 500):
+    rnd = random.Random(3)
+    values = list(FIXED_TIMESTAMPS)
+    for _ in range(n_random):
+        sec = rnd.randint(1_600_000_000, 1_800_000_000)
+        kind = rnd.random()
+        if kind < 0.4:
+            values.append(f"{sec}.{rnd.randint(0, 999999):06d}")
+        elif kind < 0.6:
+            values.append(repr(sec + rnd.random()))
+        else:
+            dt = datetime.fromtimestamp(sec, tz=timezone.utc).replace(microsecond=rnd.randint(0, 999) * 1000)
+            values.append(dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z")
+    return values
+
+
+def test_parse_timestamps_matches_rowwise():
+    values = _timestamps()
+    iso, epoch = parse_snort_timestamps(pd.Series(values, dtype=object))
+
+    for value, got_iso, got_epoch in zip(values, iso, epoch):
+        exp_iso, exp_epoch = _parse_snort_timestamp_rowwise(str(value))
+        assert got_iso == exp_iso, value
+        if exp_epoch is None:
+            assert np.isnan(got_epoch), value
+        else:
+            # bản cũ ghi str(epoch) rồi prepare_features to_numeric -> so float tuyệt đối
+            assert got_epoch == float(exp_epoch), value
+
+
+def test_normalize_matches_rowwise():
+    values = _timestamps(200)
+    rnd = random.Random(5)
+    n = len(values)
+    df = pd.DataFrame({
+        "timestamp": values,
+        "src_ip": [f"10.0.0.{rnd.randint(1, 254)}" for _ in range(n)],
+        "dst_ip": [f"10.1.0.{rnd.randint(1, 254)}" for _ in range(n)],
+        "src_port": [rnd.choice([1234, 40000, None]) for _ in range(n)],
+        "dst_port": [rnd.choice([22, 53, 80, 443, 8080, 1900, None]) for _ in range(n)],
+        "proto": [rnd.choice(["TCP", "udp", "ICMP", "eth", "ARP", None]) for _ in range(n)],
+        "pkt_len": [rnd.choice([60, 512, None]) for _ in range(n)],
+        "dir": [rnd.choice(["C2S", "S2C", "UNK", None]) for _ in range(n)],
+        "msg": [rnd.choice(["ET SCAN", "DNS query", "HTTP GET", "ssh brute", "arp spoof", None]) for _ in range(n)],
+    })
+
+    out = normalize_snort_df(df.copy())
+
+    parsed = [_parse_snort_timestamp_rowwise(ts) for ts in df["timestamp"].astype(str)]
+    expected_epoch = [np.nan if e is None else float(e) for _, e in parsed]
+    np.testing.assert_array_equal(out["@timestamp"].to_numpy(dtype=float), np.array(expected_epoch))
+
+    expected_transport = df["proto"].fillna("unknown").astype(str).apply(_to_transport_rowwise)
+    assert out["network.transport"].tolist() == expected_transport.tolist()
+    assert out["network.service"].tolist() == [
+        _guess_service_rowwise(p, d, m) for p, d, m in zip(df["proto"], df["dst_port"], df["msg"])
+    ]
+
+    # event.id tính trên frame đã thêm cột thiếu
+    full = df.copy()
+    for c in ["pkt_num", "pkt_gen", "rule", "action", "source", "class"]:
+        full[c] = np.nan
+    assert out["event.id"].tolist() == [_short_event_id_rowwise(r) for _, r in full.iterrows()]
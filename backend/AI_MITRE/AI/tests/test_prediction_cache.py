@@ -0,0 +1,105 @@
+import pytest
+
+from AI_MITRE.Catboost.inference.prediction_cache import (
+    PredictionCache,
+    TIMESTAMP_BUCKET,
+    TIMESTAMP_EXACT,
+    TIMESTAMP_EXCLUDE,
+)
+
+# row giả: [proto, dst_port, @timestamp]
+TS_INDEX = 2
+
+
+# ===== LRU =====
+def test_lru_evicts_least_recently_used():
+    cache = PredictionCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # đọc "a" -> "b" thành cũ nhất
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_record_hits_and_reset():
+    cache = PredictionCache(max_size=4)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("x")
+    cache.record_hits(3)
+
+    stats = cache.stats()
+    assert stats["hits"] == 4
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == pytest.approx(0.8)
+
+    cache.reset()
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["size"] == 0
+    assert cache.get("a") is None
+
+
+def test_invalid_config():
+    with pytest.raises(ValueError):
+        PredictionCache(max_size=0)
+    with pytest.raises(ValueError):
+        PredictionCache(max_size=10, timestamp_mode="minute")
+    with pytest.raises(ValueError):
+        PredictionCache(max_size=10, timestamp_mode=TIMESTAMP_BUCKET, timestamp_bucket_sec=0)
+
+
+# ===== Key modes =====
+def test_key_exact_keeps_timestamp():
+    cache = PredictionCache(max_size=10, timestamp_mode=TIMESTAMP_EXACT)
+    k1 = cache.make_key(["TCP", 80.0, 1000.0], TS_INDEX)
+    k2 = cache.make_key(["TCP", 80.0, 1001.0], TS_INDEX)
+    assert k1 != k2
+    assert k1 == ("TCP", 80.0, 1000.0)
+
+
+def test_key_bucket_rounds_timestamp():
+    cache = PredictionCache(max_size=10, timestamp_mode=TIMESTAMP_BUCKET, timestamp_bucket_sec=60)
+    assert cache.make_key(["TCP", 80.0, 60.0], TS_INDEX) == cache.make_key(["TCP", 80.0, 119.9], TS_INDEX)
+    assert cache.make_key(["TCP", 80.0, 119.9], TS_INDEX) != cache.make_key(["TCP", 80.0, 120.0], TS_INDEX)
+
+    # timestamp không phải số -> giữ nguyên
+    assert cache.make_key(["TCP", 80.0, "unknown"], TS_INDEX) == ("TCP", 80.0, "unknown")
+
+
+def test_key_exclude_drops_timestamp():
+    cache = PredictionCache(max_size=10, timestamp_mode=TIMESTAMP_EXCLUDE)
+    k1 = cache.make_key(["TCP", 80.0, 1000.0], TS_INDEX)
+    k2 = cache.make_key(["TCP", 80.0, 99999.0], TS_INDEX)
+    assert k1 == k2 == ("TCP", 80.0)
+
+    # schema không có @timestamp -> key = cả row
+    assert cache.make_key(["TCP", 80.0], None) == ("TCP", 80.0)
+
+
+# ===== MitreEngine + cache =====
+def test_cached_engine_matches_uncached(make_engine, hits, assert_same_results):
+    expected = make_engine().process_batch(hits)
+
+    engine = make_engine(cache_size=1000)
+    assert_same_results(engine.process_batch(hits), expected)
+
+    # lần 2: toàn bộ từ cache
+    assert_same_results(engine.process_batch(hits), expected)
+    stats = engine.cache_stats()
+    assert stats["hits"] + stats["misses"] == 2 * len(hits)
+    assert stats["misses"] == stats["size"]
+
+
+def test_cache_disabled_by_default(make_engine):
+    assert make_engine().cache_stats() is None
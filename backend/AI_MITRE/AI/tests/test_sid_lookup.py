@@ -0,0 +1,133 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from AI_MITRE.Catboost.inference.engine import SID_TABLE_EXPLAIN
+from AI_MITRE.Catboost.inference.sid_lookup import SidLookupTable, load_sid_table, sid_key, sid_key_from_hit
+from AI_MITRE.Catboost.training.build_sid_table import build_table, load_labeled
+from services.mitre_worker import build_mitre_doc
+
+
+def _labeled_csv(path):
+    rows = (
+        # 1:1000 thuần, đủ support -> giữ
+        [("1:1000:1", "Credential Access", "T1110")] * 20
+        # 1:1001 rev khác nhau vẫn cùng SID; 19/20 -> purity 0.95
+        + [("1:1001:2", "Reconnaissance", "T1595")] * 10
+        + [("1:1001:3", "Reconnaissance", "T1595")] * 9
+        + [("1:1001:3", "Initial Access", "T1190")]
+        # 1:1002 không thuần
+        + [("1:1002:1", "Reconnaissance", "T1595")] * 12
+        + [("1:1002:1", "Initial Access", "T1190")] * 8
+        # 1:1003 thiếu support
+        + [("1:1003:1", "Initial Access", "T1190")] * 3
+        # 1:1004 cặp không có trong mapping
+        + [("1:1004:1", "Execution", "T1110")] * 20
+        # không parse được / nhãn none -> bỏ
+        + [("garbage", "Initial Access", "T1190")] * 5
+        + [("1:1005:1", "none", "none")] * 20
+    )
+    pd.DataFrame(rows, columns=["rule", "threat.tactic.name", "threat.technique.name"]).to_csv(path, index=False)
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    csv = tmp_path / "labeled.csv"
+    _labeled_csv(csv)
+
+    df = load_labeled([str(csv)], "rule", "threat.tactic.name", "threat.technique.name")
+    entries, rejected = build_table(df, min_support=10, min_purity=0.95)
+
+    assert rejected == {"support": 1, "purity": 1, "unmapped": 1}
+    path = tmp_path / "sid_table.json"
+    path.write_text(json.dumps({"entries": entries}), encoding="utf-8")
+    return path
+
+
+# ===== Build =====
+def test_sid_key():
+    assert sid_key("1:1000:3") == (1, 1000)
+    assert sid_key("3:1000:1") == (3, 1000)
+    assert sid_key("garbage") is None
+    assert sid_key_from_hit({"_source": {"snort": {"rule": "1:1000:1"}}}) == (1, 1000)
+    assert sid_key_from_hit({"_source": {"snort": {}}}) is None
+
+
+def test_build_table(table_path):
+    table = load_sid_table(str(table_path))
+    assert table == {
+        (1, 1000): ("Credential Access", "T1110", 1.0),
+        (1, 1001): ("Reconnaissance", "T1595", 0.95),
+    }
+
+
+# ===== Lookup =====
+def test_lookup_hit_and_miss(table_path):
+    table = SidLookupTable(str(table_path))
+    assert len(table) == 2
+
+    assert table.get((1, 1000)) == ("Credential Access", "T1110", 1.0)
+    assert table.get((1, 1002)) is None
+    assert table.get(None) is None
+
+    stats = table.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_reload_on_file_change(table_path):
+    table = SidLookupTable(str(table_path), check_interval=0)
+    assert not table.maybe_reload()
+
+    table_path.write_text(json.dumps({"entries": {"1:2000": {
+        "tactic": "Initial Access", "technique": "T1190", "confidence": 1.0,
+    }}}), encoding="utf-8")
+    mtime = os.path.getmtime(table_path)
+    os.utime(table_path, (mtime + 5, mtime + 5))
+
+    assert table.maybe_reload()
+    assert table.get((1, 2000)) == ("Initial Access", "T1190", 1.0)
+    assert table.get((1, 1000)) is None
+
+    # file lỗi -> giữ bảng cũ
+    table_path.write_text("{broken", encoding="utf-8")
+    assert not table.reload()
+    assert len(table) == 1
+
+
+# ===== Engine + build_mitre_doc =====
+def test_engine_short_circuits_known_sids(make_engine, hits, table_path, assert_same_results):
+    table = SidLookupTable(str(table_path))
+    engine = make_engine(sid_table=table)
+    model_only = make_engine()
+
+    # gán SID đã biết cho 1/3 số hit
+    hits = [dict(hit, _source=dict(hit["_source"], snort=dict(hit["_source"]["snort"]))) for hit in hits]
+    for hit in hits[::3]:
+        hit["_source"]["snort"]["rule"] = "1:1000:7"
+    known = {i for i in range(len(hits)) if sid_key_from_hit(hits[i]) in {(1, 1000), (1, 1001)}}
+    assert known
+
+    sent_to_model = []
+    process_with_model = engine._process_with_model
+
+    def spy(batch):
+        sent_to_model.extend(batch)
+        return process_with_model(batch)
+
+    engine._process_with_model = spy
+    results = engine.process_batch(hits)
+
+    # SID đã biết không chạy model
+    assert len(sent_to_model) == len(hits) - len(known)
+    unknown = [i for i in range(len(hits)) if i not in known]
+    assert_same_results([results[i] for i in unknown], model_only.process_batch([hits[i] for i in unknown]))
+
+    for i in known:
+        tactic, technique, conf = table.get(sid_key_from_hit(hits[i]))
+        assert results[i]["explain"] == SID_TABLE_EXPLAIN
+
+        doc = build_mitre_doc(results[i])
+        assert doc["mitre_mapped"] is True
+        assert (doc["tactic"], doc["technique"], doc["confidence"]) == (tactic, technique, conf)
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+import scheduler.snort_normalize_worker as worker
+
+PAGES = 6
+PAGE_SIZE = 4
+
+
+class FakeES:
+    """
+    search_after giống ES: sort = [ts, _id], trả page kế tiếp sau search_after
+    """
+
+    def __init__(self, total: int):
+        self.hits = [
+            {"_id": f"id-{i:03d}", "sort": [i, f"id-{i:03d}"], "_source": {"@timestamp": str(i)}}
+            for i in range(total)
+        ]
+        self.calls = []
+
+    def search(self, index, body):
+        search_after = body.get("search_after")
+        start = 0 if not search_after else search_after[0] + 1
+        self.calls.append(start)
+        return {"hits": {"hits": self.hits[start:start + body["size"]]}}
+
+
+class FakeCollection:
+    """
+    bulk_write chậm (để fetch / normalize chạy trước), lỗi ở page fail_on_page
+    """
+
+    def __init__(self, fail_on_page: int):
+        self.fail_on_page = fail_on_page
+        self.pages = []
+        self.lock = threading.Lock()
+
+    def bulk_write(self, ops, ordered=True):
+        time.sleep(0.01)
+        ids = [op._filter["_id"] for op in ops]
+        with self.lock:
+            if len(self.pages) == self.fail_on_page:
+                raise RuntimeError("mongo down")
+            self.pages.append(ids)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    commits = []
+
+    def persist(search_after):
+        commits.append(list(search_after))
+
+    def normalize_hit(hit):
+        return {"elastic_id": hit["_id"]}
+
+    monkeypatch.setattr(worker, "persist_search_after", persist)
+    monkeypatch.setattr(worker, "normalize_hit", normalize_hit)
+    monkeypatch.setattr(worker, "BATCH_SIZE", PAGE_SIZE)
+    monkeypatch.setattr(worker, "POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(worker, "PIPELINE_QUEUE_SIZE", 2)
+    return commits
+
+
+def _run(es, col, search_after=None):
+    result = {}
+    t = threading.Thread(
+        target=lambda: result.setdefault("offset", worker.run_pipeline_once(es, col, search_after)),
+        daemon=True,
+    )
+    t.start()
+    t.join(timeout=30)
+    assert not t.is_alive(), "run_pipeline_once không dừng sau lỗi write"
+    return result["offset"]
+
+
+# ===== Commit order =====
+def test_pages_committed_in_fetch_order(pipeline):
+    commits = pipeline
+    es = FakeES(PAGES * PAGE_SIZE)
+    # ghi xong mọi page rồi lỗi ở page kế tiếp (ES không còn log -> không có page nào nữa)
+    col = FakeCollection(fail_on_page=PAGES)
+    es.hits.append({"_id": "id-poison", "sort": [PAGES * PAGE_SIZE, "id-poison"], "_source": {}})
+
+    offset = _run(es, col)
+
+    # mọi page được ghi đúng 1 lần, đúng thứ tự
+    written = [i for page in col.pages for i in page]
+    assert written == [f"id-{i:03d}" for i in range(PAGES * PAGE_SIZE)]
+
+    # offset tăng dần, mỗi commit = hit cuối của page đã ghi
+    assert commits == [[(p + 1) * PAGE_SIZE - 1, f"id-{(p + 1) * PAGE_SIZE - 1:03d}"] for p in range(PAGES)]
+    assert offset == commits[-1]
+
+
+def test_failed_write_keeps_last_committed_offset(pipeline):
+    commits = pipeline
+    es = FakeES(PAGES * PAGE_SIZE)
+    col = FakeCollection(fail_on_page=2)
+
+    offset = _run(es, col)
+
+    # page 3 lỗi -> chỉ 2 page đầu được commit, dù fetch đã chạy trước
+    assert len(col.pages) == 2
+    assert offset == [2 * PAGE_SIZE - 1, f"id-{2 * PAGE_SIZE - 1:03d}"]
+    assert commits[-1] == offset
+
+    # restart từ offset đã commit -> không mất / không trùng page
+    col.fail_on_page = PAGES
+    es.hits.append({"_id": "id-poison", "sort": [PAGES * PAGE_SIZE, "id-poison"], "_source": {}})
+    offset = _run(es, col, offset)
+
+    written = [i for page in col.pages for i in page]
+    assert written == [f"id-{i:03d}" for i in range(PAGES * PAGE_SIZE)]
+    assert commits == sorted(commits)
+    assert offset == [PAGES * PAGE_SIZE - 1, f"id-{PAGES * PAGE_SIZE - 1:03d}"]
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from AI_MITRE.Catboost.training import train_grid
+
+TACTICS = ["Reconnaissance", "Initial Access", "Credential Access"]
+
+
+def _write_csv(path, n=90, seed=1):
+    rnd = np.random.default_rng(seed)
+    pd.DataFrame({
+        "network.transport": rnd.choice(["tcp", "udp", "icmp"], size=n),
+        "destination.port": rnd.choice([22, 53, 80, 443], size=n),
+        "event.severity": rnd.choice([1.0, 2.0, np.nan], size=n),
+        "threat.tactic.name": [TACTICS[i % 3] for i in range(n)],
+        "threat.technique.name": ["T1595"] * n,
+    }).to_csv(path, index=False)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    calls = []
+    build_cache = train_grid.build_cache
+
+    def spy(data_path, target, cache_dir, *args):
+        calls.append(cache_dir)
+        return build_cache(data_path, target, cache_dir, *args)
+
+    monkeypatch.setattr(train_grid, "build_cache", spy)
+    return calls
+
+
+# ===== Preprocess =====
+def test_prepare_tactic_selects_object_columns_like_tactic_script():
+    X = pd.DataFrame({
+        "obj": pd.Series(["a", None], dtype=object),
+        "num_nan": [1.0, np.nan],
+        "num": [1, 2],
+        "flag": [True, False],
+        "cat": pd.Categorical(["a", "b"]),
+        "when": pd.to_datetime(["2025-01-01", "2025-01-02"]),
+    })
+    X, cat_features = train_grid.prepare_tactic(X)
+
+    # train_tacticmodel.py: fillna("unknown") rồi dtype == object
+    assert cat_features == ["obj", "num_nan"]
+    assert X["obj"].tolist() == ["a", "unknown"]
+    assert X["num_nan"].tolist() == ["1.0", "unknown"]
+
+
+# ===== Pool cache =====
+def test_cache_hit_reuses_quantized_pool(tmp_path, builds):
+    csv = tmp_path / "logs.csv"
+    _write_csv(csv)
+    root = str(tmp_path / "cache")
+
+    first = train_grid.load_or_build_cache(str(csv), "tactic", root, border_count=32)
+    assert len(builds) == 1
+    assert first.manifest["classes"] == sorted(TACTICS)
+    assert first.manifest["cat_features"] == ["network.transport", "event.severity"]
+    assert first.manifest["train_rows"] + first.manifest["test_rows"] == 90
+
+    second = train_grid.load_or_build_cache(str(csv), "tactic", root, border_count=32)
+    assert len(builds) == 1
+    assert second.dir == first.dir
+    assert second.train_pool().num_row() == first.manifest["train_rows"]
+    assert second.test_pool().num_row() == first.manifest["test_rows"]
+
+    # --rebuild-cache
+    train_grid.load_or_build_cache(str(csv), "tactic", root, border_count=32, rebuild=True)
+    assert builds == [first.dir, first.dir]
+
+
+def test_cache_invalidated_on_csv_or_params_change(tmp_path, builds):
+    csv = tmp_path / "logs.csv"
+    _write_csv(csv)
+    root = str(tmp_path / "cache")
+
+    first = train_grid.load_or_build_cache(str(csv), "tactic", root, border_count=32)
+
+    # CSV đổi nội dung -> checksum khác -> build cache mới
+    _write_csv(csv, seed=2)
+    changed = train_grid.load_or_build_cache(str(csv), "tactic", root, border_count=32)
+    assert changed.dir != first.dir
+    assert changed.manifest["source_checksum"] != first.manifest["source_checksum"]
+
+    # tham số quantize / target khác -> key khác
+    train_grid.load_or_build_cache(str(csv), "tactic", root, border_count=64)
+    train_grid.load_or_build_cache(str(csv), "technique", root, border_count=32)
+    assert len(builds) == 4 and len(set(builds)) == 4
+    assert all(os.path.isfile(os.path.join(d, train_grid.MANIFEST_FILE)) for d in builds)
+
+
+def test_grid_trains_from_cache(tmp_path):
+    csv = tmp_path / "logs.csv"
+    _write_csv(csv)
+    cache = train_grid.load_or_build_cache(str(csv), "tactic", str(tmp_path / "cache"), border_count=32)
+
+    results = train_grid.run_grid(cache, "tactic", [2], [0.1], [5, 10], parallel=2, threads=2)
+    assert {r["iterations"] for r in results} == {5, 10}
+    assert all(0.0 <= r["f1_macro"] <= 1.0 for r in results)
+    assert results == sorted(results, key=lambda r: r["f1_macro"], reverse=True)
@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+
+import joblib
+import pandas as pd
+import pytest
+
+from AI_MITRE.Catboost.training import warm_start
+from AI_MITRE.Catboost.training.build_dataset import MANIFEST_FILE, PARTS_DIR, load_dataset
+
+
+def _labeled(feature_frame, classes):
+    # nhãn học được (theo destination.port) -> model train tiếp hơn hẳn model gốc (nhãn ngẫu nhiên)
+    ports = sorted(feature_frame["destination.port"].unique())
+    label_of = {port: classes[i % len(classes)] for i, port in enumerate(ports)}
+    df = feature_frame.copy()
+    df[warm_start.TACTIC_COL] = df["destination.port"].map(label_of)
+    df[warm_start.TECHNIQUE_COL] = "T1595"
+    return df
+
+
+def _write_dataset(out_dir, df):
+    # layout của build_dataset.py: manifest + parts/*.parquet
+    os.makedirs(os.path.join(out_dir, PARTS_DIR))
+    df.to_parquet(os.path.join(out_dir, PARTS_DIR, "part-00000.parquet"), index=False)
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"sources": {}, "parts": [{"file": "part-00000.parquet", "rows": len(df)}],
+                   "class_counts": {}, "rows": len(df)}, f)
+
+
+@pytest.fixture
+def data(registry, feature_frame, tmp_path):
+    _, encoder_path = registry.paths("tactic", "t1")
+    df = _labeled(feature_frame, list(joblib.load(encoder_path).classes_))
+
+    new_csv = tmp_path / "new.csv"
+    df.iloc[:200].to_csv(new_csv, index=False)
+
+    replay_dir = str(tmp_path / "dataset")
+    _write_dataset(replay_dir, df.iloc[200:])
+    return str(new_csv), replay_dir
+
+
+def _run(monkeypatch, registry, *args):
+    argv = ["warm_start", "--kind", "tactic", "--registry", registry.root, "--iterations", "30", "--lr", "0.3", *args]
+    monkeypatch.setattr(sys, "argv", argv)
+    warm_start.main()
+
+
+# ===== Holdout gate =====
+def test_holdout_gate():
+    improved = {"new": {"base_f1": 0.5, "new_f1": 0.7}, "replay": {"base_f1": 0.6, "new_f1": 0.6}}
+    assert warm_start.holdout_passed(improved, 0.0)
+    assert not warm_start.holdout_passed(improved, 0.1)
+
+    # tốt hơn trên dữ liệu mới nhưng quên dữ liệu cũ -> không promote
+    forgot = {"new": {"base_f1": 0.5, "new_f1": 0.9}, "replay": {"base_f1": 0.6, "new_f1": 0.59}}
+    assert not warm_start.holdout_passed(forgot, 0.0)
+    assert not warm_start.holdout_passed({}, 0.0)
+
+
+def test_promote_registers_and_activates(monkeypatch, registry, data):
+    new_csv, replay_dir = data
+    _run(monkeypatch, registry, "--data", new_csv, "--replay", replay_dir, "--promote")
+
+    version = registry.active_version("tactic")
+    assert version != "t1"
+    extra = registry.metadata("tactic", version)["extra"]
+    assert extra["warm_start_from"]["version"] == "t1"
+    assert set(extra["holdout"]) == {"new", "replay"}
+    assert all(r["new_f1"] >= r["base_f1"] for r in extra["holdout"].values())
+
+    # model mới có thêm cây, load được qua registry
+    assert registry.load_predictor("tactic").model.tree_count_ == 30 + registry.load_predictor("tactic", "t1").model.tree_count_
+
+
+def test_no_promotion_when_gate_fails(monkeypatch, registry, data):
+    new_csv, replay_dir = data
+    with pytest.raises(SystemExit) as exc:
+        _run(monkeypatch, registry, "--data", new_csv, "--replay", replay_dir, "--promote", "--min-gain", "1.0")
+
+    assert exc.value.code == 1
+    assert registry.active_version("tactic") == "t1"
+    assert registry.versions("tactic") == ["t1"]
+
+
+def test_replay_dir_is_read_only(monkeypatch, registry, data, tmp_path):
+    new_csv, replay_dir = data
+    # part lạ (build_dataset đang ghi song song) không được bị xoá
+    stray = os.path.join(replay_dir, PARTS_DIR, "part-00001-inprogress.parquet")
+    with open(stray, "wb") as f:
+        f.write(b"partial")
+    manifest = open(os.path.join(replay_dir, MANIFEST_FILE), encoding="utf-8").read()
+
+    assert len(load_dataset(replay_dir)) == 200
+    _run(monkeypatch, registry, "--data", new_csv, "--replay", replay_dir, "--out", str(tmp_path / "m.cbm"))
+
+    assert os.path.isfile(stray)
+    assert open(os.path.join(replay_dir, MANIFEST_FILE), encoding="utf-8").read() == manifest
+
+    with pytest.raises(FileNotFoundError):
+        load_dataset(str(tmp_path / "missing"))
+
+
+def test_missing_class_aborts(monkeypatch, registry, data):
+    new_csv, _ = data
+    # không có replay, dữ liệu mới thiếu class -> dừng, không train
+    df = pd.read_csv(new_csv)
+    first = df[warm_start.TACTIC_COL].iloc[0]
+    df[df[warm_start.TACTIC_COL] != first].to_csv(new_csv, index=False)
+
+    with pytest.raises(SystemExit, match="thiếu"):
+        _run(monkeypatch, registry, "--data", new_csv)
@@ -0,0 +1,208 @@
+# AI_MITRE/Catboost/inference/bulk_scoring.py
+"""
+Bulk labeling offline: đọc CSV theo chunk -> score song song trên process pool
+-> ghi nối tiếp ra CSV / Parquet theo đúng thứ tự input.
+
+- loader(*loader_args) chạy 1 lần trong mỗi worker (load model 1 lần / process),
+  trả về hàm score(chunk_df) -> out_df
+- Số chunk đang xử lý bị giới hạn (max_in_flight) -> RAM không phụ thuộc kích thước file
+- workers <= 1: chạy tuần tự trong process hiện tại (không pool)
+- Parquet: schema cố định từ chunk đầu (số -> float64, còn lại / cột toàn NaN -> string),
+  mọi chunk sau ép về schema đó
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import pandas as pd
+
+OUTPUT_FORMATS = ("csv", "parquet")
+
+# score function của worker hiện tại (set bởi _init_worker)
+_worker_score: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+
+
+def _init_worker(loader: Callable, loader_args: Sequence[Any]):
+    global _worker_score
+    _worker_score = loader(*loader_args)
+
+
+def _score_in_worker(chunk: pd.DataFrame) -> pd.DataFrame:
+    return _worker_score(chunk)
+
+
+def resolve_output_format(out_file: str, out_format: Optional[str] = None) -> str:
+    """
+    Format output: chỉ định rõ, hoặc đoán theo đuôi file (.parquet / .pq), mặc định csv
+    """
+    if out_format:
+        fmt = out_format.lower()
+    else:
+        ext = os.path.splitext(out_file)[1].lower()
+        fmt = "parquet" if ext in (".parquet", ".pq") else "csv"
+
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"out_format must be one of {OUTPUT_FORMATS}")
+    return fmt
+
+
+def output_schema(df: pd.DataFrame):
+    """
+    Schema Parquet cố định cho cả file: cột số -> float64, bool -> bool, còn lại -> string.
+    Cột toàn NaN ở chunk đầu (pandas đoán float64) -> string: chunk sau có thể là chữ.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for name, col in df.items():
+        if pd.api.types.is_bool_dtype(col):
+            typ = pa.bool_()
+        elif pd.api.types.is_numeric_dtype(col) and col.notna().any():
+            typ = pa.float64()
+        else:
+            typ = pa.string()
+        fields.append(pa.field(str(name), typ))
+    return pa.schema(fields)
+
+
+def conform_to_schema(df: pd.DataFrame, schema) -> pd.DataFrame:
+    """
+    Ép chunk về schema: cột string -> str (NaN -> null), float64 -> số (chữ -> lỗi rõ cột).
+    """
+    import pyarrow as pa
+
+    out = pd.DataFrame(index=df.index)
+    for field in schema:
+        if field.name not in df.columns:
+            out[field.name] = None
+            continue
+        col = df[field.name]
+        if pa.types.is_string(field.type):
+            out[field.name] = col.astype(object).where(col.notna(), None).map(
+                lambda v: v if v is None or isinstance(v, str) else str(v)
+            )
+        elif pa.types.is_floating(field.type):
+            try:
+                out[field.name] = pd.to_numeric(col, errors="raise").astype("float64")
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Column {field.name!r} is numeric in the first chunk but not here: {e}") from e
+        else:
+            out[field.name] = col
+    return out
+
+
+class ChunkWriter:
+    """
+    Ghi nối tiếp từng chunk ra 1 file output.
+    - csv: chunk đầu ghi header, các chunk sau append
+    - parquet: 1 ParquetWriter, mỗi chunk = 1 row group, schema cố định (output_schema)
+    """
+
+    def __init__(self, out_file: str, out_format: str = "csv"):
+        self.out_file = out_file
+        self.out_format = out_format
+        self.rows = 0
+        self.chunks = 0
+        self._parquet = None
+        self._schema = None
+
+        if out_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+                import pyarrow.parquet  # noqa: F401
+            except ImportError as e:
+                raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from e
+
+    def write(self, df: pd.DataFrame):
+        if self.out_format == "parquet":
+            self._write_parquet(df)
+        else:
+            first = self.chunks == 0
+            df.to_csv(self.out_file, index=False, mode="w" if first else "a", header=first)
+
+        self.rows += len(df)
+        self.chunks += 1
+
+    def _write_parquet(self, df: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._parquet is None:
+            self._schema = output_schema(df)
+            self._parquet = pq.ParquetWriter(self.out_file, self._schema)
+        table = pa.Table.from_pandas(conform_to_schema(df, self._schema), schema=self._schema, preserve_index=False)
+        self._parquet.write_table(table)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+    def __enter__(self) -> "ChunkWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def score_csv_chunks(
+    in_file: str,
+    out_file: str,
+    loader: Callable,
+    loader_args: Sequence[Any] = (),
+    chunksize: int = 100_000,
+    workers: int = 1,
+    out_format: Optional[str] = None,
+    max_in_flight: Optional[int] = None,
+    dtype: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Score in_file theo chunk, ghi out_file đúng thứ tự input. Trả về số dòng đã ghi.
+
+    loader phải là hàm module-level (pickle được) vì chạy lại trong từng worker.
+    dtype: kiểu cột cố định khi đọc (vd cột chữ = str) -> mọi chunk cùng kiểu.
+    """
+    fmt = resolve_output_format(out_file, out_format)
+    workers = max(1, int(workers or 1))
+    chunks = pd.read_csv(in_file, low_memory=False, chunksize=chunksize, dtype=dtype)
+
+    with ChunkWriter(out_file, fmt) as writer:
+        if workers == 1:
+            score = loader(*loader_args)
+            for chunk in chunks:
+                writer.write(score(chunk))
+                print(f"🔹 Chunk {writer.chunks - 1}: {len(chunk)} rows (total {writer.rows})")
+        else:
+            _score_parallel(chunks, writer, loader, loader_args, workers, max_in_flight or workers * 2)
+
+    print(f"✅ Wrote {writer.rows} rows ({writer.chunks} chunks, {fmt}, workers={workers}): {out_file}")
+    return writer.rows
+
+
+def _score_parallel(chunks, writer: ChunkWriter, loader, loader_args, workers: int, max_in_flight: int):
+    """
+    Submit chunk vào pool, tối đa max_in_flight chunk cùng lúc.
+    Luôn chờ future cũ nhất -> output giữ đúng thứ tự input.
+    """
+    pending = deque()
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(loader, tuple(loader_args)),
+    ) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(_score_in_worker, chunk))
+            if len(pending) >= max_in_flight:
+                _write_next(pending, writer)
+
+        while pending:
+            _write_next(pending, writer)
+
+
+def _write_next(pending: deque, writer: ChunkWriter):
+    out = pending.popleft().result()
+    writer.write(out)
+    print(f"🔹 Chunk {writer.chunks - 1}: {len(out)} rows (total {writer.rows})")
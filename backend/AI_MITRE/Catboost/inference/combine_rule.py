@@ -1,22 +1,135 @@
 # AI_MITRE/Catboost/inference/combine_rule.py
 
 import json
-from typing import List, Optional
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.lazy import LazyResource
 
 # --------------------------------------------------
-# LOAD MAPPING ONCE (khi backend start)
+# LOAD MAPPING ONCE (lazy, lần dùng đầu tiên)
 # --------------------------------------------------
 
-_MAPPING_PATH = "AI_MITRE/Catboost/config/mapping_tactic_technique.json"
+# Đường dẫn tính theo vị trí file -> không phụ thuộc thư mục chạy
+_MAPPING_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "config",
+    "mapping_tactic_technique.json",
+)
+
+
+def _load_mapping() -> Dict[str, List[str]]:
+    with open(_MAPPING_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+_mapping = LazyResource("tactic_technique_mapping", _load_mapping)
+
+
+def get_tactic_technique_mapping() -> Dict[str, List[str]]:
+    return _mapping.get()
+
+
+def __getattr__(name):
+    # Giữ tương thích: combine_rule.TACTIC_TECHNIQUE_MAPPING
+    if name == "TACTIC_TECHNIQUE_MAPPING":
+        return get_tactic_technique_mapping()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-with open(_MAPPING_PATH, "r", encoding="utf-8") as f:
-    TACTIC_TECHNIQUE_MAPPING = json.load(f)
+
+# --------------------------------------------------
+# PRECOMPUTED MASK (compile 1 lần theo technique_labels)
+# --------------------------------------------------
+
+class TacticTechniqueMask:
+    """
+    Mapping tactic -> technique hợp lệ, compile thành mask boolean
+    khớp thứ tự technique_labels (cột probs của model technique).
+    - matrix[i, j] = True nếu technique_labels[j] hợp lệ cho tactic i
+    - hàng cuối toàn False: tactic không có mapping
+    - single_technique: tactic chỉ có đúng 1 technique hợp lệ trong technique_labels
+      (combine luôn ra technique đó, không cần probs)
+    """
+
+    def __init__(
+        self,
+        technique_labels: Sequence[str],
+        mapping: Optional[Dict[str, List[str]]] = None,
+    ):
+        if mapping is None:
+            mapping = get_tactic_technique_mapping()
+
+        self.technique_labels = np.asarray(technique_labels)
+        self.tactics = list(mapping.keys())
+        self.tactic_index = {tactic: i for i, tactic in enumerate(self.tactics)}
+
+        self.matrix = np.zeros((len(self.tactics) + 1, len(self.technique_labels)), dtype=bool)
+        for tactic, techs in mapping.items():
+            self.matrix[self.tactic_index[tactic]] = np.isin(self.technique_labels, list(techs or []))
+
+        self._no_mapping = len(self.tactics)
+
+        self.single_technique: Dict[str, str] = {
+            tactic: str(self.technique_labels[self.matrix[i].argmax()])
+            for tactic, i in self.tactic_index.items()
+            if self.matrix[i].sum() == 1
+        }
+
+    def rows_for(self, tactics: Sequence[str]) -> np.ndarray:
+        """
+        tactics (n) -> mask (n x n_labels); chỉ tra dict cho các tactic distinct
+        """
+        uniques, inverse = np.unique(np.asarray(tactics, dtype=object).astype(str), return_inverse=True)
+        idx = np.array([self.tactic_index.get(t, self._no_mapping) for t in uniques], dtype=int)
+        return self.matrix[idx[inverse.ravel()]]
+
+
+@lru_cache(maxsize=8)
+def mask_for_labels(technique_labels: Tuple[str, ...]) -> TacticTechniqueMask:
+    """
+    Mask (mapping mặc định) compile 1 lần cho mỗi bộ technique_labels
+    """
+    return TacticTechniqueMask(technique_labels)
 
 
 # --------------------------------------------------
 # RULE-BASED COMBINE
 # --------------------------------------------------
 
+def combine_tactic_technique_batch(
+    tactics: Sequence[str],
+    technique_probs,
+    mask: TacticTechniqueMask,
+) -> List[Optional[str]]:
+    """
+    Combine tactic + technique cho cả batch (masked argmax, không loop Python)
+
+    Params:
+        tactics           : list tactic dự đoán (n)
+        technique_probs   : ma trận probability (n x n_labels) từ model technique
+        mask              : TacticTechniqueMask compile theo technique_labels
+
+    Return:
+        list final technique (string) hoặc None, đúng thứ tự input
+    """
+    if len(tactics) == 0:
+        return []
+
+    probs = np.asarray(technique_probs, dtype=float)
+    valid = mask.rows_for(tactics)
+
+    # Technique không hợp lệ -> -inf, rồi argmax theo hàng
+    best_idx = np.where(valid, probs, -np.inf).argmax(axis=1)
+    has_valid = valid.any(axis=1)
+
+    labels = mask.technique_labels[best_idx].astype(object)
+    labels[~has_valid] = None
+    return labels.tolist()
+
+
 def combine_tactic_technique(
     tactic: str,
     technique_probs: List[float],
@@ -33,31 +146,22 @@ def combine_tactic_technique(
     Return:
         final technique (string) hoặc None
     """
-
-    # 1️⃣ Lấy technique hợp lệ theo tactic
-    valid_techniques = TACTIC_TECHNIQUE_MAPPING.get(tactic)
-
-    # Không có mapping → fallback
-    if not valid_techniques:
+    if not technique_probs:
         return None
 
-    # 2️⃣ Lấy index của technique hợp lệ
-    valid_indices = [
-        i
-        for i, tech in enumerate(technique_labels)
-        if tech in valid_techniques
-    ]
+    mask = mask_for_labels(tuple(str(label) for label in technique_labels))
+    return combine_tactic_technique_batch([tactic], [technique_probs], mask)[0]
 
-    if not valid_indices:
-        return None
 
-    # 3️⃣ Chọn technique hợp lệ có xác suất cao nhất
-    best_idx = max(
-        valid_indices,
-        key=lambda idx: technique_probs[idx]
-    )
+def is_mapped(result: Optional[Dict[str, Any]]) -> bool:
+    """
+    Result có technique -> mapped (mitre_mapped của worker + counter mapped / unmapped).
+    None (drop_if_low_conf), cascade bỏ qua technique, prefilter -> unmapped.
+    Fallback technique_raw (tactic không có technique hợp lệ) vẫn là mapped.
+    """
+    return bool(result) and result.get("technique") is not None
+
 
-    return technique_labels[best_idx]
 if __name__ == "__main__":
     tactic = "Reconnaissance"
 
@@ -71,3 +175,4 @@ if __name__ == "__main__":
     )
 
     print("✅ Final technique:", final)
+
@@ -1,16 +1,64 @@
 # AI_MITRE/Catboost/inference/engine.py
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
+from catboost import FeaturesData
+
+from core.metrics import get_metrics
+from AI_MITRE.Catboost.preprocessing.normalize_elastic import normalize_elastic_log
 from AI_MITRE.Catboost.inference.tactic_predictor import TacticPredictor
 from AI_MITRE.Catboost.inference.technique_predictor import TechniquePredictor
-from AI_MITRE.Catboost.inference.combine_rule import combine_tactic_technique
+from AI_MITRE.Catboost.inference.joint_predictor import JointPredictor
+from AI_MITRE.Catboost.inference.combine_rule import combine_tactic_technique_batch, is_mapped
+from AI_MITRE.Catboost.inference.prediction_cache import PredictionCache, TIMESTAMP_EXACT
+from AI_MITRE.Catboost.inference.sid_lookup import SidLookupTable, sid_key_from_hit
+
+SID_TABLE_EXPLAIN = "Signature lookup: tactic/technique precomputed for this Snort SID (gid:sid)."
+
+# Cascade: lý do bỏ qua model technique
+SKIP_LOW_TACTIC_CONF = "low_tactic_confidence"
+SKIP_SINGLE_TECHNIQUE = "single_technique_mapping"
+
+CASCADE_EXPLAIN = {
+    SKIP_LOW_TACTIC_CONF: "Cascade: tactic confidence below min_tactic_conf; technique model skipped.",
+    SKIP_SINGLE_TECHNIQUE: "Cascade: MITRE mapping allows exactly one technique for this tactic; technique model skipped.",
+}
+
+# Metrics (core.metrics) dùng chung với mitre_worker / mitre_storage, sống qua hot swap engine
+METRICS_NAME = "mitre"
+
+# (tactic, tactic_conf, technique_raw, tech_conf, final_tech, skip_reason)
+Prediction = Tuple[str, float, Optional[str], float, Optional[str], Optional[str]]
+
+
+def _timestamp_index(feature_names: List[str]) -> Optional[int]:
+    try:
+        return feature_names.index("@timestamp")
+    except ValueError:
+        return None
 
 
 class MitreEngine:
     """
     Realtime MITRE Engine:
       Elastic log (dict) -> tactic -> technique(probs) -> combine_rule -> result dict
+
+    Joint mode (joint_predictor): 1 model predict thẳng cặp (tactic, technique)
+    trong mapping -> không chạy 2 model, không cần combine_rule.
+
+    sid_table: tra bảng SID -> (tactic, technique, confidence) trước,
+    chỉ SID chưa có trong bảng mới chạy model.
+
+    cascade: chạy model tactic trước, chỉ chạy model technique khi cần
+    (bỏ qua nếu tactic_conf < min_tactic_conf hoặc tactic chỉ có 1 technique hợp lệ).
+
+    metrics: latency histogram từng stage (sid_lookup, feature_build, pool_build,
+    tactic_predict, technique_predict, joint_predict, combine) + counter
+    (events, sid_table_hit, mapped, unmapped, fallback_raw_technique,
+    technique_skipped.<lý do cascade>).
+
+    Cascade bỏ qua technique vì tactic_conf thấp -> result có technique=None
+    (worker ghi mitre_mapped=False), tính vào unmapped (is_mapped).
     """
 
     def __init__(
@@ -19,10 +67,32 @@ class MitreEngine:
         min_technique_conf: float = 0.0,
         min_final_conf: float = 0.0,
         drop_if_low_conf: bool = False,
+        cache_size: int = 0,
+        cache_timestamp: str = TIMESTAMP_EXACT,
+        cache_timestamp_bucket_sec: float = 60.0,
+        tactic_predictor: Optional[TacticPredictor] = None,
+        technique_predictor: Optional[TechniquePredictor] = None,
+        joint_predictor: Optional[JointPredictor] = None,
+        sid_table: Optional[SidLookupTable] = None,
+        cascade: bool = False,
     ):
-        # Load models once
-        self.tactic_predictor = TacticPredictor()
-        self.technique_predictor = TechniquePredictor()
+        # Load models once (hoặc dùng predictor truyền vào: model path khác, benchmark...)
+        self.joint_predictor = joint_predictor
+        if joint_predictor is not None:
+            self.tactic_predictor = None
+            self.technique_predictor = None
+            self.schema = joint_predictor.schema
+            self.shared_schema = True
+        else:
+            self.tactic_predictor = tactic_predictor or TacticPredictor()
+            self.technique_predictor = technique_predictor or TechniquePredictor()
+            self.schema = self.tactic_predictor.schema
+
+            # 2 model cùng schema -> build row 1 lần, dùng chung
+            self.shared_schema = self.tactic_predictor.schema == self.technique_predictor.schema
+
+        # Version model (registry) -> ghi vào từng kết quả; None = load từ path cố định
+        self.model_version = self._model_versions()
 
         # Thresholds (tuỳ chọn)
         self.min_tactic_conf = float(min_tactic_conf)
@@ -32,35 +102,302 @@ class MitreEngine:
         # Nếu True và confidence < threshold -> trả None (không show)
         self.drop_if_low_conf = bool(drop_if_low_conf)
 
+        # Cascade tactic -> technique (không áp dụng cho joint mode)
+        self.cascade = bool(cascade) and joint_predictor is None
+
+        # Cache kết quả model theo feature tuple (opt-in, cache_size=0 -> tắt)
+        self.cache: Optional[PredictionCache] = None
+        if cache_size > 0:
+            self.cache = PredictionCache(
+                max_size=cache_size,
+                timestamp_mode=cache_timestamp,
+                timestamp_bucket_sec=cache_timestamp_bucket_sec,
+            )
+        # Bảng SID (opt-in), tra trước model
+        self.sid_table = sid_table
+
+        self.metrics = get_metrics(METRICS_NAME)
+
+        self._tactic_ts_index = _timestamp_index(self.schema.feature_names)
+        self._technique_ts_index = None
+        if not self.shared_schema:
+            self._technique_ts_index = _timestamp_index(self.technique_predictor.feature_names)
+
+    @property
+    def joint(self) -> bool:
+        return self.joint_predictor is not None
+
+    def _model_versions(self) -> Dict[str, Optional[str]]:
+        if self.joint:
+            return {"joint": getattr(self.joint_predictor, "model_version", None)}
+        return {
+            "tactic": getattr(self.tactic_predictor, "model_version", None),
+            "technique": getattr(self.technique_predictor, "model_version", None),
+        }
+
+    def build_feature_rows(
+        self, hits: List[Dict[str, Any]]
+    ) -> Tuple[List[List[Any]], List[List[Any]]]:
+        """
+        Feature stage: mỗi hit được normalize đúng 1 lần -> typed row.
+        Return (tactic_rows, technique_rows); cùng 1 list nếu 2 model chung schema.
+        """
+        with self.metrics.timer("feature_build"):
+            features_list = [normalize_elastic_log(hit) for hit in hits]
+
+            tactic_rows = self.schema.build_rows(features_list)
+            if self.shared_schema:
+                return tactic_rows, tactic_rows
+
+            technique_rows = self.technique_predictor.schema.build_rows(features_list)
+            return tactic_rows, technique_rows
+
     def process_log(self, elastic_log: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
-        Process 1 log Elastic và trả kết quả MITRE.
+        Process 1 log Elastic (raw hit) và trả kết quả MITRE.
         Return None nếu drop_if_low_conf=True và không đạt ngưỡng.
         """
+        return self.process_batch([elastic_log])[0]
+
+    def process_batch(self, hits: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Process nhiều hit Elastic cùng lúc (1 page của mitre_worker).
+        - Normalize mỗi hit 1 lần (build_feature_rows)
+        - Mỗi model chỉ được gọi 1 lần trên toàn bộ batch
+        Return list kết quả đúng thứ tự hits (None giống process_log).
+        """
+        if not hits:
+            return []
+
+        if self.sid_table is None:
+            results = self._process_with_model(hits)
+        else:
+            results = self._process_with_sid_table(hits)
+
+        # mapped + unmapped = events (lý do chi tiết: technique_skipped.*, fallback_raw_technique)
+        mapped = sum(1 for result in results if is_mapped(result))
+        self.metrics.incr("events", len(hits))
+        self.metrics.incr("mapped", mapped)
+        self.metrics.incr("unmapped", len(hits) - mapped)
+        return results
+
+    def _process_with_sid_table(self, hits: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        # 1) SID lookup (O(1) / event), file bảng đổi -> reload
+        with self.metrics.timer("sid_lookup"):
+            self.sid_table.maybe_reload()
+
+            results: List[Optional[Dict[str, Any]]] = [None] * len(hits)
+            unknown: List[int] = []
+            for i, hit in enumerate(hits):
+                entry = self.sid_table.get(sid_key_from_hit(hit))
+                if entry is None:
+                    unknown.append(i)
+                    continue
+                tactic, technique, conf = entry
+                results[i] = self._build_result(tactic, conf, technique, conf, technique, explain=SID_TABLE_EXPLAIN)
+
+        self.metrics.incr("sid_table_hit", len(hits) - len(unknown))
+
+        # 2) SID chưa biết -> model
+        if unknown:
+            model_results = self._process_with_model([hits[i] for i in unknown])
+            for i, result in zip(unknown, model_results):
+                results[i] = result
+
+        return results
+
+    def _process_with_model(self, hits: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Model path: feature rows -> predict (có / không cache) -> result dict
+        """
+        tactic_rows, technique_rows = self.build_feature_rows(hits)
+
+        if self.cache is None:
+            predictions = self._predict_rows(tactic_rows, technique_rows)
+        else:
+            predictions = self._predict_rows_cached(tactic_rows, technique_rows)
+
+        self.metrics.incr("model_events", len(predictions))
+        for prediction in predictions:
+            skip_reason = prediction[5]
+            if skip_reason is not None:
+                self.metrics.incr(f"technique_skipped.{skip_reason}")
+            elif prediction[4] is None and not self.joint:
+                # không có technique hợp lệ trong mapping -> _build_result dùng technique_raw
+                self.metrics.incr("fallback_raw_technique")
+
+        return [self._build_result(*prediction) for prediction in predictions]
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        return self.cache.stats() if self.cache is not None else None
+
+    def sid_table_stats(self) -> Optional[Dict[str, Any]]:
+        return self.sid_table.stats() if self.sid_table is not None else None
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        return self.metrics.snapshot()
+
+    def _predict_rows(
+        self,
+        tactic_rows: List[List[Any]],
+        technique_rows: List[List[Any]],
+    ) -> List[Prediction]:
+        """
+        Chạy model trên typed rows.
+        Return list (tactic, tactic_conf, technique_raw, tech_conf, final_tech, skip_reason)
+        """
+        if not tactic_rows:
+            return []
+
+        if self.joint:
+            with self.metrics.timer("pool_build"):
+                data = self.schema.encode(tactic_rows)
+            with self.metrics.timer("joint_predict"):
+                joint_results = self.joint_predictor.predict_rows(data)
+
+            # 1 model: cặp (tactic, technique) đã hợp lệ theo mapping
+            return [
+                (tactic, tactic_conf, technique, pair_conf, technique, None)
+                for tactic, tactic_conf, technique, pair_conf in joint_results
+            ]
+
+        # Encode (FeaturesData) ở engine -> đo riêng pool_build và predict.
+        # 2 model chung schema -> encode 1 lần, dùng cho cả 2 (cascade: technique encode sau, chỉ event còn lại)
+        with self.metrics.timer("pool_build"):
+            tactic_data = self.schema.encode(tactic_rows)
+        if self.shared_schema and not self.cascade:
+            technique_rows = tactic_data
 
         # 1) Predict tactic
-        tactic, tactic_conf = self.tactic_predictor.predict(elastic_log)
-
-        # 2) Predict technique (full probs)
-        tech_result = self.technique_predictor.predict(elastic_log)
-        technique_raw = tech_result["technique"]
-        tech_conf = float(tech_result["confidence"])
-        probs = tech_result["probs"]
-        labels = tech_result["labels"]
-
-        # 3) Combine (MITRE rule-based)
-        final_tech = combine_tactic_technique(
-            tactic=tactic,
-            technique_probs=probs,
-            technique_labels=labels,
-        )
-
-        explain = ""
-        if final_tech is None:
+        with self.metrics.timer("tactic_predict"):
+            tactic_results = self.tactic_predictor.predict_rows(tactic_data)
+
+        if not self.cascade:
+            return self._predict_techniques(tactic_results, technique_rows)
+
+        # 2) Cascade: chỉ chạy model technique cho event còn lại
+        single = self.technique_predictor.tactic_mask.single_technique
+        predictions: List[Any] = [None] * len(tactic_results)
+        remaining: List[int] = []
+
+        for i, (tactic, tactic_conf) in enumerate(tactic_results):
+            if tactic_conf < self.min_tactic_conf:
+                predictions[i] = (tactic, tactic_conf, None, 0.0, None, SKIP_LOW_TACTIC_CONF)
+            elif tactic in single:
+                # technique do tactic quyết định -> confidence = tactic_conf
+                technique = single[tactic]
+                predictions[i] = (tactic, tactic_conf, technique, tactic_conf, technique, SKIP_SINGLE_TECHNIQUE)
+            else:
+                remaining.append(i)
+
+        if remaining:
+            scored = self._predict_techniques(
+                [tactic_results[i] for i in remaining],
+                [technique_rows[i] for i in remaining],
+            )
+            for i, prediction in zip(remaining, scored):
+                predictions[i] = prediction
+
+        return predictions
+
+    def _predict_techniques(
+        self,
+        tactic_results: List[Tuple[str, float]],
+        technique_rows: List[List[Any]],
+    ) -> List[Prediction]:
+        """
+        Model technique (full probs) + combine theo tactic đã predict
+        """
+        if not isinstance(technique_rows, FeaturesData):
+            with self.metrics.timer("pool_build"):
+                technique_rows = self.technique_predictor.schema.encode(technique_rows)
+
+        with self.metrics.timer("technique_predict"):
+            techniques_raw, tech_confs, probs = self.technique_predictor.predict_matrix(technique_rows)
+
+        # Combine (MITRE rule-based, masked argmax cho cả batch)
+        tactics = [tactic for tactic, _ in tactic_results]
+        with self.metrics.timer("combine"):
+            final_techs = combine_tactic_technique_batch(
+                tactics=tactics,
+                technique_probs=probs,
+                mask=self.technique_predictor.tactic_mask,
+            )
+
+        return [
+            (tactic, tactic_conf, technique_raw, tech_conf, final_tech, None)
+            for (tactic, tactic_conf), technique_raw, tech_conf, final_tech
+            in zip(tactic_results, techniques_raw, tech_confs, final_techs)
+        ]
+
+    def _predict_rows_cached(
+        self,
+        tactic_rows: List[List[Any]],
+        technique_rows: List[List[Any]],
+    ) -> List[Prediction]:
+        """
+        Giống _predict_rows nhưng tra cache trước;
+        chỉ các feature tuple distinct chưa có trong cache mới chạy model.
+        """
+        predictions: List[Any] = [None] * len(tactic_rows)
+        pending: Dict[Tuple, List[int]] = {}
+        batch_hits = 0
+
+        for i, (tactic_row, technique_row) in enumerate(zip(tactic_rows, technique_rows)):
+            key = self.cache.make_key(tactic_row, self._tactic_ts_index)
+            if not self.shared_schema:
+                key += self.cache.make_key(technique_row, self._technique_ts_index)
+
+            if key in pending:
+                # trùng key trong batch: không chạy model lại -> tính là hit
+                pending[key].append(i)
+                batch_hits += 1
+                continue
+
+            cached = self.cache.get(key)
+            if cached is not None:
+                predictions[i] = cached
+            else:
+                pending[key] = [i]
+
+        self.cache.record_hits(batch_hits)
+
+        if pending:
+            first = [positions[0] for positions in pending.values()]
+            scored = self._predict_rows(
+                [tactic_rows[i] for i in first],
+                [technique_rows[i] for i in first],
+            )
+            for (key, positions), prediction in zip(pending.items(), scored):
+                self.cache.put(key, prediction)
+                for i in positions:
+                    predictions[i] = prediction
+
+        return predictions
+
+    def _build_result(
+        self,
+        tactic: str,
+        tactic_conf: float,
+        technique_raw: Optional[str],
+        tech_conf: float,
+        final_tech: Optional[str],
+        skip_reason: Optional[str] = None,
+        explain: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        tech_conf = float(tech_conf)
+
+        # explain truyền vào (vd: SID lookup) được giữ nguyên
+        if skip_reason is not None:
+            default_explain = CASCADE_EXPLAIN.get(skip_reason, f"Cascade: technique model skipped ({skip_reason}).")
+        elif self.joint:
+            default_explain = "Joint model: (tactic, technique) pair predicted directly from the MITRE mapping."
+        elif final_tech is None:
             final_tech = technique_raw
-            explain = "No MITRE mapping for tactic or no valid technique in mapping; fallback to top technique model output."
+            default_explain = "No MITRE mapping for tactic or no valid technique in mapping; fallback to top technique model output."
         else:
-            explain = "Technique selected from MITRE-valid set for predicted tactic (rule-based filtering + max probability)."
+            default_explain = "Technique selected from MITRE-valid set for predicted tactic (rule-based filtering + max probability)."
+        explain = explain or default_explain
 
         # 4) Final confidence (gợi ý: min của 2 model)
         final_conf = float(min(tactic_conf, tech_conf))
@@ -82,6 +419,8 @@ class MitreEngine:
             "tactic_confidence": float(tactic_conf),
             "technique_confidence": float(tech_conf),
             "technique_raw": technique_raw,
+            "technique_skipped": skip_reason,
+            "model_version": self.model_version,
             "explain": explain,
         }
 
@@ -0,0 +1,112 @@
+# AI_MITRE/Catboost/inference/joint_predictor.py
+
+from typing import Dict, List, Tuple
+
+import joblib
+import numpy as np
+from catboost import CatBoostClassifier, FeaturesData, Pool
+
+from AI_MITRE.Catboost.preprocessing.normalize_elastic import normalize_elastic_log
+from AI_MITRE.Catboost.preprocessing.feature_vector import FeatureSchema, class_labels, row_count
+
+# Label của model joint: "<tactic>||<technique>"
+JOINT_LABEL_SEP = "||"
+
+
+def joint_label(tactic: str, technique: str) -> str:
+    return f"{tactic}{JOINT_LABEL_SEP}{technique}"
+
+
+def split_joint_label(label: str) -> Tuple[str, str]:
+    tactic, _, technique = str(label).partition(JOINT_LABEL_SEP)
+    return tactic, technique
+
+
+def mapping_pairs(mapping: Dict[str, List[str]]) -> List[str]:
+    """
+    Tất cả cặp (tactic, technique) hợp lệ theo mapping_tactic_technique.json
+    """
+    return [
+        joint_label(tactic, technique)
+        for tactic, techniques in mapping.items()
+        for technique in techniques
+    ]
+
+
+class JointPredictor:
+    """
+    Realtime MITRE Joint Predictor (CatBoost)
+    - 1 model predict cặp (tactic, technique) chỉ trong mapping
+      -> 1 lần model cho mỗi event, tactic / technique luôn khớp nhau
+    - Output: (tactic, tactic_confidence, technique, confidence)
+      tactic_confidence = tổng prob các cặp cùng tactic
+    """
+
+    def __init__(
+        self,
+        model_path: str = "AI_MITRE/Catboost/models/catboost_joint_model.cbm",
+        encoder_path: str = "AI_MITRE/Catboost/models/label_encoder_joint.pkl",
+    ):
+        # Load CatBoost model
+        self.model = CatBoostClassifier()
+        self.model.load_model(model_path)
+
+        # Load label encoder (sklearn)
+        self.label_encoder = joblib.load(encoder_path)
+
+        # Feature schema đã được lưu trong model
+        self.schema = FeatureSchema.from_model(self.model)
+        self.feature_names = self.schema.feature_names
+        self.cat_features = self.schema.cat_features
+
+        # Label cặp theo đúng thứ tự cột predict_proba -> tách tactic / technique 1 lần
+        self.classes = class_labels(self.model, self.label_encoder)
+        pairs = [split_joint_label(label) for label in self.classes]
+        self.tactics = np.array([tactic for tactic, _ in pairs], dtype=object)
+        self.techniques = np.array([technique for _, technique in pairs], dtype=object)
+
+        # cột -> tactic: one-hot (n_pairs x n_tactics), probs @ matrix = prob theo tactic
+        self.tactic_names, self._tactic_of_column = np.unique(self.tactics, return_inverse=True)
+        self._column_to_tactic = np.eye(len(self.tactic_names))[self._tactic_of_column]
+
+    def _build_pool(self, rows):
+        # rows: typed rows hoặc FeaturesData đã encode sẵn (engine encode 1 lần cho 2 model)
+        if not isinstance(rows, FeaturesData):
+            rows = self.schema.encode(rows)
+        return Pool(data=rows)
+
+    # --------------------------------------------------
+    # PUBLIC: predict (batch)
+    # --------------------------------------------------
+    def predict_rows(self, rows) -> List[Tuple[str, float, str, float]]:
+        """
+        Predict cặp (tactic, technique) từ typed rows (FeatureSchema.build_row) hoặc FeaturesData (FeatureSchema.encode).
+        - Output: list (tactic, tactic_conf, technique, pair_conf), đúng thứ tự input
+        """
+        if row_count(rows) == 0:
+            return []
+
+        probs = self.model.predict_proba(self._build_pool(rows))
+        best = probs.argmax(axis=1)
+        n = np.arange(len(probs))
+
+        # marginal prob của tactic được chọn = tổng các cặp cùng tactic
+        tactic_probs = probs @ self._column_to_tactic
+        tactic_confs = tactic_probs[n, self._tactic_of_column[best]]
+
+        return list(zip(
+            self.tactics[best].tolist(),
+            tactic_confs.tolist(),
+            self.techniques[best].tolist(),
+            probs[n, best].tolist(),
+        ))
+
+    def predict_batch(self, features_list):
+        return self.predict_rows(self.schema.build_rows(features_list))
+
+    def predict(self, elastic_log: dict) -> Tuple[str, float, str, float]:
+        """
+        Predict cặp (tactic, technique) từ 1 log Elastic (Snort)
+        """
+        features = normalize_elastic_log(elastic_log)
+        return self.predict_rows([self.schema.build_row(features)])[0]
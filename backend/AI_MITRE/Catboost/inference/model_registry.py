@@ -0,0 +1,293 @@
+# AI_MITRE/Catboost/inference/model_registry.py
+"""
+Model registry có version cho model CatBoost (tactic / technique / joint).
+
+Layout:
+    <root>/<kind>/<version>/model.cbm
+    <root>/<kind>/<version>/encoder.pkl
+    <root>/<kind>/<version>/metadata.json   (feature_names, cat_features, classes, checksum)
+    <root>/<kind>/ACTIVE                    (version đang dùng, ghi atomic)
+
+Worker so sánh active_versions() với version của engine đang chạy giữa các batch;
+khác -> load engine mới rồi swap (không restart backend).
+
+CLI (chạy từ thư mục backend):
+    python -m AI_MITRE.Catboost.inference.model_registry register --kind tactic \\
+        --model catboost_threat_model.cbm --encoder label_encoder_tactic.pkl --activate
+    python -m AI_MITRE.Catboost.inference.model_registry activate --kind tactic --version 20260101-120000
+    python -m AI_MITRE.Catboost.inference.model_registry deactivate --kind joint
+    python -m AI_MITRE.Catboost.inference.model_registry list
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_REGISTRY_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "models",
+    "registry",
+)
+
+MODEL_KINDS = ("tactic", "technique", "joint")
+
+MODEL_FILE = "model.cbm"
+ENCODER_FILE = "encoder.pkl"
+METADATA_FILE = "metadata.json"
+ACTIVE_FILE = "ACTIVE"
+
+
+def file_checksum(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_atomic(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _predictor_class(kind: str):
+    # import ở đây: catboost chỉ load khi thật sự load model
+    if kind == "tactic":
+        from AI_MITRE.Catboost.inference.tactic_predictor import TacticPredictor
+        return TacticPredictor
+    if kind == "technique":
+        from AI_MITRE.Catboost.inference.technique_predictor import TechniquePredictor
+        return TechniquePredictor
+    if kind == "joint":
+        from AI_MITRE.Catboost.inference.joint_predictor import JointPredictor
+        return JointPredictor
+    raise ValueError(f"kind must be one of {MODEL_KINDS}")
+
+
+class ModelRegistry:
+    def __init__(self, root: str = DEFAULT_REGISTRY_DIR):
+        self.root = root
+
+    # --------------------------------------------------
+    # PATHS / METADATA
+    # --------------------------------------------------
+    def _kind_dir(self, kind: str) -> str:
+        if kind not in MODEL_KINDS:
+            raise ValueError(f"kind must be one of {MODEL_KINDS}")
+        return os.path.join(self.root, kind)
+
+    def version_dir(self, kind: str, version: str) -> str:
+        return os.path.join(self._kind_dir(kind), version)
+
+    def paths(self, kind: str, version: str) -> Tuple[str, str]:
+        d = self.version_dir(kind, version)
+        return os.path.join(d, MODEL_FILE), os.path.join(d, ENCODER_FILE)
+
+    def metadata(self, kind: str, version: str) -> Dict[str, Any]:
+        with open(os.path.join(self.version_dir(kind, version), METADATA_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def versions(self, kind: str) -> List[str]:
+        d = self._kind_dir(kind)
+        if not os.path.isdir(d):
+            return []
+        return sorted(
+            v for v in os.listdir(d)
+            if os.path.isfile(os.path.join(d, v, METADATA_FILE))
+        )
+
+    def active_version(self, kind: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self._kind_dir(kind), ACTIVE_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def active_versions(self) -> Dict[str, Optional[str]]:
+        return {kind: self.active_version(kind) for kind in MODEL_KINDS}
+
+    # --------------------------------------------------
+    # REGISTER / ACTIVATE
+    # --------------------------------------------------
+    def register(
+        self,
+        kind: str,
+        model_path: str,
+        encoder_path: str,
+        version: Optional[str] = None,
+        activate: bool = False,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Copy model + encoder vào registry, ghi metadata (feature names, classes, checksum).
+        Load thử bằng predictor -> model hỏng không vào được registry.
+        """
+        version = version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        target = self.version_dir(kind, version)
+        if os.path.exists(target):
+            raise ValueError(f"{kind} version {version} already exists")
+
+        predictor = _predictor_class(kind)(model_path, encoder_path)
+
+        # copy vào thư mục tạm rồi rename -> version chỉ xuất hiện khi đủ file
+        tmp = target + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        shutil.copyfile(model_path, os.path.join(tmp, MODEL_FILE))
+        shutil.copyfile(encoder_path, os.path.join(tmp, ENCODER_FILE))
+
+        meta = {
+            "kind": kind,
+            "version": version,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "source": {"model": os.path.abspath(model_path), "encoder": os.path.abspath(encoder_path)},
+            "feature_names": list(predictor.feature_names),
+            "cat_features": list(predictor.cat_features),
+            "classes": [str(c) for c in predictor.classes],
+            "checksum": {
+                "model": file_checksum(os.path.join(tmp, MODEL_FILE)),
+                "encoder": file_checksum(os.path.join(tmp, ENCODER_FILE)),
+            },
+        }
+        if extra:
+            meta["extra"] = extra
+
+        _write_atomic(os.path.join(tmp, METADATA_FILE), json.dumps(meta, indent=2))
+        os.replace(tmp, target)
+        print(f"[REGISTRY] Registered {kind} {version}")
+
+        if activate:
+            self.activate(kind, version)
+        return meta
+
+    def activate(self, kind: str, version: str):
+        """
+        Đổi version đang dùng (ghi ACTIVE atomic). Worker tự pick up giữa các batch.
+        """
+        if version not in self.versions(kind):
+            raise ValueError(f"Unknown {kind} version: {version}")
+        self.verify(kind, version)
+        _write_atomic(os.path.join(self._kind_dir(kind), ACTIVE_FILE), version + "\n")
+        print(f"[REGISTRY] Activated {kind} {version}")
+
+    def deactivate(self, kind: str):
+        """
+        Bỏ ACTIVE của kind (vd: tắt joint -> worker quay về 2 model tactic / technique)
+        """
+        try:
+            os.remove(os.path.join(self._kind_dir(kind), ACTIVE_FILE))
+            print(f"[REGISTRY] Deactivated {kind}")
+        except FileNotFoundError:
+            pass
+
+    # --------------------------------------------------
+    # LOAD
+    # --------------------------------------------------
+    def verify(self, kind: str, version: str) -> Dict[str, Any]:
+        """
+        Checksum file phải khớp metadata. Sai -> ValueError.
+        """
+        meta = self.metadata(kind, version)
+        model_path, encoder_path = self.paths(kind, version)
+        if file_checksum(model_path) != meta["checksum"]["model"]:
+            raise ValueError(f"{kind} {version}: model checksum mismatch")
+        if file_checksum(encoder_path) != meta["checksum"]["encoder"]:
+            raise ValueError(f"{kind} {version}: encoder checksum mismatch")
+        return meta
+
+    def load_predictor(self, kind: str, version: Optional[str] = None):
+        """
+        Load predictor (Tactic / Technique / JointPredictor) của version (mặc định: ACTIVE).
+        Kiểm tra checksum + feature_names / classes khớp metadata.
+        Predictor trả về có thêm thuộc tính model_version.
+        """
+        version = version or self.active_version(kind)
+        if version is None:
+            raise ValueError(f"No active {kind} model in registry {self.root}")
+
+        meta = self.verify(kind, version)
+        model_path, encoder_path = self.paths(kind, version)
+        predictor = _predictor_class(kind)(model_path, encoder_path)
+
+        if list(predictor.feature_names) != meta["feature_names"]:
+            raise ValueError(f"{kind} {version}: feature_names differ from metadata")
+        if [str(c) for c in predictor.classes] != meta["classes"]:
+            raise ValueError(f"{kind} {version}: classes differ from metadata")
+
+        predictor.model_version = version
+        return predictor
+
+    # --------------------------------------------------
+    # ENGINE
+    # --------------------------------------------------
+    def engine_versions(self) -> Dict[str, Optional[str]]:
+        """
+        Version mà engine build từ registry sẽ có (so với MitreEngine.model_version).
+        Có joint ACTIVE -> joint mode, ngược lại tactic + technique.
+        """
+        joint = self.active_version("joint")
+        if joint:
+            return {"joint": joint}
+        return {"tactic": self.active_version("tactic"), "technique": self.active_version("technique")}
+
+    def load_engine_predictors(self, versions: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+        """
+        kwargs predictor cho MitreEngine theo versions (mặc định: version ACTIVE)
+        """
+        versions = versions or self.engine_versions()
+        if "joint" in versions:
+            return {"joint_predictor": self.load_predictor("joint", versions["joint"])}
+        return {
+            "tactic_predictor": self.load_predictor("tactic", versions["tactic"]),
+            "technique_predictor": self.load_predictor("technique", versions["technique"]),
+        }
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="MITRE CatBoost model registry")
+    parser.add_argument("--root", default=DEFAULT_REGISTRY_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_reg = sub.add_parser("register")
+    p_reg.add_argument("--kind", choices=MODEL_KINDS, required=True)
+    p_reg.add_argument("--model", required=True)
+    p_reg.add_argument("--encoder", required=True)
+    p_reg.add_argument("--version")
+    p_reg.add_argument("--activate", action="store_true")
+
+    p_act = sub.add_parser("activate")
+    p_act.add_argument("--kind", choices=MODEL_KINDS, required=True)
+    p_act.add_argument("--version", required=True)
+
+    p_deact = sub.add_parser("deactivate")
+    p_deact.add_argument("--kind", choices=MODEL_KINDS, required=True)
+
+    sub.add_parser("list")
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.root)
+
+    if args.cmd == "register":
+        registry.register(args.kind, args.model, args.encoder, args.version, args.activate)
+    elif args.cmd == "activate":
+        registry.activate(args.kind, args.version)
+    elif args.cmd == "deactivate":
+        registry.deactivate(args.kind)
+    else:
+        for kind in MODEL_KINDS:
+            active = registry.active_version(kind)
+            for version in registry.versions(kind):
+                mark = "*" if version == active else " "
+                print(f"{mark} {kind:<10} {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,11 @@
 # file: predict_technique_from_snort.py
+# Gán technique MITRE cho Snort CSV (offline). Chạy từ thư mục backend:
+#
+#   python -m AI_MITRE.Catboost.inference.predict_technique_from_snort --in snort.csv \
+#       --out snort_with_technique.parquet --chunksize 100000 --workers 4
 import argparse
+from functools import partial
+
 import pandas as pd
 import numpy as np
 import hashlib
@@ -7,86 +13,130 @@ from datetime import datetime, timezone
 import joblib
 from catboost import CatBoostClassifier
 
+from AI_MITRE.Catboost.preprocessing.feature_vector import class_labels
+from AI_MITRE.Catboost.inference.bulk_scoring import OUTPUT_FORMATS, score_csv_chunks
 
-# ----------------- Helpers -----------------
-def parse_snort_timestamp(ts_snort: str):
-    """Parse Snort timestamps into ISO and epoch strings."""
-    if pd.isna(ts_snort):
-        return None, None
-    ts = str(ts_snort).strip()
 
-    # ISO Format: 2024-11-05T10:00:00.646Z
-    if "T" in ts and "Z" in ts:
-        try:
-            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            iso = dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
-            return iso, str(dt.timestamp())
-        except Exception:
-            pass
-
-    # Snort MM/DD-HH:MM:SS.micro format
-    if "-" in ts and len(ts) >= 15:
-        try:
-            now_year = datetime.now(timezone.utc).year
-            month = int(ts[0:2])
-            day = int(ts[3:5])
-            time_part = ts.split("-", 1)[1]
-            dt = datetime.strptime(f"{now_year}-{month:02d}-{day:02d} {time_part}", "%Y-%m-%d %H:%M:%S.%f")
-            dt = dt.replace(tzinfo=timezone.utc)
-            iso = dt.isoformat().replace("+00:00", "Z")
-            return iso, str(dt.timestamp())
-        except Exception:
-            return None, None
-
-    # Epoch format
+# ----------------- Helpers (vectorized, cả cột / chunk) -----------------
+def _as_str(col: pd.Series) -> pd.Series:
+    # giống str(value) từng dòng: NaN -> "nan" (pandas mới giữ NaN khi astype(str))
+    return col.astype(str).fillna("nan")
+
+
+def _float_or_nan(value) -> float:
     try:
-        f = float(ts)
-        dt = datetime.fromtimestamp(f, tz=timezone.utc)
-        iso = dt.isoformat().replace("+00:00", "Z")
-        return iso, str(f)
-    except Exception:
-        return None, None
+        return float(value)
+    except ValueError:
+        return np.nan
 
 
-def to_transport(proto):
-    if not isinstance(proto, str):
-        return "unknown"
-    p = proto.lower()
-    if p in ("tcp", "udp", "icmp"):
-        return p
-    if p in ("eth", "ethernet", "arp"):
-        return "arp"
-    return "unknown"
+def parse_snort_timestamps(ts_col: pd.Series):
+    """
+    Parse Snort timestamps: trả về (iso Series, epoch Series).
+    Thứ tự ưu tiên: ISO (có T và Z) -> Snort MM/DD-HH:MM:SS.micro -> epoch.
+    """
+    ts = _as_str(ts_col).str.strip()
+    dt = pd.Series(pd.NaT, index=ts.index, dtype="datetime64[ns, UTC]")
 
+    # ISO Format: 2024-11-05T10:00:00.646Z
+    is_iso = ts.str.contains("T", regex=False) & ts.str.contains("Z", regex=False)
+    if is_iso.any():
+        dt[is_iso] = pd.to_datetime(ts[is_iso], utc=True, errors="coerce", format="ISO8601")
+
+    # Snort MM/DD-HH:MM:SS.micro format (năm hiện tại)
+    is_snort = (~is_iso | dt.isna()) & ts.str.contains("-", regex=False) & (ts.str.len() >= 15)
+    if is_snort.any():
+        now_year = datetime.now(timezone.utc).year
+        part = ts[is_snort]
+        full = (
+            str(now_year) + "-" + part.str[0:2] + "-" + part.str[3:5]
+            + " " + part.str.split("-", n=1).str[1]
+        )
+        dt[is_snort] = pd.to_datetime(full, utc=True, errors="coerce", format="%Y-%m-%d %H:%M:%S.%f")
+
+    # Epoch format: float() của Python (pd.to_numeric không làm tròn đúng chuỗi nhiều chữ số)
+    n = len(ts)
+    epoch_mask = (~is_snort & dt.isna()).to_numpy()
+    epoch_values = np.full(n, np.nan)
+    if epoch_mask.any():
+        epoch_values[epoch_mask] = [_float_or_nan(v) for v in ts.to_numpy()[epoch_mask]]
+    epoch_mask = epoch_mask & np.isfinite(epoch_values)
+
+    # Mọi dòng hợp lệ -> số micro giây nguyên kể từ epoch; iso / epoch tính từ số nguyên này
+    # (giống datetime.timestamp() / fromtimestamp từng dòng, không qua ns float):
+    # - ISO / Snort: epoch = us / 1e6
+    # - epoch gốc: giữ nguyên giá trị, iso làm tròn micro giây half-even như fromtimestamp
+    us = np.zeros(n, dtype=np.int64)
+    has_us = dt.notna().to_numpy().copy()
+    if has_us.any():
+        us[has_us] = dt[has_us].to_numpy(dtype="datetime64[ns]").astype(np.int64) // 1000
+
+    if epoch_mask.any():
+        f = epoch_values[epoch_mask]
+        whole = np.trunc(f)
+        frac_us = np.round((f - whole) * 1e6)
+        # ngoài khoảng datetime -> không hợp lệ (như fromtimestamp lỗi)
+        in_range = np.abs(whole) < 1e11
+        pos = np.flatnonzero(epoch_mask)[in_range]
+        us[pos] = whole[in_range].astype(np.int64) * 1_000_000 + frac_us[in_range].astype(np.int64)
+        has_us[pos] = True
+
+    iso = np.full(n, None, dtype=object)
+    epoch = np.full(n, np.nan)
+    if has_us.any():
+        dt_us = pd.DatetimeIndex(pd.to_datetime(us[has_us], unit="us", utc=True, errors="coerce"))
+        ok = ~dt_us.isna()
+        pos = np.flatnonzero(has_us)[ok]
+        iso[pos] = (
+            dt_us[ok].strftime("%Y-%m-%dT%H:%M:%S.%f").str.replace(r"\.000000$", "", regex=True) + "Z"
+        ).to_numpy()
+        epoch[pos] = us[pos] / 1e6
+        from_epoch = pos[epoch_mask[pos]]
+        epoch[from_epoch] = epoch_values[from_epoch]
+
+    return pd.Series(iso, index=ts.index, dtype=object), pd.Series(epoch, index=ts.index)
+
+
+def to_transport_col(proto: pd.Series) -> np.ndarray:
+    p = _as_str(proto.fillna("unknown")).str.lower()
+    return np.where(
+        p.isin(["tcp", "udp", "icmp"]),
+        p,
+        np.where(p.isin(["eth", "ethernet", "arp"]), "arp", "unknown"),
+    )
+
+
+def guess_service_col(proto: pd.Series, dport: pd.Series, msg: pd.Series) -> np.ndarray:
+    """
+    Đoán network.service theo proto / port đích / msg (rule đầu tiên khớp)
+    """
+    proto_l = _as_str(proto).str.lower()
+    msg_l = _as_str(msg).str.lower()
+    port = pd.to_numeric(dport, errors="coerce")
+
+    conditions = [
+        proto_l == "icmp",
+        msg_l.str.contains("arp", regex=False) | proto_l.isin(["arp", "eth", "ethernet"]),
+        (port == 53) | msg_l.str.contains("dns", regex=False),
+        port.isin([80, 8080]) | msg_l.str.contains("http", regex=False),
+        (port == 443) | msg_l.str.contains("https", regex=False),
+        (port == 22) | msg_l.str.contains("ssh", regex=False),
+    ]
+    choices = ["icmp", "arp", "dns", "http", "https", "ssh"]
+    return np.select(conditions, choices, default="unknown")
 
-def guess_service(proto, dport, msg):
-    proto_l = str(proto).lower() if proto else ""
-    msg_l = str(msg).lower() if msg else ""
 
-    try:
-        dport = int(dport)
-    except Exception:
-        dport = None
-
-    if proto_l == "icmp":
-        return "icmp"
-    if "arp" in msg_l or proto_l in ("arp", "eth", "ethernet"):
-        return "arp"
-    if dport == 53 or "dns" in msg_l:
-        return "dns"
-    if dport in (80, 8080) or "http" in msg_l:
-        return "http"
-    if dport == 443 or "https" in msg_l:
-        return "https"
-    if dport == 22 or "ssh" in msg_l:
-        return "ssh"
-    return "unknown"
-
-
-def short_event_id(row):
-    s = f"{row.get('timestamp','')}|{row.get('src_ip','')}|{row.get('src_port',0)}|" \
-        f"{row.get('dst_ip','')}|{row.get('dst_port',0)}|{row.get('proto','')}"
-    return hashlib.md5(s.encode()).hexdigest()[:20]
+def short_event_ids(snort_df: pd.DataFrame) -> list:
+    """
+    event.id = md5(timestamp|src_ip|src_port|dst_ip|dst_port|proto)[:20],
+    ghép key theo cột, chỉ còn md5 cho từng chuỗi (không iterrows).
+    """
+    keys = (
+        _as_str(snort_df["timestamp"]) + "|" + _as_str(snort_df["src_ip"]) + "|"
+        + _as_str(snort_df["src_port"]) + "|" + _as_str(snort_df["dst_ip"]) + "|"
+        + _as_str(snort_df["dst_port"]) + "|" + _as_str(snort_df["proto"])
+    )
+    return [hashlib.md5(k.encode()).hexdigest()[:20] for k in keys]
 
 
 # ----------------- Normalize Snort -----------------
@@ -98,23 +148,15 @@ def normalize_snort_df(snort_df: pd.DataFrame) -> pd.DataFrame:
         if c not in snort_df.columns:
             snort_df[c] = np.nan
 
-    iso_list, epoch_list = [], []
-    for ts in snort_df["timestamp"].astype(str).fillna(""):
-        iso, epoch = parse_snort_timestamp(ts)
-        iso_list.append(iso)
-        epoch_list.append(epoch)
-
-    snort_df["event.created"] = iso_list
-    snort_df["@timestamp"] = epoch_list
+    iso, epoch = parse_snort_timestamps(snort_df["timestamp"])
+    snort_df["event.created"] = iso
+    snort_df["@timestamp"] = epoch
 
     out = pd.DataFrame(index=snort_df.index)
     out["network.state"] = "unknown"
     out["network.history"] = "unknown"
-    out["network.transport"] = snort_df["proto"].fillna("unknown").astype(str).apply(to_transport)
-    out["network.service"] = [
-        guess_service(p, d, m)
-        for p, d, m in zip(snort_df["proto"], snort_df["dst_port"], snort_df["msg"])
-    ]
+    out["network.transport"] = to_transport_col(snort_df["proto"])
+    out["network.service"] = guess_service_col(snort_df["proto"], snort_df["dst_port"], snort_df["msg"])
 
     # Numeric fields
     out["source.port"] = pd.to_numeric(snort_df["src_port"], errors="coerce").fillna(0).astype(int)
@@ -131,41 +173,44 @@ def normalize_snort_df(snort_df: pd.DataFrame) -> pd.DataFrame:
     out["destination.packets"] = np.where(dir_up == "S2C", 1, 0)
 
     out["@timestamp"] = snort_df["@timestamp"]
-    out["event.id"] = [short_event_id(r) for _, r in snort_df.iterrows()]
+    out["event.id"] = short_event_ids(snort_df)
 
     return out
 
 
-# ----------------- Predict Technique -----------------
-def predict_technique(snort_file, model_path, label_encoder_path, out_file):
-    df_snort = pd.read_csv(snort_file, low_memory=False)
-    print(f"✅ Loaded Snort file: {len(df_snort)} rows")
+# Cột chữ của Snort CSV: đọc cố định str (chunk đầu toàn trống không bị đoán thành float)
+SNORT_TEXT_DTYPES = {
+    c: str for c in ["timestamp", "src_ip", "dst_ip", "proto", "pkt_gen", "rule",
+                     "action", "dir", "source", "msg", "class"]
+}
 
-    # Normalize schema
-    X = normalize_snort_df(df_snort)
-    print("✅ Normalized to model features. Shape:", X.shape)
 
-    features = [
-        "network.state","network.history","network.transport","network.service",
-        "source.port","destination.port","event.duration",
-        "source.bytes","destination.bytes","source.packets","destination.packets",
-        "@timestamp"
-    ]
+# ----------------- Predict Technique -----------------
+FEATURES = [
+    "network.state","network.history","network.transport","network.service",
+    "source.port","destination.port","event.duration",
+    "source.bytes","destination.bytes","source.packets","destination.packets",
+    "@timestamp"
+]
 
-    Xf = X[features].copy()
 
-    # Load technique model
+def load_technique_model(model_path, label_encoder_path):
     model = CatBoostClassifier()
     model.load_model(model_path)
 
     le = joblib.load(label_encoder_path)
-    print("✅ Loaded technique model & label encoder.")
+
+    # Label theo thứ tự cột predict_proba (map 1 lần, không inverse_transform mỗi chunk)
+    classes = class_labels(model, le)
+    return model, classes
+
+
+def prepare_features(X: pd.DataFrame, model) -> pd.DataFrame:
+    Xf = X[FEATURES].copy()
 
     # Detect categorical features from model metadata
     cat_indices = model.get_cat_feature_indices()
-    feature_names = list(Xf.columns)
-    cat_cols = [feature_names[i] for i in cat_indices if i < len(feature_names)]
-    print(f"📋 Model categorical features: {cat_cols}")
+    cat_cols = [FEATURES[i] for i in cat_indices if i < len(FEATURES)]
 
     # Clean categorical
     for col in cat_cols:
@@ -180,37 +225,91 @@ def predict_technique(snort_file, model_path, label_encoder_path, out_file):
         if col not in cat_cols:
             Xf[col] = pd.to_numeric(Xf[col], errors="coerce").fillna(0)
 
-    print("🔧 Data types prepared for CatBoost.")
-    print(Xf.head(3))
+    return Xf
 
-    # Predict
-    preds_raw = model.predict(Xf)
-    preds_ids = preds_raw.astype(int).ravel()
 
-    pred_labels = le.inverse_transform(preds_ids)
+def score_chunk(df_snort: pd.DataFrame, model, classes) -> pd.DataFrame:
+    """
+    Normalize + predict 1 chunk Snort: 1 lần predict_proba cho cả chunk.
+    """
+    X = normalize_snort_df(df_snort)
+    Xf = prepare_features(X, model)
 
-    # Probability for rule-based combination
     proba = model.predict_proba(Xf)
-    conf = proba.max(axis=1)
+    best = proba.argmax(axis=1)
 
-    # Output
     out = df_snort.copy()
-    out["pred.threat.technique.name"] = pred_labels
-    out["pred.threat.technique.conf"] = conf
+    out["pred.threat.technique.name"] = classes[best]
+    out["pred.threat.technique.conf"] = proba[np.arange(len(best)), best]
+    return out
+
+
+def make_technique_scorer(model_path, label_encoder_path):
+    """
+    Load model 1 lần -> hàm score(chunk). Dùng làm loader cho bulk_scoring
+    (chạy lại trong từng worker process).
+    """
+    model, classes = load_technique_model(model_path, label_encoder_path)
+    return partial(score_chunk, model=model, classes=classes)
+
+
+def predict_technique(snort_file, model_path, label_encoder_path, out_file,
+                      chunksize=None, workers=1, out_format=None):
+    if chunksize or workers > 1 or out_format:
+        return predict_technique_chunked(
+            snort_file, model_path, label_encoder_path, out_file,
+            chunksize or 100_000, workers, out_format,
+        )
+
+    df_snort = pd.read_csv(snort_file, low_memory=False, dtype=SNORT_TEXT_DTYPES)
+    print(f"✅ Loaded Snort file: {len(df_snort)} rows")
+
+    model, classes = load_technique_model(model_path, label_encoder_path)
+    print("✅ Loaded technique model & label encoder.")
+
+    out = score_chunk(df_snort, model, classes)
 
     out.to_csv(out_file, index=False)
     print(f"\n✅ Technique prediction saved: {out_file} ({len(out)} rows)")
 
 
+def predict_technique_chunked(snort_file, model_path, label_encoder_path, out_file,
+                              chunksize, workers=1, out_format=None):
+    """
+    Streaming mode: đọc CSV theo chunk, score (song song nếu workers > 1),
+    ghi nối tiếp ra out_file (CSV / Parquet) đúng thứ tự input.
+    RAM chỉ phụ thuộc chunksize * số chunk đang xử lý, không phụ thuộc kích thước file.
+    """
+    return score_csv_chunks(
+        snort_file,
+        out_file,
+        loader=make_technique_scorer,
+        loader_args=(model_path, label_encoder_path),
+        chunksize=chunksize,
+        workers=workers,
+        out_format=out_format,
+        dtype=SNORT_TEXT_DTYPES,
+    )
+
+
 # ----------------- CLI -----------------
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Infer MITRE technique from Snort logs using CatBoost model")
     
     parser.add_argument("--in", dest="snort_in", required=True, help="Input Snort CSV")
-    parser.add_argument("--model", dest="model", default="catboost_technique_model.cbm", help="CatBoost model")
-    parser.add_argument("--encoder", dest="encoder", default="label_encoder_technique.pkl", help="Technique label encoder")
+    parser.add_argument("--model", dest="model", default="AI_MITRE/Catboost/models/catboost_technique_model.cbm",
+                        help="CatBoost model")
+    parser.add_argument("--encoder", dest="encoder", default="AI_MITRE/Catboost/models/label_encoder_technique.pkl",
+                        help="Technique label encoder")
     parser.add_argument("--out", dest="out", default="snort_with_technique.csv", help="Output CSV")
+    parser.add_argument("--chunksize", dest="chunksize", type=int, default=None,
+                        help="Streaming mode: số dòng mỗi chunk (mặc định: đọc cả file)")
+    parser.add_argument("--workers", dest="workers", type=int, default=1,
+                        help="Số process score chunk song song (mặc định: 1)")
+    parser.add_argument("--format", dest="out_format", choices=OUTPUT_FORMATS, default=None,
+                        help="Output format (mặc định: theo đuôi file --out)")
 
     args = parser.parse_args()
 
-    predict_technique(args.snort_in, args.model, args.encoder, args.out)
+    predict_technique(args.snort_in, args.model, args.encoder, args.out,
+                      args.chunksize, args.workers, args.out_format)
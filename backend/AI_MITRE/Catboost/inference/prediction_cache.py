@@ -0,0 +1,123 @@
+# AI_MITRE/Catboost/inference/prediction_cache.py
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+# Cách xử lý feature @timestamp khi build cache key
+TIMESTAMP_EXACT = "exact"      # giữ nguyên (chỉ hit khi trùng cả timestamp)
+TIMESTAMP_BUCKET = "bucket"    # làm tròn xuống theo bucket (giây)
+TIMESTAMP_EXCLUDE = "exclude"  # bỏ khỏi key
+
+TIMESTAMP_MODES = (TIMESTAMP_EXACT, TIMESTAMP_BUCKET, TIMESTAMP_EXCLUDE)
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache: feature tuple -> kết quả model (trước threshold).
+    - Key build từ typed row (FeatureSchema.build_row)
+    - timestamp_mode: exact | bucket | exclude
+    - Đếm hit / miss / eviction
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        timestamp_mode: str = TIMESTAMP_EXACT,
+        timestamp_bucket_sec: float = 60.0,
+    ):
+        if max_size <= 0:
+            raise ValueError("max_size must be > 0")
+        if timestamp_mode not in TIMESTAMP_MODES:
+            raise ValueError(f"timestamp_mode must be one of {TIMESTAMP_MODES}")
+        if timestamp_mode == TIMESTAMP_BUCKET and timestamp_bucket_sec <= 0:
+            raise ValueError("timestamp_bucket_sec must be > 0")
+
+        self.max_size = int(max_size)
+        self.timestamp_mode = timestamp_mode
+        self.timestamp_bucket_sec = float(timestamp_bucket_sec)
+
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --------------------------------------------------
+    # KEY
+    # --------------------------------------------------
+    def make_key(self, row: Sequence[Any], timestamp_index: Optional[int] = None) -> Tuple:
+        """
+        Typed row -> hashable key, xử lý @timestamp theo timestamp_mode
+        """
+        if timestamp_index is None or self.timestamp_mode == TIMESTAMP_EXACT:
+            return tuple(row)
+
+        values = list(row)
+        if self.timestamp_mode == TIMESTAMP_EXCLUDE:
+            del values[timestamp_index]
+        else:
+            ts = values[timestamp_index]
+            try:
+                values[timestamp_index] = math.floor(float(ts) / self.timestamp_bucket_sec)
+            except (TypeError, ValueError):
+                pass
+        return tuple(values)
+
+    # --------------------------------------------------
+    # LRU
+    # --------------------------------------------------
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def record_hits(self, n: int):
+        """
+        Hit không qua get(): key trùng 1 key khác trong cùng batch (dùng chung 1 lần predict)
+        """
+        if n:
+            with self._lock:
+                self.hits += n
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def reset(self):
+        """
+        Xoá cache + reset counter
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "timestamp_mode": self.timestamp_mode,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,138 @@
+# AI_MITRE/Catboost/inference/sid_lookup.py
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from AI_MITRE.AI.schema.snort_event_normalizer import parse_rule_id
+
+# (gid, sid) -> (tactic, technique, confidence)
+SidEntry = Tuple[str, str, float]
+SidKey = Tuple[int, int]
+
+
+def sid_key(rule: Optional[str]) -> Optional[SidKey]:
+    """
+    "gid:sid:rev" -> (gid, sid). Bỏ rev: đổi rev không đổi ý nghĩa rule.
+    """
+    parsed = parse_rule_id(rule)
+    if parsed["sid"] is None:
+        return None
+    return parsed["gid"], parsed["sid"]
+
+
+def sid_key_from_hit(hit: Dict[str, Any]) -> Optional[SidKey]:
+    src = hit.get("_source", hit)
+    rule = (src.get("snort") or {}).get("rule")
+    return sid_key(rule) if isinstance(rule, str) else None
+
+
+def format_sid_key(key: SidKey) -> str:
+    return f"{key[0]}:{key[1]}"
+
+
+def load_sid_table(path: str) -> Dict[SidKey, SidEntry]:
+    """
+    File JSON (build_sid_table.py):
+      {"entries": {"1:1000": {"tactic": ..., "technique": ..., "confidence": ...}, ...}}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    table: Dict[SidKey, SidEntry] = {}
+    for key, entry in (data.get("entries") or {}).items():
+        gid, _, sid = key.partition(":")
+        table[(int(gid), int(sid))] = (
+            entry["tactic"],
+            entry["technique"],
+            float(entry["confidence"]),
+        )
+    return table
+
+
+class SidLookupTable:
+    """
+    Bảng SID -> (tactic, technique, confidence) đứng trước model CatBoost.
+    - lookup O(1) theo (gid, sid)
+    - maybe_reload(): nếu file đổi mtime -> load bảng mới rồi swap reference
+      (reader không bao giờ thấy bảng load dở)
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = float(check_interval)
+
+        self._table: Dict[SidKey, SidEntry] = {}
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+        self.reload()
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def get(self, key: Optional[SidKey]) -> Optional[SidEntry]:
+        entry = self._table.get(key) if key is not None else None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def reload(self) -> bool:
+        """
+        Load lại file. File thiếu / lỗi -> giữ bảng cũ, return False.
+        """
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+                table = load_sid_table(self.path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[SID_TABLE] ⚠️ Cannot load {self.path}: {e}")
+                return False
+
+            self._table = table
+            self._mtime = mtime
+            self.reloads += 1
+            print(f"[SID_TABLE] Loaded {len(table)} SIDs from {self.path}")
+            return True
+
+    def maybe_reload(self) -> bool:
+        """
+        Gọi mỗi batch: chỉ stat file tối đa 1 lần / check_interval giây.
+        """
+        if time.monotonic() - self._last_check < self.check_interval:
+            return False
+
+        self._last_check = time.monotonic()
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+
+        if mtime == self._mtime:
+            return False
+        return self.reload()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "size": len(self._table),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "reloads": self.reloads,
+        }
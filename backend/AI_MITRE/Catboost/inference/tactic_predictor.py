@@ -1,9 +1,11 @@
 # AI_MITRE/Catboost/inference/tactic_predictor.py
 
 import joblib
-from catboost import CatBoostClassifier, Pool
+import numpy as np
+from catboost import CatBoostClassifier, FeaturesData, Pool
 
 from AI_MITRE.Catboost.preprocessing.normalize_elastic import normalize_elastic_log
+from AI_MITRE.Catboost.preprocessing.feature_vector import FeatureSchema, class_labels, row_count
 
 
 class TacticPredictor:
@@ -26,15 +28,14 @@ class TacticPredictor:
         self.label_encoder = joblib.load(encoder_path)
 
         # Feature schema đã được lưu trong model
-        self.feature_names = self.model.feature_names_
+        self.schema = FeatureSchema.from_model(self.model)
+        self.feature_names = self.schema.feature_names
 
         # Categorical features (theo tên, không dùng index)
-        cat_indices = self.model.get_cat_feature_indices()
-        self.cat_features = [
-            self.feature_names[i]
-            for i in cat_indices
-            if i < len(self.feature_names)
-        ]
+        self.cat_features = self.schema.cat_features
+
+        # Label theo đúng thứ tự cột của predict_proba
+        self.classes = class_labels(self.model, self.label_encoder)
 
     # --------------------------------------------------
     # INTERNAL: chuẩn hoá feature theo schema model
@@ -43,26 +44,43 @@ class TacticPredictor:
         """
         Build feature row đúng thứ tự + đúng kiểu cho CatBoost
         """
-        row = []
+        return self.schema.build_row(features)
+
+    def _build_pool(self, rows):
+        # rows: typed rows hoặc FeaturesData đã encode sẵn (engine encode 1 lần cho 2 model)
+        if not isinstance(rows, FeaturesData):
+            rows = self.schema.encode(rows)
+        return Pool(data=rows)
+
+    # --------------------------------------------------
+    # PUBLIC: predict tactic (batch)
+    # --------------------------------------------------
+    def predict_rows(self, rows):
+        """
+        Predict MITRE tactic từ typed rows (FeatureSchema.build_row) hoặc FeaturesData (FeatureSchema.encode).
+        - Output: list (tactic_name, confidence), đúng thứ tự input
+        """
+        if row_count(rows) == 0:
+            return []
+
+        # 1 Pool cho cả batch -> model chỉ chạy 1 lần
+        pool = self._build_pool(rows)
 
-        for fname in self.feature_names:
-            val = features.get(fname)
+        # predict_proba 1 lần -> argmax = class dự đoán (không gọi model.predict)
+        probs = self.model.predict_proba(pool)
+        best = probs.argmax(axis=1)
 
-            # Feature categorical
-            if fname in self.cat_features:
-                if val is None or val == "" or str(val).lower() in ("nan", "none"):
-                    row.append("unknown")
-                else:
-                    row.append(str(val))
+        tactics = self.classes[best].tolist()
+        confidences = probs[np.arange(len(probs)), best].tolist()
 
-            # Feature numeric
-            else:
-                try:
-                    row.append(float(val))
-                except Exception:
-                    row.append(0.0)
+        return list(zip(tactics, confidences))
 
-        return row
+    def predict_batch(self, features_list):
+        """
+        Predict MITRE tactic cho nhiều event cùng lúc.
+        - Input: list feature dict (đã qua normalize_elastic_log)
+        """
+        return self.predict_rows(self.schema.build_rows(features_list))
 
     # --------------------------------------------------
     # PUBLIC: predict tactic
@@ -77,25 +95,8 @@ class TacticPredictor:
         # 2️⃣ Build feature row đúng schema
         row = self._build_feature_row(features)
 
-        # 3️⃣ Tạo Pool cho CatBoost (QUAN TRỌNG)
-        pool = Pool(
-            data=[row],
-            feature_names=self.feature_names,
-            cat_features=self.cat_features,
-        )
-
-        # 4️⃣ Predict
-        pred_id = int(self.model.predict(pool)[0])
-        tactic = self.label_encoder.inverse_transform([pred_id])[0]
-
-        # 5️⃣ Confidence
-        try:
-            probs = self.model.predict_proba(pool)[0]
-            confidence = float(max(probs))
-        except Exception:
-            confidence = 0.0
-
-        return tactic, confidence
+        # 3️⃣ Predict (1 row)
+        return self.predict_rows([row])[0]
 
 
 # --------------------------------------------------
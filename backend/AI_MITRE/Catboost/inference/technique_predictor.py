@@ -1,9 +1,12 @@
 # AI_MITRE/Catboost/inference/technique_predictor.py
 
 import joblib
-from catboost import CatBoostClassifier, Pool
+import numpy as np
+from catboost import CatBoostClassifier, FeaturesData, Pool
 
 from AI_MITRE.Catboost.preprocessing.normalize_elastic import normalize_elastic_log
+from AI_MITRE.Catboost.preprocessing.feature_vector import FeatureSchema, class_labels, row_count
+from AI_MITRE.Catboost.inference.combine_rule import TacticTechniqueMask
 
 
 class TechniquePredictor:
@@ -30,42 +33,80 @@ class TechniquePredictor:
         self.label_encoder = joblib.load(encoder_path)
 
         # Feature schema đã được lưu trong model
-        self.feature_names = self.model.feature_names_
+        self.schema = FeatureSchema.from_model(self.model)
+        self.feature_names = self.schema.feature_names
 
         # Categorical features (theo tên)
-        cat_indices = self.model.get_cat_feature_indices()
-        self.cat_features = [
-            self.feature_names[i]
-            for i in cat_indices
-            if i < len(self.feature_names)
-        ]
+        self.cat_features = self.schema.cat_features
+
+        # Label theo đúng thứ tự cột của predict_proba
+        self.classes = class_labels(self.model, self.label_encoder)
 
         # Technique label order (RẤT QUAN TRỌNG cho combine)
-        self.technique_labels = list(self.label_encoder.classes_)
+        self.technique_labels = self.classes.tolist()
+
+        # Mapping tactic -> technique compile 1 lần theo technique_labels
+        self.tactic_mask = TacticTechniqueMask(self.technique_labels)
 
     # --------------------------------------------------
     # INTERNAL: build feature row đúng schema
     # --------------------------------------------------
     def _build_feature_row(self, features: dict):
-        row = []
-
-        for fname in self.feature_names:
-            val = features.get(fname)
-
-            # Categorical feature
-            if fname in self.cat_features:
-                if val is None or val == "" or str(val).lower() in ("nan", "none"):
-                    row.append("unknown")
-                else:
-                    row.append(str(val))
-            else:
-                # Numeric feature
-                try:
-                    row.append(float(val))
-                except Exception:
-                    row.append(0.0)
-
-        return row
+        return self.schema.build_row(features)
+
+    def _build_pool(self, rows):
+        # rows: typed rows hoặc FeaturesData đã encode sẵn (engine encode 1 lần cho 2 model)
+        if not isinstance(rows, FeaturesData):
+            rows = self.schema.encode(rows)
+        return Pool(data=rows)
+
+    # --------------------------------------------------
+    # PUBLIC: predict technique (batch)
+    # --------------------------------------------------
+    def predict_matrix(self, rows):
+        """
+        Predict MITRE technique từ typed rows (FeatureSchema.build_row) hoặc FeaturesData (FeatureSchema.encode).
+        - Output: (techniques, confidences, probs matrix n x n_labels)
+        """
+        # 1 Pool cho cả batch -> model chỉ chạy 1 lần
+        pool = self._build_pool(rows)
+
+        # predict_proba 1 lần -> argmax = class dự đoán (không gọi model.predict)
+        probs = self.model.predict_proba(pool)
+        best = probs.argmax(axis=1)
+
+        techniques = self.classes[best].tolist()
+        confidences = probs[np.arange(len(probs)), best].tolist()
+
+        return techniques, confidences, probs
+
+    def predict_rows(self, rows):
+        """
+        Predict MITRE technique từ typed rows (FeatureSchema.build_row) hoặc FeaturesData (FeatureSchema.encode).
+        - Output: list dict giống predict(), đúng thứ tự input
+        """
+        if row_count(rows) == 0:
+            return []
+
+        techniques, confidences, probs = self.predict_matrix(rows)
+
+        return [
+            {
+                "technique": technique,
+                "confidence": confidence,
+                "probs": prob_vector,
+                "labels": self.technique_labels,
+            }
+            for technique, confidence, prob_vector
+            in zip(techniques, confidences, probs.tolist())
+        ]
+
+    def predict_batch(self, features_list):
+        """
+        Predict MITRE technique cho nhiều event cùng lúc.
+        - Input: list feature dict (đã qua normalize_elastic_log)
+        """
+        return self.predict_rows(self.schema.build_rows(features_list))
 
     # --------------------------------------------------
     # PUBLIC: predict technique
@@ -80,32 +121,8 @@ class TechniquePredictor:
         # 2️⃣ Build feature row
         row = self._build_feature_row(features)
 
-        # 3️⃣ Create Pool (QUAN TRỌNG)
-        pool = Pool(
-            data=[row],
-            feature_names=self.feature_names,
-            cat_features=self.cat_features,
-        )
-
-        # 4️⃣ Predict class id
-        pred_id = int(self.model.predict(pool)[0])
-        technique = self.label_encoder.inverse_transform([pred_id])[0]
-
-        # 5️⃣ Predict probability vector
-        try:
-            probs = self.model.predict_proba(pool)[0]
-            confidence = float(max(probs))
-            prob_vector = probs.tolist()
-        except Exception:
-            confidence = 0.0
-            prob_vector = []
-
-        return {
-            "technique": technique,
-            "confidence": confidence,
-            "probs": prob_vector,
-            "labels": self.technique_labels,
-        }
+        # 3️⃣ Predict (1 row)
+        return self.predict_rows([row])[0]
 
 
 # --------------------------------------------------
@@ -0,0 +1,150 @@
+# AI_MITRE/Catboost/preprocessing/feature_vector.py
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+from catboost import FeaturesData
+
+# Số giá trị categorical distinct tối đa được cache (cardinality thực tế rất nhỏ)
+CAT_VALUE_CACHE_SIZE = 10000
+
+
+class FeatureSchema:
+    """
+    Feature schema của 1 model CatBoost (feature_names_ + cat features).
+    - build_row: feature dict -> typed row đúng thứ tự + đúng kiểu
+      (categorical -> str, numeric -> float)
+    - Các model cùng schema có thể dùng chung 1 row
+    - encode: typed rows -> FeaturesData (numeric float32 + categorical),
+      tạo Pool nhanh hơn list-of-lists, kết quả predict giống hệt
+    - API Python của CatBoost không nhận categorical đã hash sẵn (int bị str() rồi
+      hash lại) -> CatBoost vẫn hash str; schema chỉ cache bước chuẩn hoá str
+    """
+
+    def __init__(self, feature_names: Sequence[str], cat_features: Sequence[str]):
+        self.feature_names = list(feature_names)
+        self.cat_features = [f for f in self.feature_names if f in set(cat_features)]
+
+        # flag theo index -> không phải tìm trong list cho từng feature
+        cat_set = set(self.cat_features)
+        self._is_cat = [fname in cat_set for fname in self.feature_names]
+
+        # index cột numeric / categorical trong typed row (cho encode)
+        self._num_index = np.array([i for i, c in enumerate(self._is_cat) if not c], dtype=int)
+        self._cat_index = np.array([i for i, c in enumerate(self._is_cat) if c], dtype=int)
+        self.num_feature_names = [self.feature_names[i] for i in self._num_index]
+
+        # giá trị categorical thô -> giá trị chuẩn hoá (tính 1 lần / giá trị distinct)
+        self._cat_values: Dict[Any, str] = {}
+
+    @classmethod
+    def from_model(cls, model) -> "FeatureSchema":
+        """
+        Lấy schema đã lưu trong model (.cbm)
+        """
+        feature_names = model.feature_names_
+        cat_features = [
+            feature_names[i]
+            for i in model.get_cat_feature_indices()
+            if i < len(feature_names)
+        ]
+        return cls(feature_names, cat_features)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, FeatureSchema):
+            return NotImplemented
+        return (
+            self.feature_names == other.feature_names
+            and self.cat_features == other.cat_features
+        )
+
+    def __hash__(self) -> int:
+        return hash((tuple(self.feature_names), tuple(self.cat_features)))
+
+    def build_row(self, features: Dict[str, Any]) -> List[Any]:
+        """
+        Build feature row đúng thứ tự + đúng kiểu cho CatBoost
+        """
+        row = []
+
+        for fname, is_cat in zip(self.feature_names, self._is_cat):
+            val = features.get(fname)
+
+            # Feature categorical
+            if is_cat:
+                row.append(self._cat_value(val))
+
+            # Feature numeric
+            else:
+                try:
+                    row.append(float(val))
+                except Exception:
+                    row.append(0.0)
+
+        return row
+
+    def build_rows(self, features_list: List[Dict[str, Any]]) -> List[List[Any]]:
+        return [self.build_row(f) for f in features_list]
+
+    def _cat_value(self, val: Any) -> str:
+        # key có type: 1 / 1.0 / True hash bằng nhau nhưng str() khác nhau
+        key = (type(val), val)
+        try:
+            return self._cat_values[key]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable
+            return _canonical_cat(val)
+
+        canonical = _canonical_cat(val)
+        if len(self._cat_values) < CAT_VALUE_CACHE_SIZE:
+            self._cat_values[key] = canonical
+        return canonical
+
+    def encode(self, rows: List[List[Any]]) -> FeaturesData:
+        """
+        Typed rows -> FeaturesData (pre-encoded, không loop từng ô bằng Python):
+        - numeric: ma trận float32 (CatBoost cũng lưu float32 với input list)
+        - categorical: ma trận object (str đã chuẩn hoá)
+        CatBoost map cột theo tên -> thứ tự cat/num trong model không ảnh hưởng.
+        """
+        matrix = np.array(rows, dtype=object).reshape(len(rows), len(self.feature_names))
+
+        num = matrix[:, self._num_index].astype(np.float32) if len(self._num_index) else None
+        cat = matrix[:, self._cat_index] if len(self._cat_index) else None
+
+        return FeaturesData(
+            num_feature_data=num,
+            cat_feature_data=cat,
+            num_feature_names=self.num_feature_names if num is not None else None,
+            cat_feature_names=self.cat_features if cat is not None else None,
+        )
+
+
+def row_count(rows) -> int:
+    """
+    Số event trong typed rows hoặc FeaturesData
+    """
+    if isinstance(rows, FeaturesData):
+        return rows.get_object_count()
+    return len(rows)
+
+
+def _canonical_cat(val: Any) -> str:
+    if val is None or val == "" or str(val).lower() in ("nan", "none"):
+        return "unknown"
+    return str(val)
+
+
+def class_labels(model, label_encoder) -> np.ndarray:
+    """
+    Label (string) theo đúng thứ tự cột predict_proba của model.
+    model.classes_ là id đã encode (LabelEncoder) -> map 1 lần lúc load,
+    thay cho inverse_transform mỗi event.
+    """
+    encoder_classes = np.asarray(label_encoder.classes_)
+    try:
+        ids = np.asarray(model.classes_).astype(int)
+        return encoder_classes[ids]
+    except (TypeError, ValueError, IndexError):
+        return encoder_classes
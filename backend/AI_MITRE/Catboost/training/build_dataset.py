@@ -0,0 +1,389 @@
+# build_dataset.py
+# Build dataset train dạng cột (Parquet) tăng dần, thay cho prepare_data.py (đọc lại toàn bộ CSV mỗi lần).
+#
+# - Mỗi CSV nguồn chỉ đọc phần MỚI: manifest lưu byte offset đã xử lý của từng file
+#   -> file append thêm dòng chỉ parse phần append, file không đổi bị bỏ qua
+# - Mỗi lần chạy ghi thêm 1 part Parquet (cùng schema như combined_logs_minimal.csv), chỉ giữ dòng có nhãn
+# - Dedupe dòng trùng hoàn toàn (hash lưu theo từng part, chỉ tính part có trong manifest)
+# - Xuất dataset (CSV / Parquet) có thể downsample cân bằng theo class
+#
+#   python -m AI_MITRE.Catboost.training.build_dataset --data-dir AI_MITRE/data \
+#       --export combined_logs_minimal.csv --max-per-class 20000
+import argparse
+import copy
+import hashlib
+import io
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_OUT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "models",
+    "dataset",
+)
+
+# Cột nguồn / đổi tên / thứ tự đích: giống prepare_data.py
+SOURCE_COLS = [
+    "conn_state", "duration", "history",
+    "src_port_zeek", "dest_port_zeek",
+    "orig_bytes", "resp_bytes",
+    "orig_pkts", "resp_pkts",
+    "proto", "service",
+    "ts",
+    "label_tactic", "label_technique"
+]
+
+NUM_COLS = ["duration", "src_port_zeek", "dest_port_zeek",
+            "orig_bytes", "resp_bytes", "orig_pkts", "resp_pkts"]
+
+RENAME_DICT = {
+    "conn_state": "network.state",
+    "duration": "event.duration",
+    "history": "network.history",
+    "src_port_zeek": "source.port",
+    "dest_port_zeek": "destination.port",
+    "orig_bytes": "source.bytes",
+    "resp_bytes": "destination.bytes",
+    "orig_pkts": "source.packets",
+    "resp_pkts": "destination.packets",
+    "proto": "network.transport",
+    "service": "network.service",
+    "ts": "@timestamp",
+    "label_tactic": "threat.tactic.name",
+    "label_technique": "threat.technique.name"
+}
+
+DEST_COL_ORDER = [
+    "network.state", "network.history",
+    "network.transport", "network.service",
+    "source.port", "destination.port",
+    "event.duration",
+    "source.bytes", "destination.bytes",
+    "source.packets", "destination.packets",
+    "@timestamp",
+    "threat.tactic.name", "threat.technique.name"
+]
+
+LABEL_COL = "threat.tactic.name"
+
+MANIFEST_FILE = "manifest.json"
+PARTS_DIR = "parts"
+HASHES_SUFFIX = ".hashes.npy"
+
+# Số byte đầu file dùng để nhận ra file bị ghi lại (không phải append)
+HEAD_BYTES = 1 << 16
+
+
+def _head_checksum(path: str, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(min(size, HEAD_BYTES))).hexdigest()
+
+
+def _part_hashes_file(part_file: str) -> str:
+    return part_file[:-len(".parquet")] + HASHES_SUFFIX
+
+
+def _write_json_atomic(path: str, data: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------
+# TRANSFORM
+# ---------------------------------------------------------
+def to_train_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cùng các bước với prepare_data.py, thêm: chỉ giữ dòng có nhãn, kiểu cột cố định
+    (mọi part Parquet cùng schema).
+    """
+    for col in SOURCE_COLS:
+        if col not in df.columns:
+            df[col] = np.nan
+    df = df[SOURCE_COLS].copy()
+
+    for c in NUM_COLS:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+
+    df.rename(columns=RENAME_DICT, inplace=True)
+    df = df.loc[:, ~df.columns.duplicated()]
+    df.dropna(how="all", inplace=True)
+    df = df[DEST_COL_ORDER]
+
+    df = df[df[LABEL_COL].notna() & (df[LABEL_COL].astype(str).str.lower() != "none")]
+
+    # ts Zeek = epoch giây -> float như các cột số
+    numeric = set(RENAME_DICT[c] for c in NUM_COLS)
+    for col in DEST_COL_ORDER:
+        if col in numeric or col == "@timestamp":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        else:
+            df[col] = df[col].astype("object").where(df[col].notna(), None)
+            df[col] = df[col].map(lambda v: v if v is None else str(v))
+    return df.reset_index(drop=True)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+# ---------------------------------------------------------
+# INCREMENTAL BUILD
+# ---------------------------------------------------------
+class DatasetBuilder:
+    """
+    Dataset Parquet tăng dần.
+
+    <out_dir>/manifest.json             sources (byte offset, rows), parts, class_counts
+    <out_dir>/parts/*.parquet           mỗi lần chạy 1 part
+    <out_dir>/parts/*.hashes.npy        hash các dòng của part (dedupe)
+
+    Part + hash ghi trước, manifest (atomic) ghi sau cùng: crash trước khi ghi manifest
+    -> part đó không có trong manifest, bị xoá khi mở lại, source được đọc lại từ offset cũ.
+    """
+
+    def __init__(self, out_dir: str = DEFAULT_OUT_DIR):
+        self.out_dir = out_dir
+        self.manifest = self._load_manifest()
+        self._hashes = self._load_hashes()
+
+    def _load_manifest(self) -> dict:
+        path = os.path.join(self.out_dir, MANIFEST_FILE)
+        if not os.path.isfile(path):
+            return {"sources": {}, "parts": [], "class_counts": {}, "rows": 0}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load_hashes(self) -> set:
+        """
+        Hash của các part có trong manifest; file lạ trong parts/ (lần chạy trước
+        dừng trước khi ghi manifest) bị xoá.
+        """
+        parts_dir = os.path.join(self.out_dir, PARTS_DIR)
+        hashes = set()
+        listed = set()
+
+        for part in self.manifest["parts"]:
+            hashes_file = _part_hashes_file(part["file"])
+            listed.update((part["file"], hashes_file))
+            hashes_path = os.path.join(parts_dir, hashes_file)
+            if os.path.isfile(hashes_path):
+                hashes.update(np.load(hashes_path).tolist())
+            else:
+                hashes.update(row_hashes(pd.read_parquet(os.path.join(parts_dir, part["file"]))).tolist())
+
+        if os.path.isdir(parts_dir):
+            for name in sorted(os.listdir(parts_dir)):
+                if name not in listed:
+                    print(f"⚠️ {name} không có trong manifest (lần chạy trước bị dừng giữa chừng) -> xoá")
+                    os.remove(os.path.join(parts_dir, name))
+        return hashes
+
+    def _read_new_rows(self, path: str) -> Optional[pd.DataFrame]:
+        """
+        Đọc phần chưa xử lý của 1 CSV (từ byte offset đã lưu tới dòng hoàn chỉnh cuối cùng).
+        Return None nếu không có gì mới.
+        """
+        key = os.path.abspath(path)
+        state = self.manifest["sources"].get(key)
+        size = os.path.getsize(path)
+
+        offset = 0
+        if state is not None:
+            if size == state["bytes_done"]:
+                return None
+            if size < state["bytes_done"] or _head_checksum(path, state["bytes_done"]) != state["head_checksum"]:
+                print(f"⚠️ {path} đã bị ghi lại (không phải append) -> bỏ qua, chạy lại với --rebuild")
+                return None
+            offset = state["bytes_done"]
+
+        with open(path, "rb") as f:
+            header = f.readline()
+            if offset == 0:
+                offset = len(header)
+            f.seek(offset)
+            data = f.read()
+
+        # chỉ lấy tới dòng hoàn chỉnh cuối cùng (file có thể đang được ghi tiếp)
+        end = data.rfind(b"\n") + 1
+        data = data[:end]
+        bytes_done = offset + end
+
+        df = None
+        if data.strip():
+            df = pd.read_csv(io.BytesIO(header + data), low_memory=False)
+
+        rows = 0 if df is None else len(df)
+        self.manifest["sources"][key] = {
+            "bytes_done": bytes_done,
+            "head_checksum": _head_checksum(path, bytes_done),
+            "rows_done": (state or {}).get("rows_done", 0) + rows,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        return df
+
+    def update(self, paths: List[str]) -> Dict[str, int]:
+        """
+        Thêm dòng mới (có nhãn, chưa trùng) từ các CSV nguồn vào 1 part Parquet mới.
+        Lỗi giữa chừng -> manifest / hash trong bộ nhớ giữ nguyên như trước khi gọi.
+        """
+        manifest_before = copy.deepcopy(self.manifest)
+        try:
+            return self._update(paths)
+        except Exception:
+            self.manifest = manifest_before
+            raise
+
+    def _update(self, paths: List[str]) -> Dict[str, int]:
+        frames = []
+        stats = {"read": 0, "labeled": 0, "duplicates": 0, "added": 0}
+
+        for path in sorted(paths):
+            try:
+                df = self._read_new_rows(path)
+            except Exception as e:
+                print(f"⚠️ Error reading {path}: {e}")
+                continue
+            if df is None:
+                continue
+
+            stats["read"] += len(df)
+            df = to_train_schema(df)
+            stats["labeled"] += len(df)
+            print(f"✅ {path}: +{len(df)} labeled rows")
+            frames.append(df)
+
+        new = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DEST_COL_ORDER)
+
+        # dedupe: trong batch mới + với dữ liệu đã có
+        new_hashes = np.empty(0, dtype=np.uint64)
+        if len(new):
+            hashes = row_hashes(new)
+            keep = ~pd.Series(hashes).duplicated().to_numpy()
+            keep &= np.fromiter((h not in self._hashes for h in hashes.tolist()), dtype=bool, count=len(hashes))
+            stats["duplicates"] = int(len(new) - keep.sum())
+            new = new[keep].reset_index(drop=True)
+            new_hashes = hashes[keep]
+
+        if len(new):
+            parts_dir = os.path.join(self.out_dir, PARTS_DIR)
+            os.makedirs(parts_dir, exist_ok=True)
+            name = f"part-{len(self.manifest['parts']):05d}-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}.parquet"
+            new.to_parquet(os.path.join(parts_dir, name), index=False)
+            np.save(os.path.join(parts_dir, _part_hashes_file(name)), new_hashes)
+            self.manifest["parts"].append({"file": name, "rows": int(len(new))})
+
+            counts = self.manifest["class_counts"]
+            for label, n in new[LABEL_COL].value_counts().items():
+                counts[label] = counts.get(label, 0) + int(n)
+            self.manifest["rows"] += int(len(new))
+            stats["added"] = int(len(new))
+
+        self._save()
+        # chỉ nhận hash khi manifest đã ghi (part đã được tính)
+        self._hashes.update(new_hashes.tolist())
+        return stats
+
+    def _save(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.manifest["updated_at"] = datetime.now(timezone.utc).isoformat()
+        _write_json_atomic(os.path.join(self.out_dir, MANIFEST_FILE), self.manifest)
+
+    # -----------------------------------------------------
+    # READ
+    # -----------------------------------------------------
+    def load(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return _read_parts(self.out_dir, self.manifest, columns)
+
+
+def _read_parts(out_dir: str, manifest: dict, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    files = [os.path.join(out_dir, PARTS_DIR, p["file"]) for p in manifest["parts"]]
+    if not files:
+        return pd.DataFrame(columns=columns or DEST_COL_ORDER)
+    return pd.concat([pd.read_parquet(f, columns=columns) for f in files], ignore_index=True)
+
+
+def load_dataset(out_dir: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Đọc dataset (manifest + các part trong manifest), chỉ đọc.
+    Khác DatasetBuilder: không xoá part lạ -> dùng được khi build_dataset đang ghi song song.
+    """
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Dataset manifest not found: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return _read_parts(out_dir, manifest, columns)
+
+
+def balance_classes(
+    df: pd.DataFrame,
+    label_col: str = LABEL_COL,
+    max_per_class: Optional[int] = None,
+    ratio: Optional[float] = None,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """
+    Downsample class lớn: mỗi class tối đa max_per_class dòng,
+    hoặc ratio x số dòng của class nhỏ nhất (lấy giá trị nhỏ hơn nếu đặt cả 2).
+    """
+    counts = df[label_col].value_counts()
+    caps = []
+    if max_per_class:
+        caps.append(int(max_per_class))
+    if ratio:
+        caps.append(int(counts.min() * ratio))
+    if not caps:
+        return df
+
+    cap = max(1, min(caps))
+    sampled = [
+        group.sample(n=min(len(group), cap), random_state=seed)
+        for _, group in df.groupby(label_col, sort=False)
+    ]
+    return pd.concat(sampled).sort_index().reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental Parquet dataset builder cho MITRE CatBoost")
+    parser.add_argument("--data-dir", default="data", help="Thư mục CSV nguồn")
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="Xoá dataset cũ, build lại từ đầu")
+    parser.add_argument("--export", help="Xuất dataset (.csv hoặc .parquet) cho train_*.py / train_grid.py")
+    parser.add_argument("--max-per-class", type=int, help="Downsample: tối đa N dòng / tactic")
+    parser.add_argument("--ratio", type=float, help="Downsample: tối đa ratio x class nhỏ nhất")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        shutil.rmtree(args.out_dir, ignore_errors=True)
+
+    csv_files = [os.path.join(args.data_dir, f) for f in os.listdir(args.data_dir) if f.endswith(".csv")]
+    if not csv_files:
+        raise SystemExit(f"❌ Không tìm thấy CSV trong thư mục '{args.data_dir}'.")
+
+    builder = DatasetBuilder(args.out_dir)
+    stats = builder.update(csv_files)
+    print(f"\n📊 Lần này: {stats}")
+    print(f"📊 Dataset: {builder.manifest['rows']} dòng, {len(builder.manifest['parts'])} parts")
+    print(f"📊 Class counts: {builder.manifest['class_counts']}")
+
+    if args.export:
+        df = balance_classes(builder.load(), max_per_class=args.max_per_class, ratio=args.ratio, seed=args.seed)
+        if args.export.endswith(".parquet"):
+            df.to_parquet(args.export, index=False)
+        else:
+            df.to_csv(args.export, index=False)
+        print(f"\n✅ Đã xuất: {args.export} ({len(df)} dòng)")
+        print(df[LABEL_COL].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
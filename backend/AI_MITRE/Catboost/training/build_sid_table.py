@@ -0,0 +1,104 @@
+# build_sid_table.py
+# Build bảng SID -> (tactic, technique, confidence) cho MitreEngine(sid_table=...)
+#
+# Input: CSV có cột Snort "rule" (gid:sid:rev) + nhãn tactic / technique:
+#   - log đã gán nhãn (threat.tactic.name / threat.technique.name)
+#   - output bulk labeling (pred.threat.tactic.name / pred.threat.technique.name)
+# Mỗi SID lấy cặp (tactic, technique) chiếm đa số; confidence = tỉ lệ event có cặp đó.
+# Chỉ giữ SID đủ support + đủ thuần + cặp hợp lệ theo mapping_tactic_technique.json.
+#
+#   python -m AI_MITRE.Catboost.training.build_sid_table --in labeled.csv --out sid_table.json
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from AI_MITRE.Catboost.inference.combine_rule import get_tactic_technique_mapping
+from AI_MITRE.Catboost.inference.sid_lookup import format_sid_key, sid_key
+
+
+def load_labeled(paths, rule_col, tactic_col, technique_col) -> pd.DataFrame:
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path, low_memory=False, usecols=[rule_col, tactic_col, technique_col])
+        df.columns = ["rule", "tactic", "technique"]
+        frames.append(df)
+        print(f"✅ Loaded: {path} ({len(df)} rows)")
+
+    df = pd.concat(frames, ignore_index=True).dropna()
+    df = df[(df["tactic"].astype(str).str.lower() != "none") & (df["technique"].astype(str).str.lower() != "none")]
+
+    # parse 1 lần cho mỗi rule distinct
+    keys = {rule: sid_key(str(rule)) for rule in df["rule"].unique()}
+    df = df.assign(sid=df["rule"].map(keys)).dropna(subset=["sid"])
+    return df
+
+
+def build_table(df: pd.DataFrame, min_support: int, min_purity: float):
+    mapping = get_tactic_technique_mapping()
+
+    counts = df.groupby(["sid", "tactic", "technique"]).size().rename("n").reset_index()
+    totals = counts.groupby("sid")["n"].transform("sum")
+    counts["purity"] = counts["n"] / totals
+    counts["support"] = totals
+
+    # cặp đa số của mỗi SID
+    top = counts.sort_values(["sid", "n"], ascending=[True, False]).drop_duplicates("sid")
+
+    entries, rejected = {}, {"support": 0, "purity": 0, "unmapped": 0}
+    for row in top.itertuples(index=False):
+        if row.support < min_support:
+            rejected["support"] += 1
+            continue
+        if row.purity < min_purity:
+            rejected["purity"] += 1
+            continue
+        if row.technique not in mapping.get(row.tactic, []):
+            rejected["unmapped"] += 1
+            continue
+
+        entries[format_sid_key(row.sid)] = {
+            "tactic": row.tactic,
+            "technique": row.technique,
+            "confidence": round(float(row.purity), 6),
+            "support": int(row.support),
+        }
+
+    return entries, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build Snort SID -> MITRE lookup table")
+    parser.add_argument("--in", dest="inputs", nargs="+", required=True, help="CSV có rule + nhãn tactic/technique")
+    parser.add_argument("--out", dest="out", default="AI_MITRE/Catboost/models/sid_table.json")
+    parser.add_argument("--rule-col", default="rule")
+    parser.add_argument("--tactic-col", default="threat.tactic.name")
+    parser.add_argument("--technique-col", default="threat.technique.name")
+    parser.add_argument("--min-support", type=int, default=20, help="Số event tối thiểu / SID")
+    parser.add_argument("--min-purity", type=float, default=0.95, help="Tỉ lệ tối thiểu của cặp đa số")
+    args = parser.parse_args()
+
+    df = load_labeled(args.inputs, args.rule_col, args.tactic_col, args.technique_col)
+    print(f"📊 Labeled events có SID: {len(df)} ({df['sid'].nunique()} SID)")
+
+    entries, rejected = build_table(df, args.min_support, args.min_purity)
+    print(f"✅ SID giữ lại: {len(entries)} | loại: {rejected}")
+
+    # ghi file tạm rồi rename -> worker đang chạy không đọc phải file ghi dở
+    tmp = args.out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            "sources": args.inputs,
+            "min_support": args.min_support,
+            "min_purity": args.min_purity,
+            "entries": entries,
+        }, f, indent=2)
+    os.replace(tmp, args.out)
+    print(f"✅ Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
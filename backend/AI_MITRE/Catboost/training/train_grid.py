@@ -0,0 +1,319 @@
+# train_grid.py
+# Pipeline train tactic / technique có cache Pool đã quantize + grid hyperparameter chạy song song.
+#
+# 1) Dataset (combined_logs_minimal.csv) chỉ đọc + xử lý + quantize 1 lần, lưu vào cache dir
+#    (key = checksum CSV + target + tham số quantize). Lần chạy sau load thẳng Pool quantized.
+# 2) Grid depth x learning_rate x iterations chạy đồng thời (ThreadPoolExecutor, CatBoost nhả GIL),
+#    mỗi run giới hạn thread_count = --threads / --parallel để các run không tranh CPU.
+# 3) Report wall time + F1-macro từng cấu hình, lưu model tốt nhất (tuỳ chọn).
+#
+#   python -m AI_MITRE.Catboost.training.train_grid --target tactic --data combined_logs_minimal.csv \
+#       --depth 6 8 --lr 0.06 0.08 --iterations 600 900 --parallel 4 --save-best catboost_threat_model.cbm
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import joblib
+import pandas as pd
+from catboost import CatBoostClassifier, Pool
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from AI_MITRE.Catboost.inference.model_registry import file_checksum
+
+TARGETS = {
+    "tactic": "threat.tactic.name",
+    "technique": "threat.technique.name",
+}
+LABEL_COLS = list(TARGETS.values())
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "models",
+    "pool_cache",
+)
+
+# Đổi cách xử lý feature -> tăng version để cache cũ không được dùng lại
+PREPROCESS_VERSION = 2
+
+TRAIN_POOL = "train.quantized"
+TEST_DATA = "test.parquet"
+BORDERS_FILE = "borders.tsv"
+ENCODER_FILE = "label_encoder.pkl"
+MANIFEST_FILE = "manifest.json"
+
+
+# ---------------------------------------------------------
+# PREPROCESS (giữ đúng cách train_tacticmodel.py / trainning_techniquemodel.py xử lý)
+# ---------------------------------------------------------
+def prepare_tactic(X: pd.DataFrame):
+    X = X.fillna("unknown")
+    # giống train_tacticmodel.py: chỉ cột object -> categorical (bool / category giữ nguyên);
+    # pandas >= 3 đọc text thành str dtype thay cho object -> coi như object
+    cat_features = [col for col in X.columns if X[col].dtype == "object" or isinstance(X[col].dtype, pd.StringDtype)]
+    for col in cat_features:
+        X[col] = X[col].astype(str)
+    return X, cat_features
+
+
+def prepare_technique(X: pd.DataFrame):
+    numeric_cols = X.select_dtypes(include=["number"]).columns
+    categorical_cols = X.select_dtypes(exclude=["number"]).columns
+
+    for col in numeric_cols:
+        X[col] = pd.to_numeric(X[col], errors="coerce").fillna(0)
+    for col in categorical_cols:
+        X[col] = X[col].astype(str).fillna("unknown")
+    return X, list(categorical_cols)
+
+
+PREPARE = {"tactic": prepare_tactic, "technique": prepare_technique}
+
+
+# ---------------------------------------------------------
+# POOL CACHE
+# ---------------------------------------------------------
+def cache_key(data_path: str, target: str, border_count: int, test_size: float) -> str:
+    h = hashlib.sha256()
+    h.update(file_checksum(data_path).encode())
+    h.update(json.dumps([target, border_count, test_size, PREPROCESS_VERSION]).encode())
+    return h.hexdigest()[:16]
+
+
+def build_cache(data_path: str, target: str, cache_dir: str, border_count: int, test_size: float) -> dict:
+    label = TARGETS[target]
+
+    # CSV (prepare_data.py) hoặc Parquet (build_dataset.py --export x.parquet)
+    if data_path.endswith(".parquet"):
+        df = pd.read_parquet(data_path)
+    else:
+        df = pd.read_csv(data_path, low_memory=False)
+    print(f"✅ Loaded dataset: {df.shape[0]} rows, {df.shape[1]} columns")
+
+    df = df[df[label].notna() & (df[label].astype(str).str.lower() != "none")]
+    print(f"📊 Labeled samples: {len(df)}")
+    if df.empty:
+        raise SystemExit("❌ Không có dữ liệu có nhãn hợp lệ để train!")
+
+    X = df.drop(columns=LABEL_COLS, errors="ignore")
+    X, cat_features = PREPARE[target](X)
+
+    le = LabelEncoder()
+    y_enc = le.fit_transform(df[label].astype(str))
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_enc, test_size=test_size, random_state=42, stratify=y_enc
+    )
+
+    # ghi vào thư mục tạm rồi rename -> không bao giờ dùng cache ghi dở
+    tmp = cache_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    start = time.perf_counter()
+    train_pool = Pool(X_train, y_train, cat_features=cat_features)
+    train_pool.quantize(border_count=border_count)
+    train_pool.save_quantization_borders(os.path.join(tmp, BORDERS_FILE))
+    train_pool.save(os.path.join(tmp, TRAIN_POOL))
+    print(f"✅ Quantized train pool: {len(X_train)} rows in {time.perf_counter() - start:.1f}s")
+
+    # Model không predict được trên Pool quantized có cat feature -> giữ test dạng raw (nhỏ, 20%)
+    X_test.assign(__label__=y_test).to_parquet(os.path.join(tmp, TEST_DATA), index=False)
+    joblib.dump(le, os.path.join(tmp, ENCODER_FILE))
+
+    manifest = {
+        "target": target,
+        "source": os.path.abspath(data_path),
+        "source_checksum": file_checksum(data_path),
+        "preprocess_version": PREPROCESS_VERSION,
+        "border_count": border_count,
+        "test_size": test_size,
+        "train_rows": int(len(X_train)),
+        "test_rows": int(len(X_test)),
+        "feature_names": list(X.columns),
+        "cat_features": list(cat_features),
+        "classes": [str(c) for c in le.classes_],
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(tmp, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp, cache_dir)
+    return manifest
+
+
+class PoolCache:
+    """
+    Dataset đã quantize của 1 target: train Pool (quantized), test (raw), label encoder.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.dir = cache_dir
+        with open(os.path.join(cache_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+        self.label_encoder = joblib.load(os.path.join(cache_dir, ENCODER_FILE))
+        self.cat_features = self.manifest["cat_features"]
+
+        test = pd.read_parquet(os.path.join(cache_dir, TEST_DATA))
+        self.y_test = test.pop("__label__").to_numpy()
+        self.X_test = test
+
+    def train_pool(self) -> Pool:
+        return Pool("quantized://" + os.path.join(self.dir, TRAIN_POOL))
+
+    def test_pool(self) -> Pool:
+        # cùng borders với train -> dùng được làm eval_set
+        pool = Pool(self.X_test, self.y_test, cat_features=self.cat_features)
+        pool.quantize(input_borders=os.path.join(self.dir, BORDERS_FILE))
+        return pool
+
+
+def load_or_build_cache(
+    data_path: str,
+    target: str,
+    cache_root: str = DEFAULT_CACHE_DIR,
+    border_count: int = 254,
+    test_size: float = 0.2,
+    rebuild: bool = False,
+) -> PoolCache:
+    key = cache_key(data_path, target, border_count, test_size)
+    cache_dir = os.path.join(cache_root, f"{target}-{key}")
+
+    if rebuild or not os.path.isfile(os.path.join(cache_dir, MANIFEST_FILE)):
+        print(f"🔧 Build pool cache: {cache_dir}")
+        os.makedirs(cache_root, exist_ok=True)
+        build_cache(data_path, target, cache_dir, border_count, test_size)
+    else:
+        print(f"♻️ Reuse pool cache: {cache_dir}")
+
+    return PoolCache(cache_dir)
+
+
+# ---------------------------------------------------------
+# GRID
+# ---------------------------------------------------------
+def base_params(target: str) -> dict:
+    params = {
+        "loss_function": "MultiClass",
+        "eval_metric": "TotalF1",
+        "random_seed": 42,
+        "early_stopping_rounds": 50 if target == "tactic" else 70,
+    }
+    if target == "technique":
+        params["auto_class_weights"] = "Balanced"
+    return params
+
+
+def run_config(cache: PoolCache, train_pool: Pool, test_pool: Pool, params: dict, thread_count: int) -> dict:
+    model = CatBoostClassifier(**params, thread_count=thread_count, verbose=False, allow_writing_files=False)
+
+    start = time.perf_counter()
+    model.fit(train_pool, eval_set=test_pool)
+    wall = time.perf_counter() - start
+
+    y_pred = model.predict(cache.X_test).astype(int).ravel()
+    return {
+        "depth": params["depth"],
+        "learning_rate": params["learning_rate"],
+        "iterations": params["iterations"],
+        "best_iteration": model.get_best_iteration(),
+        "thread_count": thread_count,
+        "wall_seconds": round(wall, 2),
+        "f1_macro": float(f1_score(cache.y_test, y_pred, average="macro")),
+        "model": model,
+    }
+
+
+def run_grid(cache: PoolCache, target: str, depths, learning_rates, iterations, parallel: int, threads: int) -> list:
+    parallel = max(1, parallel)
+    thread_count = max(1, threads // parallel)
+
+    # Pool load 1 lần, các run chỉ đọc -> dùng chung giữa các thread
+    train_pool = cache.train_pool()
+    test_pool = cache.test_pool()
+
+    grid = [
+        {**base_params(target), "depth": d, "learning_rate": lr, "iterations": it}
+        for d, lr, it in itertools.product(depths, learning_rates, iterations)
+    ]
+    print(f"🚀 Grid: {len(grid)} configs, {parallel} song song x {thread_count} threads")
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [executor.submit(run_config, cache, train_pool, test_pool, p, thread_count) for p in grid]
+        results = []
+        for future in futures:
+            result = future.result()
+            print(
+                f"  depth={result['depth']} lr={result['learning_rate']} it={result['iterations']} "
+                f"-> F1={result['f1_macro']:.4f} ({result['wall_seconds']}s)"
+            )
+            results.append(result)
+
+    return sorted(results, key=lambda r: r["f1_macro"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train tactic / technique với pool cache + grid song song")
+    parser.add_argument("--target", choices=list(TARGETS), required=True)
+    parser.add_argument("--data", default="combined_logs_minimal.csv")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--rebuild-cache", action="store_true")
+    parser.add_argument("--border-count", type=int, default=254)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--depth", type=int, nargs="+", default=[6, 8])
+    parser.add_argument("--lr", type=float, nargs="+", default=[0.06, 0.08])
+    parser.add_argument("--iterations", type=int, nargs="+", default=[600, 900])
+    parser.add_argument("--parallel", type=int, default=2, help="Số run chạy đồng thời")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Tổng thread chia cho các run")
+    parser.add_argument("--report", help="Ghi report JSON")
+    parser.add_argument("--save-best", help="Lưu model tốt nhất (.cbm); label_encoder_<target>.pkl lưu cùng thư mục")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = load_or_build_cache(
+        args.data, args.target, args.cache_dir, args.border_count, args.test_size, args.rebuild_cache
+    )
+    print(f"⏱️ Dataset ready in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    results = run_grid(cache, args.target, args.depth, args.lr, args.iterations, args.parallel, args.threads)
+    total = time.perf_counter() - start
+
+    print(f"\n📈 Grid xong trong {total:.1f}s (tổng wall các run: {sum(r['wall_seconds'] for r in results):.1f}s)")
+    print(f"{'depth':>5} {'lr':>6} {'iter':>5} {'best_it':>7} {'F1-macro':>9} {'wall(s)':>8}")
+    for r in results:
+        print(
+            f"{r['depth']:>5} {r['learning_rate']:>6} {r['iterations']:>5} {r['best_iteration']:>7} "
+            f"{r['f1_macro']:>9.4f} {r['wall_seconds']:>8}"
+        )
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({
+                "target": args.target,
+                "cache": cache.manifest,
+                "grid_seconds": round(total, 2),
+                "results": [{k: v for k, v in r.items() if k != "model"} for r in results],
+            }, f, indent=2)
+        print(f"✅ Saved report: {args.report}")
+
+    if args.save_best:
+        best = results[0]
+        best["model"].save_model(args.save_best)
+        encoder_path = os.path.join(os.path.dirname(args.save_best), f"label_encoder_{args.target}.pkl")
+        joblib.dump(cache.label_encoder, encoder_path)
+        print(f"✅ Đã lưu mô hình: {args.save_best} (depth={best['depth']} lr={best['learning_rate']} it={best['iterations']})")
+        print(f"✅ Đã lưu encoder: {encoder_path}")
+
+
+if __name__ == "__main__":
+    main()
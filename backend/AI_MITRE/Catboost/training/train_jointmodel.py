@@ -0,0 +1,89 @@
+# train_jointmodel.py
+# 1 model CatBoost predict cặp (tactic, technique) -> dùng với MitreEngine(joint_predictor=...)
+import pandas as pd
+import joblib
+from catboost import CatBoostClassifier, Pool
+from sklearn.preprocessing import LabelEncoder
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import classification_report, f1_score
+
+from AI_MITRE.Catboost.inference.combine_rule import get_tactic_technique_mapping
+from AI_MITRE.Catboost.inference.joint_predictor import joint_label, mapping_pairs
+
+# ---- 1. Load data ----
+df = pd.read_csv("combined_logs_minimal.csv", low_memory=False)
+print(f"✅ Loaded dataset: {df.shape}")
+
+# ---- 2. Target = cặp (tactic, technique) ----
+tactic_col = "threat.tactic.name"
+technique_col = "threat.technique.name"
+
+df = df[df[tactic_col].notna() & df[technique_col].notna()]
+pairs = [joint_label(t, tech) for t, tech in zip(df[tactic_col].astype(str), df[technique_col].astype(str))]
+df = df.assign(**{"threat.pair": pairs})
+
+# Chỉ giữ cặp có trong mapping_tactic_technique.json -> model không thể predict cặp sai MITRE
+valid_pairs = set(mapping_pairs(get_tactic_technique_mapping()))
+
+dropped = df[~df["threat.pair"].isin(valid_pairs)]
+df = df[df["threat.pair"].isin(valid_pairs)]
+print(f"📊 Pair samples: {len(df)} (dropped {len(dropped)} ngoài mapping)")
+if len(dropped):
+    print(dropped["threat.pair"].value_counts().head(10))
+
+if df.empty:
+    raise SystemExit("❌ Không có cặp (tactic, technique) hợp lệ để train!")
+
+# ---- 3. Tách tập ----
+X = df.drop(columns=[tactic_col, technique_col, "threat.pair"])
+y = df["threat.pair"]
+
+# ---- 4. Xử lý missing ----
+numeric_cols = X.select_dtypes(include=["number"]).columns
+categorical_cols = X.select_dtypes(exclude=["number"]).columns
+
+for col in numeric_cols:
+    X[col] = pd.to_numeric(X[col], errors="coerce").fillna(0)
+
+for col in categorical_cols:
+    X[col] = X[col].astype(str).fillna("unknown")
+
+# ---- 5. Encode nhãn ----
+le = LabelEncoder()
+y_enc = le.fit_transform(y)
+
+# ---- 6. Train-test split ----
+X_train, X_test, y_train, y_test = train_test_split(
+    X, y_enc, test_size=0.2, random_state=42, stratify=y_enc
+)
+
+# ---- 7. CatBoost Pool ----
+train_pool = Pool(X_train, y_train, cat_features=list(categorical_cols))
+test_pool = Pool(X_test, y_test, cat_features=list(categorical_cols))
+
+# ---- 8. Train CatBoost ----
+model = CatBoostClassifier(
+    iterations=900,
+    depth=8,
+    learning_rate=0.06,
+    loss_function="MultiClass",
+    auto_class_weights="Balanced",
+    eval_metric="TotalF1",
+    random_seed=42,
+    early_stopping_rounds=70,
+    verbose=100,
+)
+
+model.fit(train_pool, eval_set=test_pool)
+
+# ---- 9. Evaluate ----
+y_pred = model.predict(X_test).astype(int).ravel()
+print("\n📈 F1-macro:", f1_score(y_test, y_pred, average="macro"))
+print(classification_report(y_test, y_pred, target_names=le.classes_))
+
+# ---- 10. Save ----
+model.save_model("catboost_joint_model.cbm")
+joblib.dump(le, "label_encoder_joint.pkl")
+
+print("\n✅ Đã lưu mô hình: catboost_joint_model.cbm")
+print("✅ Đã lưu encoder: label_encoder_joint.pkl")
@@ -0,0 +1,248 @@
+# warm_start.py
+# Retrain nhanh: train tiếp từ model đang deploy (init_model) chỉ với dữ liệu mới gán nhãn,
+# so sánh với model cũ trên holdout rồi mới promote (model registry -> worker tự hot swap).
+#
+# - Model gốc: version ACTIVE trong registry (--registry) hoặc --model / --encoder
+# - Feature: build bằng FeatureSchema của model gốc (giống hệt lúc inference)
+# - CatBoost chỉ train tiếp được khi đủ mọi class -> trộn thêm replay (--replay, vd dataset
+#   của build_dataset.py) tối đa --replay-per-class dòng / class, cũng chống model "quên" class cũ
+# - Holdout: --holdout-size dữ liệu mới + phần replay tách riêng; promote khi
+#   F1 model mới >= F1 model cũ + --min-gain trên cả 2 phần
+#
+#   python -m AI_MITRE.Catboost.training.warm_start --kind tactic --data new_labeled.csv \
+#       --replay AI_MITRE/Catboost/models/dataset --iterations 100 --promote
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from catboost import CatBoostClassifier, Pool
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+
+from AI_MITRE.Catboost.inference.joint_predictor import joint_label
+from AI_MITRE.Catboost.inference.model_registry import DEFAULT_REGISTRY_DIR, ModelRegistry
+from AI_MITRE.Catboost.preprocessing.feature_vector import FeatureSchema
+from AI_MITRE.Catboost.training.build_dataset import load_dataset
+
+TACTIC_COL = "threat.tactic.name"
+TECHNIQUE_COL = "threat.technique.name"
+KINDS = ("tactic", "technique", "joint")
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """
+    CSV / Parquet, hoặc thư mục dataset của build_dataset.py (chỉ đọc manifest + part)
+    """
+    if os.path.isdir(path):
+        return load_dataset(path)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, low_memory=False)
+
+
+def labels_for(df: pd.DataFrame, kind: str) -> pd.Series:
+    if kind == "joint":
+        return pd.Series(
+            [joint_label(t, tech) for t, tech in zip(df[TACTIC_COL].astype(str), df[TECHNIQUE_COL].astype(str))],
+            index=df.index,
+        )
+    return df[TACTIC_COL if kind == "tactic" else TECHNIQUE_COL].astype(str)
+
+
+def to_pool(schema: FeatureSchema, df: pd.DataFrame, y: np.ndarray) -> Pool:
+    # cùng FeatureSchema với inference -> feature train / predict chuẩn hoá giống nhau.
+    # Không dùng schema.encode (FeaturesData đổi thứ tự cột num / cat): init_model
+    # yêu cầu đúng thứ tự feature của model gốc.
+    rows = schema.build_rows(df.to_dict("records"))
+    X = pd.DataFrame(rows, columns=schema.feature_names)
+    return Pool(X, label=y, cat_features=schema.cat_features)
+
+
+def encode_labels(df: pd.DataFrame, kind: str, label_encoder) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Bỏ dòng không có nhãn / nhãn model cũ không biết (không thêm class mới được khi train tiếp)
+    """
+    labels = labels_for(df, kind)
+    valid = labels.str.lower().ne("none") & labels.str.lower().ne("nan")
+    known = labels.isin(set(label_encoder.classes_))
+
+    unknown = labels[valid & ~known]
+    if len(unknown):
+        print(f"⚠️ Bỏ {len(unknown)} dòng nhãn mới model chưa có: {unknown.value_counts().head(5).to_dict()}")
+
+    keep = (valid & known).to_numpy()
+    return df[keep], label_encoder.transform(labels[keep])
+
+
+def f1_macro(model: CatBoostClassifier, pool: Pool, y: np.ndarray) -> Optional[float]:
+    if len(y) == 0:
+        return None
+    y_pred = np.asarray(model.predict(pool)).astype(int).ravel()
+    return float(f1_score(y, y_pred, average="macro"))
+
+
+def holdout_passed(report: Dict[str, Dict[str, Optional[float]]], min_gain: float) -> bool:
+    """
+    Promote khi F1 mới >= F1 cũ + min_gain trên MỌI phần holdout (new + replay)
+    """
+    return bool(report) and all(r["new_f1"] >= r["base_f1"] + min_gain for r in report.values())
+
+
+def load_base(args) -> Tuple[CatBoostClassifier, str, str, Optional[str]]:
+    if args.model:
+        version = None
+        model_path, encoder_path = args.model, args.encoder
+    else:
+        registry = ModelRegistry(args.registry)
+        version = registry.active_version(args.kind)
+        if version is None:
+            raise SystemExit(f"❌ Registry không có {args.kind} ACTIVE, dùng --model / --encoder")
+        registry.verify(args.kind, version)
+        model_path, encoder_path = registry.paths(args.kind, version)
+
+    model = CatBoostClassifier()
+    model.load_model(model_path)
+    print(f"✅ Base model: {model_path} (version={version}, trees={model.tree_count_})")
+    return model, model_path, encoder_path, version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm-start retrain từ model đang deploy")
+    parser.add_argument("--kind", choices=KINDS, required=True)
+    parser.add_argument("--data", nargs="+", required=True, help="Dữ liệu MỚI gán nhãn (CSV / Parquet / dataset dir)")
+    parser.add_argument(
+        "--replay",
+        help="Dữ liệu cũ để lấy mẫu replay (CSV / Parquet / dataset dir). Train + replay phải có MỌI class "
+             "model gốc đã biết, thiếu class -> dừng (vd technique: \"thiếu: ['T1110']\")",
+    )
+    parser.add_argument("--replay-per-class", type=int, default=200)
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY_DIR)
+    parser.add_argument("--model", help="Base .cbm (mặc định: version ACTIVE trong registry)")
+    parser.add_argument("--encoder", help="Label encoder của --model")
+    parser.add_argument("--iterations", type=int, default=100, help="Số cây train thêm")
+    parser.add_argument("--lr", type=float, default=0.03)
+    parser.add_argument("--holdout-size", type=float, default=0.2)
+    parser.add_argument("--min-gain", type=float, default=0.0, help="F1 mới phải >= F1 cũ + min_gain")
+    parser.add_argument("--threads", type=int, default=-1)
+    parser.add_argument("--out", help="Lưu model mới (.cbm) kể cả khi không promote")
+    parser.add_argument("--promote", action="store_true", help="Đạt holdout -> register + activate trong registry")
+    args = parser.parse_args()
+
+    if args.model and not args.encoder:
+        raise SystemExit("❌ --model cần --encoder")
+
+    base, base_path, encoder_path, base_version = load_base(args)
+    le = joblib.load(encoder_path)
+    schema = FeatureSchema.from_model(base)
+
+    # ---- 1. Dữ liệu mới ----
+    new_df = pd.concat([read_table(p) for p in args.data], ignore_index=True)
+    new_df, y_new = encode_labels(new_df, args.kind, le)
+    print(f"📊 Dữ liệu mới: {len(new_df)} dòng")
+    if len(new_df) < 2:
+        raise SystemExit("❌ Không đủ dữ liệu mới có nhãn")
+
+    counts = np.bincount(y_new)
+    stratify = y_new if counts[counts > 0].min() >= 2 else None
+    X_train, X_hold, y_train, y_hold = train_test_split(
+        new_df, y_new, test_size=args.holdout_size, random_state=42, stratify=stratify
+    )
+
+    # ---- 2. Replay ----
+    X_replay_hold, y_replay_hold = new_df.iloc[:0], y_new[:0]
+    if args.replay:
+        replay_df, y_replay = encode_labels(read_table(args.replay), args.kind, le)
+        replay_df = replay_df.assign(__y__=y_replay)
+        sampled = (
+            replay_df.sample(frac=1.0, random_state=42)
+            .groupby("__y__")
+            .head(args.replay_per_class * 2)
+        )
+        # 1/2 replay train, 1/2 replay holdout (đo model có quên dữ liệu cũ không)
+        half = sampled.groupby("__y__").cumcount() % 2 == 0
+        X_train = pd.concat([X_train, sampled[half].drop(columns="__y__")], ignore_index=True)
+        y_train = np.concatenate([y_train, sampled.loc[half, "__y__"].to_numpy()])
+        X_replay_hold = sampled[~half].drop(columns="__y__")
+        y_replay_hold = sampled.loc[~half, "__y__"].to_numpy()
+        print(f"📊 Replay: {int(half.sum())} train, {len(y_replay_hold)} holdout")
+
+    missing = sorted(set(np.asarray(base.classes_).astype(int)) - set(np.unique(y_train)))
+    if missing:
+        raise SystemExit(
+            f"❌ Train tiếp cần đủ mọi class, thiếu: {list(le.classes_[missing])} -> thêm --replay"
+        )
+
+    # ---- 3. Train tiếp ----
+    base_params = base.get_all_params()
+    params = {
+        "iterations": args.iterations,
+        "learning_rate": args.lr,
+        "depth": base_params.get("depth", 8),
+        "loss_function": "MultiClass",
+        "random_seed": 42,
+        "thread_count": args.threads,
+        "verbose": False,
+        "allow_writing_files": False,
+    }
+    if args.kind != "tactic":
+        params["auto_class_weights"] = "Balanced"
+
+    model = CatBoostClassifier(**params)
+    start = time.perf_counter()
+    # label cùng kiểu class của model gốc (model train từ Pool quantized có label Float)
+    label_dtype = np.asarray(base.classes_).dtype
+    model.fit(to_pool(schema, X_train, y_train.astype(label_dtype)), init_model=base)
+    train_seconds = time.perf_counter() - start
+    print(f"✅ Train tiếp {args.iterations} cây trên {len(y_train)} dòng trong {train_seconds:.1f}s (trees={model.tree_count_})")
+
+    # ---- 4. Holdout: cũ vs mới ----
+    report: Dict[str, Dict[str, Optional[float]]] = {}
+    for name, X, y in (("new", X_hold, y_hold), ("replay", X_replay_hold, y_replay_hold)):
+        if len(y) == 0:
+            continue
+        pool = to_pool(schema, X, y)
+        report[name] = {"rows": int(len(y)), "base_f1": f1_macro(base, pool, y), "new_f1": f1_macro(model, pool, y)}
+
+    print(f"\n{'holdout':<8} {'rows':>6} {'F1 cũ':>8} {'F1 mới':>8}")
+    for name, r in report.items():
+        print(f"{name:<8} {r['rows']:>6} {r['base_f1']:>8.4f} {r['new_f1']:>8.4f}")
+
+    passed = holdout_passed(report, args.min_gain)
+    print("✅ Model mới đạt holdout" if passed else "❌ Model mới KHÔNG tốt hơn model cũ -> giữ model cũ")
+
+    # ---- 5. Lưu / promote ----
+    if args.out:
+        model.save_model(args.out)
+        print(f"✅ Đã lưu mô hình: {args.out}")
+
+    if args.promote and passed:
+        registry = ModelRegistry(args.registry)
+        with tempfile.TemporaryDirectory() as tmp:
+            model_path = os.path.join(tmp, "model.cbm")
+            model.save_model(model_path)
+            meta = registry.register(
+                args.kind,
+                model_path,
+                encoder_path,
+                activate=True,
+                extra={
+                    "warm_start_from": {"version": base_version, "model": os.path.abspath(base_path)},
+                    "iterations": args.iterations,
+                    "learning_rate": args.lr,
+                    "train_rows": int(len(y_train)),
+                    "train_seconds": round(train_seconds, 2),
+                    "holdout": report,
+                },
+            )
+        print(f"🚀 Promoted {args.kind} {meta['version']}")
+    elif args.promote:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 # app.py
+import time
+_APP_IMPORT_START = time.perf_counter()
+
 import threading
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 from routes.frontend_api import frontend_api
 from routes.operator_api import operator_api
@@ -11,6 +14,7 @@ from services.mitre_worker import start_worker
 from routes.correlation_api import correlation_bp
 from dotenv import load_dotenv
 from scheduler.snort_normalize_worker import run as start_snort_normalizer
+from core.lazy import startup_report
 load_dotenv()
 app = Flask(__name__)
 CORS(
@@ -29,6 +33,29 @@ app.register_blueprint(frontend_api)
 app.register_blueprint(operator_api)
 app.register_blueprint(mitre_bp)
 app.register_blueprint(correlation_bp)
+
+APP_READY_SECONDS = time.perf_counter() - _APP_IMPORT_START
+
+
+@app.route("/api/v1/health", methods=["GET"])
+def health():
+    """
+    Health check: không chạm DB / model, chỉ báo app đã sẵn sàng
+    + trạng thái các lazy resource (model, Mongo, ES).
+    """
+    return jsonify({
+        "status": "ok",
+        "app_ready_seconds": round(APP_READY_SECONDS, 3),
+        "resources": startup_report(),
+    })
+
+
+def print_startup_report():
+    print(f"[APP] ready in {APP_READY_SECONDS:.3f}s")
+    for r in startup_report():
+        state = f"{r['init_seconds']}s" if r["initialized"] else "lazy (not initialized)"
+        print(f"[APP]   {r['name']}: {state}")
+
 def start_background_services():
     t = threading.Thread(
         target=start_worker,
@@ -46,6 +73,7 @@ def start_background_services():
 
 
 if __name__ == "__main__":
+    print_startup_report()
     start_background_services()
     Thread(target=background_data_updater, daemon=True).start()
     print("[Scheduler] Background updater started")
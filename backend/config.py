@@ -20,6 +20,7 @@ MONGO_COL_DEPLOYMENT = "deployment_status"
 DEPLOYMENT_ID = "production_sensors"
 MONGO_COL_CORRELATION = "correlation_results"
 MONGO_COL_NORMALIZED = "normalized_events"
+MONGO_COL_MITRE_BACKFILL = "mitre_backfill_ranges"
 
 
 SQLITE_DB = "/home/central/TI/ThreatFox/threat_iocs.db"
@@ -0,0 +1,17 @@
+# core/db.py
+
+from pymongo import MongoClient
+
+import config
+from core.lazy import LazyResource
+
+# 1 MongoClient dùng chung, tạo ở lần dùng đầu tiên (không block lúc import)
+_mongo_client = LazyResource("mongo_client", lambda: MongoClient(config.MONGO_URI))
+
+
+def get_mongo_client() -> MongoClient:
+    return _mongo_client.get()
+
+
+def get_db():
+    return get_mongo_client()[config.MONGO_DB]
@@ -0,0 +1,80 @@
+# core/lazy.py
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# name -> LazyResource (để in startup report)
+_REGISTRY: Dict[str, "LazyResource"] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class LazyResource:
+    """
+    Khởi tạo resource nặng (MongoClient, Elasticsearch, model CatBoost...)
+    ở lần get() đầu tiên thay vì lúc import.
+    - Thread-safe: nhiều thread gọi cùng lúc chỉ khởi tạo 1 lần
+    - Ghi lại thời gian khởi tạo cho startup_report()
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._ready = False
+
+        self.init_seconds: Optional[float] = None
+        self.initialized_at: Optional[float] = None
+
+        with _REGISTRY_LOCK:
+            _REGISTRY[name] = self
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self) -> Any:
+        if self._ready:
+            return self._value
+
+        with self._lock:
+            if not self._ready:
+                start = time.perf_counter()
+                self._value = self._factory()
+                self.init_seconds = time.perf_counter() - start
+                self.initialized_at = time.time()
+                self._ready = True
+                print(f"[LAZY] {self.name} initialized in {self.init_seconds:.3f}s")
+
+        return self._value
+
+    def swap(self, value: Any) -> Any:
+        """
+        Thay value đang dùng (hot reload). Reader đang giữ value cũ vẫn dùng tiếp
+        được; get() sau đó trả value mới. Return value cũ (None nếu chưa init).
+        """
+        with self._lock:
+            old = self._value if self._ready else None
+            self._value = value
+            self._ready = True
+            if self.initialized_at is None:
+                self.initialized_at = time.time()
+            return old
+
+
+def startup_report() -> List[Dict[str, Any]]:
+    """
+    Trạng thái + thời gian khởi tạo của mọi lazy resource đã đăng ký.
+    """
+    with _REGISTRY_LOCK:
+        resources = list(_REGISTRY.values())
+
+    return [
+        {
+            "name": r.name,
+            "initialized": r.ready,
+            "init_seconds": round(r.init_seconds, 3) if r.init_seconds is not None else None,
+        }
+        for r in resources
+    ]
@@ -0,0 +1,153 @@
+# core/metrics.py
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+# Bucket latency (ms), upper bound; bucket cuối = +Inf
+DEFAULT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# name -> StageMetrics (dùng chung giữa engine / worker / storage, sống qua hot swap engine)
+_REGISTRY: Dict[str, "StageMetrics"] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class LatencyHistogram:
+    """
+    Histogram cộng dồn (không reset theo thời gian): count, sum, max, bucket counts.
+    Percentile ước lượng theo upper bound của bucket.
+    """
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """
+        Cộng snapshot() của histogram khác (cùng buckets), vd từ process con
+        """
+        for i, n in enumerate(snapshot["buckets"].values()):
+            self.counts[i] += n
+        self.count += snapshot["count"]
+        self.total_ms += snapshot["sum_ms"]
+        self.max_ms = max(self.max_ms, snapshot["max_ms"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": {
+                **{f"le_{b}": n for b, n in zip(self.buckets_ms, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+
+class StageMetrics:
+    """
+    Latency histogram theo stage + counter, thread-safe.
+
+        metrics = get_metrics("mitre")
+        with metrics.timer("tactic_predict"):
+            ...
+        metrics.incr("mapped", 10)
+    """
+
+    def __init__(self, name: str, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.name = name
+        self.buckets_ms = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self._stages: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = LatencyHistogram(self.buckets_ms)
+            hist.observe(seconds * 1000.0)
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def incr(self, counter: str, n: int = 1):
+        if not n:
+            return
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """
+        Cộng dồn snapshot() của StageMetrics khác (process con của inference pool)
+        """
+        with self._lock:
+            for stage, hist_snapshot in snapshot["stages"].items():
+                hist = self._stages.get(stage)
+                if hist is None:
+                    hist = self._stages[stage] = LatencyHistogram(self.buckets_ms)
+                hist.merge(hist_snapshot)
+            for counter, n in snapshot["counters"].items():
+                self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "since": self.started_at,
+                "stages": {stage: hist.snapshot() for stage, hist in self._stages.items()},
+                "counters": dict(self._counters),
+            }
+
+
+def get_metrics(name: str) -> StageMetrics:
+    with _REGISTRY_LOCK:
+        metrics = _REGISTRY.get(name)
+        if metrics is None:
+            metrics = _REGISTRY[name] = StageMetrics(name)
+        return metrics
+
+
+def metrics_report() -> List[Dict[str, Any]]:
+    with _REGISTRY_LOCK:
+        registered = list(_REGISTRY.values())
+    return [m.snapshot() for m in registered]
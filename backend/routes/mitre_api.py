@@ -1,17 +1,14 @@
 # routes/mitre_routes.py
 
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
 from datetime import datetime, timedelta
-import config
+from core.metrics import get_metrics
+from services.mitre_storage import get_mitre_collection
+from services.mitre_backfill import backfill_progress
+from services.mitre_worker import engine_stats, lag_stats
 
 mitre_bp = Blueprint("mitre", __name__)
 
-# MongoDB connection
-client = MongoClient(config.MONGO_URI)
-db = client[config.MONGO_DB]
-mitre_col = db[config.MONGO_COL_MITRE]
-
 
 @mitre_bp.route("/api/v1/mitre/results", methods=["GET"])
 def get_mitre_results():
@@ -49,7 +46,7 @@ def get_mitre_results():
 
     # -------- Query MongoDB --------
     cursor = (
-        mitre_col
+        get_mitre_collection()
         .find(query)
         .sort("created_at", -1)      # mới nhất trước
         .skip(skip)
@@ -145,7 +142,7 @@ def get_mitre_summary():
         }
     ]
 
-    agg = list(mitre_col.aggregate(pipeline))[0]
+    agg = list(get_mitre_collection().aggregate(pipeline))[0]
 
     total_logs = agg["total"][0]["count"] if agg["total"] else 0
 
@@ -192,3 +189,35 @@ def get_mitre_summary():
 
         "generated_at": datetime.utcnow().isoformat() + "Z"
     })
+
+
+@mitre_bp.route("/api/v1/mitre/metrics", methods=["GET"])
+def get_mitre_metrics():
+    """
+    Metrics API (chẩn đoán latency pipeline MITRE):
+    - Histogram latency từng stage: es_fetch, feature_build, pool_build, tactic_predict,
+      technique_predict, joint_predict, combine, sid_lookup, classify, storage, offset_commit
+    - Counter: events, mapped, unmapped, fallback_raw_technique, sid_table_hit, failed...
+    - ?reset=1 -> trả snapshot rồi reset về 0
+    """
+    stats = engine_stats()
+
+    if request.args.get("reset") == "1":
+        get_metrics("mitre").reset()
+
+    stats["generated_at"] = datetime.utcnow().isoformat() + "Z"
+    return jsonify(stats)
+
+
+@mitre_bp.route("/api/v1/mitre/backfill", methods=["GET"])
+def get_mitre_backfill():
+    """
+    Tiến độ live vs backfill (load shedding khi worker quá tải):
+    - live: lag (giây) giữa log mới nhất trên ES và offset live, đang overloaded hay không
+    - backfill: các range bị bỏ qua còn pending, số log đã backfill / còn lại (ước lượng)
+    """
+    return jsonify({
+        "live": lag_stats(),
+        "backfill": backfill_progress(),
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+    })
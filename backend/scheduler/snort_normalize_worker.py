@@ -10,10 +10,19 @@ Core rules:
 - Maintain its own offset: OFFSET_NORMALIZE
 - NEVER depend on MITRE
 - Print clear timestamps + progress markers for debugging
+
+Pipelined mode (NORMALIZE_PIPELINE=1, opt-in; default 0 = sequential loop):
+    fetch thread -> [queue] -> normalize thread -> [queue] -> write/commit (main thread)
+- Page N+1 is fetched / normalized while page N is being written
+- Offset only advances after bulk_write of that page succeeds, in page order
+- Any stage error -> stop all stages, restart from the last committed offset
+  (upsert by elastic_id -> re-processing a page is idempotent)
 """
 
 import json
 import os
+import queue
+import threading
 import time
 import traceback
 from datetime import datetime, timezone
@@ -24,6 +33,7 @@ from pymongo import MongoClient, UpdateOne
 from pymongo.collection import Collection
 
 import config
+from core.metrics import get_metrics
 from AI_MITRE.AI.schema.snort_event_normalizer import normalize_snort_event
 from services.pipeline_offset import get_offset, set_offset, OFFSET_NORMALIZE
 
@@ -42,6 +52,14 @@ CHECKPOINT_FILE = "data/snort_normalize_checkpoint.json"
 # spam control
 NO_LOG_EVERY_SEC = 10
 
+# pipeline fetch / normalize / write (opt-in; mặc định 0 = chạy tuần tự như cũ)
+PIPELINE = os.getenv("NORMALIZE_PIPELINE", "0") == "1"
+# số page tối đa chờ giữa 2 stage (giới hạn RAM + số page fetch trước chưa commit)
+PIPELINE_QUEUE_SIZE = int(os.getenv("NORMALIZE_PIPELINE_QUEUE", "2"))
+
+METRICS_NAME = "normalize"
+_metrics = get_metrics(METRICS_NAME)
+
 
 # =========================
 # TIME
@@ -216,28 +234,73 @@ def persist_search_after(search_after: list):
 
 
 # =========================
-# WORKER LOOP
+# STAGES
 # =========================
-def run():
-    print(f"[{ts()}][Normalize] START worker (NO PIT, independent)")
-    print(f"[{ts()}][Normalize] elastic={ELASTIC_URL} index={ELASTIC_INDEX}")
-    print(f"[{ts()}][Normalize] batch_size={BATCH_SIZE} poll_interval={POLL_INTERVAL}s")
+def fetch_page(es: Elasticsearch, search_after: Optional[list]) -> List[Dict[str, Any]]:
+    with _metrics.timer("es_fetch"):
+        res = es.search(index=ELASTIC_INDEX, body=build_query(search_after))
+    return res.get("hits", {}).get("hits", [])
+
+
+def normalize_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    events: List[Dict[str, Any]] = []
+    with _metrics.timer("normalize"):
+        for hit in hits:
+            ev = normalize_hit(hit)
+            if ev:
+                events.append(ev)
+    return events
+
+
+def write_page(
+    col: Collection,
+    hits: List[Dict[str, Any]],
+    events: List[Dict[str, Any]],
+    started_at: datetime,
+) -> Optional[list]:
+    """
+    bulk_write rồi mới persist offset (= sort của hit cuối page).
+    bulk_write lỗi -> raise, offset giữ nguyên.
+    """
+    with _metrics.timer("bulk_write"):
+        upsert_events(col, events)
 
-    es = get_es()
-    col = get_normalized_collection()
+    # advance to last fetched hit
+    search_after = hits[-1].get("sort")
+    if search_after:
+        with _metrics.timer("offset_commit"):
+            persist_search_after(search_after)
 
-    search_after = load_search_after()
-    print(f"[{ts()}][Normalize] loaded search_after={search_after}")
+    _metrics.incr("fetched", len(hits))
+    _metrics.incr("normalized", len(events))
+
+    latency = (utc_now() - started_at).total_seconds()
 
+    # debug: show batch head/tail timestamps if present
+    first_ts = hits[0].get("_source", {}).get("@timestamp")
+    last_ts = hits[-1].get("_source", {}).get("@timestamp")
+
+    print(
+        f"[{ts()}][Normalize][OK] "
+        f"fetched={len(hits)} normalized={len(events)} "
+        f"latency={latency:.3f}s "
+        f"range_ts={first_ts}..{last_ts} "
+        f"search_after={search_after}"
+    )
+    return search_after
+
+
+# =========================
+# SEQUENTIAL LOOP
+# =========================
+def run_sequential(es: Elasticsearch, col: Collection, search_after: Optional[list]):
     last_no_log_at = 0.0
 
     while True:
         try:
             start_batch = utc_now()
 
-            query = build_query(search_after)
-            res = es.search(index=ELASTIC_INDEX, body=query)
-            hits = res.get("hits", {}).get("hits", [])
+            hits = fetch_page(es, search_after)
 
             if not hits:
                 now = time.time()
@@ -247,36 +310,8 @@ def run():
                 time.sleep(POLL_INTERVAL)
                 continue
 
-            # normalize
-            events: List[Dict[str, Any]] = []
-            for hit in hits:
-                ev = normalize_hit(hit)
-                if ev:
-                    events.append(ev)
-
-            upsert_events(col, events)
-
-            # advance to last fetched hit
-            search_after = hits[-1].get("sort")
-            if search_after:
-                persist_search_after(search_after)
-
-            end_batch = utc_now()
-            latency = (end_batch - start_batch).total_seconds()
-
-            # debug: show batch head/tail timestamps if present
-            first_src = hits[0].get("_source", {})
-            last_src = hits[-1].get("_source", {})
-            first_ts = first_src.get("@timestamp")
-            last_ts = last_src.get("@timestamp")
-
-            print(
-                f"[{ts()}][Normalize][OK] "
-                f"fetched={len(hits)} normalized={len(events)} "
-                f"latency={latency:.3f}s "
-                f"range_ts={first_ts}..{last_ts} "
-                f"search_after={search_after}"
-            )
+            events = normalize_hits(hits)
+            search_after = write_page(col, hits, events, start_batch) or search_after
 
             # tiny sleep to reduce CPU tight loop
             time.sleep(0.05)
@@ -287,5 +322,147 @@ def run():
             time.sleep(POLL_INTERVAL)
 
 
+# =========================
+# PIPELINED LOOP
+# =========================
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # queue đầy = stage sau chậm hơn -> chờ (backpressure), nhưng vẫn thoát được khi stop
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return None
+
+
+def _fetch_stage(es: Elasticsearch, search_after: Optional[list], out_q: queue.Queue,
+                 stop: threading.Event, errors: list):
+    """
+    Cursor riêng của fetch (chạy trước offset đã commit tối đa PIPELINE_QUEUE_SIZE * 2 page)
+    """
+    last_no_log_at = 0.0
+    try:
+        while not stop.is_set():
+            start_batch = utc_now()
+            hits = fetch_page(es, search_after)
+
+            if not hits:
+                now = time.time()
+                if now - last_no_log_at > NO_LOG_EVERY_SEC:
+                    print(f"[{ts()}][Normalize] no new logs, sleeping...")
+                    last_no_log_at = now
+                stop.wait(POLL_INTERVAL)
+                continue
+
+            if not _put(out_q, (hits, start_batch), stop):
+                return
+            search_after = hits[-1].get("sort") or search_after
+    except Exception as e:
+        errors.append(("fetch", e))
+        traceback.print_exc()
+        stop.set()
+
+
+def _normalize_stage(in_q: queue.Queue, out_q: queue.Queue, stop: threading.Event, errors: list):
+    try:
+        while not stop.is_set():
+            item = _get(in_q, stop)
+            if item is None:
+                return
+            hits, start_batch = item
+            if not _put(out_q, (hits, normalize_hits(hits), start_batch), stop):
+                return
+    except Exception as e:
+        errors.append(("normalize", e))
+        traceback.print_exc()
+        stop.set()
+
+
+def run_pipeline_once(es: Elasticsearch, col: Collection, search_after: Optional[list]) -> Optional[list]:
+    """
+    Chạy 3 stage tới khi 1 stage lỗi. Write/commit ở thread gọi hàm:
+    page ra khỏi queue theo đúng thứ tự fetch -> offset commit tuần tự.
+    Return offset đã commit cuối cùng.
+    """
+    stop = threading.Event()
+    errors: list = []
+    fetched_q: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    normalized_q: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    threads = [
+        threading.Thread(
+            target=_fetch_stage, args=(es, search_after, fetched_q, stop, errors),
+            name="normalize-fetch", daemon=True,
+        ),
+        threading.Thread(
+            target=_normalize_stage, args=(fetched_q, normalized_q, stop, errors),
+            name="normalize-normalize", daemon=True,
+        ),
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        while not stop.is_set():
+            item = _get(normalized_q, stop)
+            if item is None:
+                break
+            hits, events, start_batch = item
+            search_after = write_page(col, hits, events, start_batch) or search_after
+    except Exception as e:
+        errors.append(("write", e))
+        traceback.print_exc()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=30)
+
+    for stage, e in errors:
+        _metrics.incr(f"errors.{stage}")
+        print(f"[{ts()}][Normalize][ERROR] stage={stage}", e)
+    return search_after
+
+
+def run_pipelined(es: Elasticsearch, col: Collection, search_after: Optional[list]):
+    while True:
+        search_after = run_pipeline_once(es, col, search_after)
+        # page đã fetch nhưng chưa commit bị bỏ -> fetch lại từ offset đã commit
+        print(f"[{ts()}][Normalize] pipeline restart from search_after={search_after}")
+        time.sleep(POLL_INTERVAL)
+
+
+# =========================
+# WORKER LOOP
+# =========================
+def run():
+    print(f"[{ts()}][Normalize] START worker (NO PIT, independent)")
+    print(f"[{ts()}][Normalize] elastic={ELASTIC_URL} index={ELASTIC_INDEX}")
+    print(
+        f"[{ts()}][Normalize] batch_size={BATCH_SIZE} poll_interval={POLL_INTERVAL}s "
+        f"pipeline={PIPELINE} queue={PIPELINE_QUEUE_SIZE}"
+    )
+
+    es = get_es()
+    col = get_normalized_collection()
+
+    search_after = load_search_after()
+    print(f"[{ts()}][Normalize] loaded search_after={search_after}")
+
+    if PIPELINE:
+        run_pipelined(es, col, search_after)
+    else:
+        run_sequential(es, col, search_after)
+
+
 if __name__ == "__main__":
     run()
@@ -0,0 +1,295 @@
+"""
+MITRE inference benchmark (offline)
+-----------------------------------
+Replay log qua pipeline MITRE:
+    normalize_elastic_log -> TacticPredictor -> TechniquePredictor -> combine_tactic_technique
+    (hoặc --joint-model: normalize_elastic_log -> JointPredictor)
+
+Nguồn log:
+- CSV trong AI_MITRE/data (Zeek-style) -> convert sang hit Elastic (snort.*)
+- Hit Elastic tổng hợp (--synthetic N), có tỉ lệ lặp giống port-scan
+
+Mode (mọi mode đều chạy MitreEngine.process_batch như mitre_worker, chỉ khác config engine):
+- single  : batch size 1
+- batched : batch --batch-size
+- cached  : batched + PredictionCache (--cache-size)
+- sid     : batched + bảng SID (--sid-table) trước model
+- cascade : batched, bỏ qua model technique khi không cần (--min-tactic-conf)
+
+Report: events/sec, latency p50/p95/p99 mỗi event, thời gian từng stage (engine.metrics).
+Không cần Elasticsearch / MongoDB.
+
+Chạy từ thư mục backend:
+    python -m scripts.benchmark_mitre --synthetic 20000 --tactic-model path/to/tactic.cbm
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import time
+import warnings
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from AI_MITRE.Catboost.inference.engine import MitreEngine
+from AI_MITRE.Catboost.inference.tactic_predictor import TacticPredictor
+from AI_MITRE.Catboost.inference.technique_predictor import TechniquePredictor
+from AI_MITRE.Catboost.inference.joint_predictor import JointPredictor
+from AI_MITRE.Catboost.inference.sid_lookup import SidLookupTable
+
+DATA_DIR = "AI_MITRE/data"
+MODES = ("single", "batched", "cached", "sid", "cascade")
+
+
+# =========================
+# LOAD HITS
+# =========================
+def _port(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def csv_row_to_hit(row: Dict[str, Any], i: int) -> Dict[str, Any]:
+    """
+    1 dòng CSV (Zeek-style: proto, service, *_zeek, orig_bytes, datetime)
+    -> hit Elastic giống snort-alert-*
+    """
+    orig_bytes = _port(row.get("orig_bytes"))
+    resp_bytes = _port(row.get("resp_bytes"))
+    service = row.get("service")
+    service = service if isinstance(service, str) else ""
+
+    return {
+        "_index": "benchmark",
+        "_id": f"csv-{i}",
+        "_source": {
+            "@timestamp": row.get("datetime"),
+            "source": "benchmark",
+            "snort": {
+                "proto": str(row.get("proto") or "").upper(),
+                "src_ap": f"{row.get('src_ip_zeek')}:{_port(row.get('src_port_zeek'))}",
+                "dst_ap": f"{row.get('dest_ip_zeek')}:{_port(row.get('dest_port_zeek'))}",
+                "pkt_len": orig_bytes or resp_bytes,
+                "dir": "C2S" if orig_bytes or not resp_bytes else "S2C",
+                "msg": service,
+                "rule": None,
+            },
+        },
+    }
+
+
+def load_csv_hits(data_dir: str) -> List[Dict[str, Any]]:
+    hits = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        df = pd.read_csv(path, low_memory=False)
+        for row in df.to_dict("records"):
+            hits.append(csv_row_to_hit(row, len(hits)))
+        print(f"✅ Loaded: {path} ({len(df)} rows)")
+    return hits
+
+
+def synthetic_hits(n: int, repeat_ratio: float = 0.8, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Hit Elastic tổng hợp. repeat_ratio: tỉ lệ event lặp lại y hệt 1 event trước
+    (giống scan flood) -> đo hiệu quả cache.
+    """
+    rnd = random.Random(seed)
+    base_ts = datetime(2025, 1, 6, tzinfo=timezone.utc)
+    protos = ["TCP", "UDP", "ICMP"]
+    ports = [22, 53, 80, 443, 445, 1900, 3389, 8080]
+    msgs = ["ET SCAN Nmap", "INDICATOR-SCAN UPnP service discover attempt", "HTTP GET", "DNS query"]
+
+    hits: List[Dict[str, Any]] = []
+    templates: List[Dict[str, Any]] = []
+
+    for i in range(n):
+        if templates and rnd.random() < repeat_ratio:
+            snort = dict(rnd.choice(templates))
+        else:
+            snort = {
+                "proto": rnd.choice(protos),
+                "src_ap": f"10.0.{rnd.randint(0, 3)}.{rnd.randint(1, 254)}:{rnd.randint(1024, 65535)}",
+                "dst_ap": f"10.1.0.{rnd.randint(1, 20)}:{rnd.choice(ports)}",
+                "pkt_len": rnd.choice([60, 74, 512, 1500]),
+                "dir": rnd.choice(["C2S", "S2C"]),
+                "msg": rnd.choice(msgs),
+                "rule": f"1:{rnd.randint(1000, 1100)}:1",
+            }
+            templates.append(snort)
+
+        hits.append({
+            "_index": "synthetic",
+            "_id": f"syn-{i}",
+            "_source": {
+                "@timestamp": (base_ts + timedelta(milliseconds=i)).isoformat().replace("+00:00", "Z"),
+                "source": "benchmark",
+                "snort": snort,
+            },
+        })
+
+    return hits
+
+
+# =========================
+# RUN
+# =========================
+def run_mode(engine: MitreEngine, hits: List[Dict[str, Any]], mode: str, batch_size: int) -> Dict[str, Any]:
+    """
+    Replay hits qua engine.process_batch (đúng path production).
+    Thời gian từng stage lấy từ engine.metrics (reset sau warm-up).
+    """
+    size = 1 if mode == "single" else batch_size
+
+    latencies = np.empty(len(hits), dtype=float)
+    skipped: Dict[str, int] = {}
+    start = time.perf_counter()
+
+    for offset in range(0, len(hits), size):
+        chunk = hits[offset:offset + size]
+        t0 = time.perf_counter()
+        results = engine.process_batch(chunk)
+
+        # latency của 1 event = thời gian xử lý batch chứa nó
+        latencies[offset:offset + len(chunk)] = time.perf_counter() - t0
+
+        for result in results:
+            reason = (result or {}).get("technique_skipped")
+            if reason:
+                skipped[reason] = skipped.get(reason, 0) + 1
+
+    total = time.perf_counter() - start
+    metrics = engine.metrics_snapshot()
+
+    report = {
+        "mode": mode,
+        "events": len(hits),
+        "batch_size": size,
+        "total_seconds": round(total, 4),
+        "events_per_sec": round(len(hits) / total, 1) if total > 0 else None,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)) * 1000, 3),
+            "p95": round(float(np.percentile(latencies, 95)) * 1000, 3),
+            "p99": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        },
+        "stage_seconds": {stage: round(hist["sum_ms"] / 1000, 4) for stage, hist in metrics["stages"].items()},
+        "engine_stages": metrics["stages"],
+        "counters": metrics["counters"],
+    }
+    if mode == "cached":
+        report["cache"] = engine.cache_stats()
+    if mode == "sid":
+        report["sid_table"] = engine.sid_table_stats()
+    if mode == "cascade":
+        report["technique_skipped"] = skipped
+    return report
+
+
+def print_report(source: str, report: Dict[str, Any]):
+    lat = report["latency_ms"]
+    print(
+        f"[{source}][{report['mode']:>7}] events={report['events']} batch={report['batch_size']} "
+        f"eps={report['events_per_sec']} "
+        f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms"
+    )
+    for stage, hist in report["engine_stages"].items():
+        print(f"    {stage:<18} {hist['sum_ms'] / 1000:.4f}s p99<={hist['p99_ms']}ms")
+    if report.get("cache"):
+        print(f"    cache              {report['cache']}")
+    if report.get("sid_table"):
+        print(f"    sid_table          {report['sid_table']}")
+    if "technique_skipped" in report:
+        print(f"    technique_skipped  {report['technique_skipped']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MITRE inference (offline)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Thư mục CSV (Zeek-style)")
+    parser.add_argument("--no-csv", action="store_true", help="Không replay CSV")
+    parser.add_argument("--synthetic", type=int, default=10000, help="Số hit tổng hợp (0 = tắt)")
+    parser.add_argument("--repeat-ratio", type=float, default=0.8, help="Tỉ lệ event lặp trong hit tổng hợp")
+    parser.add_argument("--modes", default=",".join(MODES), help=",".join(MODES))
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--cache-size", type=int, default=10000)
+    parser.add_argument("--cache-timestamp", default="exclude", help="exact | bucket | exclude")
+    parser.add_argument("--max-single", type=int, default=2000, help="Giới hạn số event cho mode single")
+    parser.add_argument("--tactic-model", default="AI_MITRE/Catboost/models/catboost_tactic_model.cbm")
+    parser.add_argument("--tactic-encoder", default="AI_MITRE/Catboost/models/label_encoder_tactic.pkl")
+    parser.add_argument("--technique-model", default="AI_MITRE/Catboost/models/catboost_technique_model.cbm")
+    parser.add_argument("--technique-encoder", default="AI_MITRE/Catboost/models/label_encoder_technique.pkl")
+    parser.add_argument("--joint-model", help="Model joint (tactic, technique) -> benchmark joint mode")
+    parser.add_argument("--joint-encoder", default="AI_MITRE/Catboost/models/label_encoder_joint.pkl")
+    parser.add_argument("--min-tactic-conf", type=float, default=0.0, help="Ngưỡng tactic cho mode cascade")
+    parser.add_argument("--sid-table", help="Bảng SID (build_sid_table.py), bắt buộc cho mode sid")
+    parser.add_argument("--json", dest="json_out", help="Ghi report ra file JSON")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    for m in modes:
+        if m not in MODES:
+            raise SystemExit(f"❌ Unknown mode: {m}")
+    if not args.sid_table and "sid" in modes:
+        modes.remove("sid")
+    sid_table = SidLookupTable(args.sid_table) if args.sid_table else None
+
+    tactic = technique = joint = None
+    if args.joint_model:
+        joint = JointPredictor(args.joint_model, args.joint_encoder)
+        print("✅ Loaded joint model")
+    else:
+        tactic = TacticPredictor(args.tactic_model, args.tactic_encoder)
+        technique = TechniquePredictor(args.technique_model, args.technique_encoder)
+        print("✅ Loaded tactic & technique models")
+
+    sources = {}
+    if not args.no_csv:
+        sources["csv"] = load_csv_hits(args.data_dir)
+    if args.synthetic > 0:
+        sources["synthetic"] = synthetic_hits(args.synthetic, args.repeat_ratio)
+
+    reports = []
+    for source, hits in sources.items():
+        if not hits:
+            continue
+        for mode in modes:
+            engine = MitreEngine(
+                cache_size=args.cache_size if mode == "cached" else 0,
+                cache_timestamp=args.cache_timestamp,
+                tactic_predictor=tactic,
+                technique_predictor=technique,
+                joint_predictor=joint,
+                sid_table=sid_table if mode == "sid" else None,
+                cascade=mode == "cascade",
+                min_tactic_conf=args.min_tactic_conf,
+            )
+            mode_hits = hits[:args.max_single] if mode == "single" else hits
+
+            # warm-up (load lazy mapping, JIT của CatBoost...)
+            engine.process_batch(mode_hits[:min(len(mode_hits), args.batch_size)])
+            if engine.cache is not None:
+                engine.cache.reset()
+            if engine.sid_table is not None:
+                engine.sid_table.reset_stats()
+            engine.metrics.reset()
+
+            report = run_mode(engine, mode_hits, mode, args.batch_size)
+            report["source"] = source
+            print_report(source, report)
+            reports.append(report)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n✅ Report saved: {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# services/micro_batcher.py
+
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# fetch(search_after, size) -> hits (đã sort, hit cuối có "sort")
+FetchFn = Callable[[Optional[list], int], List[dict]]
+
+
+class MicroBatcher:
+    """
+    Gom hit trước MitreEngine: flush khi đủ batch_size event hoặc hết thời gian chờ.
+    Batch size tự điều chỉnh theo latency quan sát được (AIMD) để p99 < latency_slo_ms:
+    - p99 vượt SLO              -> giảm batch (x decrease_factor)
+    - p99 thấp + batch vừa đầy  -> tăng batch (+ increase_step), tối đa max_batch
+    Thời gian chờ = min(max_wait_ms, SLO - thời gian classify dự đoán) -> lúc ít log
+    (ban đêm) không giữ event lâu, lúc flood thì batch đầy ngay không phải chờ.
+
+    Latency 1 event = từ lúc batch nhận hit đầu tiên -> classify xong.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = 1000,
+        min_batch: int = 20,
+        initial_batch: int = 200,
+        max_wait_ms: float = 100.0,
+        latency_slo_ms: float = 500.0,
+        poll_interval: float = 0.02,
+        window: int = 100,
+        increase_step: int = 20,
+        decrease_factor: float = 0.7,
+    ):
+        if not 0 < min_batch <= max_batch:
+            raise ValueError("require 0 < min_batch <= max_batch")
+        if latency_slo_ms <= 0:
+            raise ValueError("latency_slo_ms must be > 0")
+
+        self.max_batch = int(max_batch)
+        self.min_batch = int(min_batch)
+        self.batch_size = min(max(int(initial_batch), self.min_batch), self.max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.slo = latency_slo_ms / 1000.0
+        self.poll_interval = float(poll_interval)
+        self.increase_step = int(increase_step)
+        self.decrease_factor = float(decrease_factor)
+
+        # latency (giây) các batch gần nhất
+        self._latencies: deque = deque(maxlen=window)
+
+        # EWMA thời gian classify / event -> dự đoán thời gian classify 1 batch
+        self._sec_per_event: Optional[float] = None
+
+        self.batches = 0
+        self.events = 0
+        self.slo_violations = 0
+
+    # --------------------------------------------------
+    # GATHER
+    # --------------------------------------------------
+    def wait_budget(self) -> float:
+        """
+        Thời gian tối đa được chờ gom thêm hit (giây)
+        """
+        if self._sec_per_event is None:
+            return self.max_wait
+        predicted = self._sec_per_event * self.batch_size
+        return max(0.0, min(self.max_wait, self.slo - predicted))
+
+    def collect(self, fetch: FetchFn, search_after: Optional[list] = None) -> Tuple[List[dict], float]:
+        """
+        Gom hit tới khi đủ batch_size hoặc hết wait_budget (tính từ hit đầu tiên).
+        Return (hits, started_at); hits rỗng nếu không có log mới.
+        """
+        target = self.batch_size
+        hits: List[dict] = []
+        started_at = time.perf_counter()
+        deadline = None
+
+        while len(hits) < target:
+            want = target - len(hits)
+            page = fetch(search_after, want)
+
+            if page:
+                if not hits:
+                    started_at = time.perf_counter()
+                    deadline = started_at + self.wait_budget()
+                hits.extend(page)
+                search_after = page[-1].get("sort")
+
+                # còn backlog (page đầy) -> lấy tiếp ngay, không chờ
+                if len(page) >= want:
+                    continue
+
+            # đã bắt kịp realtime
+            if not hits:
+                break
+
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            time.sleep(min(self.poll_interval, remaining))
+
+        return hits, started_at
+
+    # --------------------------------------------------
+    # ADAPT
+    # --------------------------------------------------
+    def observe(self, events: int, started_at: float, classify_seconds: float):
+        """
+        Ghi nhận 1 batch đã classify xong -> cập nhật EWMA + batch_size
+        """
+        if events <= 0:
+            return
+
+        latency = time.perf_counter() - started_at
+        self._latencies.append(latency)
+        self.batches += 1
+        self.events += events
+        if latency > self.slo:
+            self.slo_violations += 1
+
+        per_event = classify_seconds / events
+        if self._sec_per_event is None:
+            self._sec_per_event = per_event
+        else:
+            self._sec_per_event = 0.8 * self._sec_per_event + 0.2 * per_event
+
+        p99 = self.p99()
+        if p99 > self.slo:
+            self.batch_size = max(self.min_batch, int(self.batch_size * self.decrease_factor))
+            # bỏ window cũ: đánh giá lại với batch size mới
+            self._latencies.clear()
+        elif p99 < 0.5 * self.slo and events >= self.batch_size:
+            self.batch_size = min(self.max_batch, self.batch_size + self.increase_step)
+
+    def p99(self) -> float:
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(0.99 * len(ordered)) - 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "wait_budget_ms": round(self.wait_budget() * 1000, 2),
+            "latency_p99_ms": round(self.p99() * 1000, 2),
+            "latency_slo_ms": round(self.slo * 1000, 2),
+            "sec_per_event": self._sec_per_event,
+            "batches": self.batches,
+            "events": self.events,
+            "slo_violations": self.slo_violations,
+        }
@@ -0,0 +1,137 @@
+# services/mitre_backfill.py
+"""
+Khoảng log bị bỏ qua khi MITRE worker quá tải (load shedding) + tiến độ backfill.
+
+Mỗi range = các hit có sort key (start, end) theo [@timestamp, _id]:
+    {
+        "start": [...] | None,   # offset live lúc shed (exclusive; None = đầu index)
+        "end": [...],            # điểm live nhảy tới (exclusive)
+        "cursor": [...] | None,  # backfill đã xử lý tới đây
+        "status": "pending" | "done",
+        "estimated_events", "processed", "lag_seconds", "created_at", "updated_at", "done_at"
+    }
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import config
+from core.db import get_db
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+
+_indexes_ready = False
+
+
+def get_backfill_collection():
+    return get_db()[config.MONGO_COL_MITRE_BACKFILL]
+
+
+def ensure_backfill_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    get_backfill_collection().create_index([("status", 1), ("created_at", -1)])
+    _indexes_ready = True
+
+
+def sort_key_before(sort_key: Optional[List], bound: Optional[List]) -> bool:
+    """
+    sort_key < bound theo thứ tự ES ([@timestamp epoch millis, _id])
+    """
+    if bound is None:
+        return True
+    if sort_key is None:
+        return False
+    return tuple(sort_key) < tuple(bound)
+
+
+def record_skipped_range(
+    start: Optional[List],
+    end: List,
+    lag_seconds: Optional[float] = None,
+    estimated_events: Optional[int] = None,
+) -> Any:
+    """
+    Ghi range bị shed. Gọi TRƯỚC khi commit offset live mới
+    -> crash giữa chừng thì range vẫn còn (xử lý lại = upsert, không trùng).
+    """
+    ensure_backfill_indexes()
+    now = datetime.now(timezone.utc)
+    return get_backfill_collection().insert_one({
+        "start": start,
+        "end": end,
+        "cursor": start,
+        "status": STATUS_PENDING,
+        "lag_seconds": lag_seconds,
+        "estimated_events": estimated_events,
+        "processed": 0,
+        "created_at": now,
+        "updated_at": now,
+    }).inserted_id
+
+
+def next_pending_range() -> Optional[Dict[str, Any]]:
+    """
+    Range pending mới nhất trước: log gần hiện tại có giá trị hơn với analyst
+    """
+    return get_backfill_collection().find_one(
+        {"status": STATUS_PENDING},
+        sort=[("created_at", -1)],
+    )
+
+
+def advance_range(range_id, cursor: List, processed: int):
+    get_backfill_collection().update_one(
+        {"_id": range_id},
+        {
+            "$set": {"cursor": cursor, "updated_at": datetime.now(timezone.utc)},
+            "$inc": {"processed": processed},
+        },
+    )
+
+
+def finish_range(range_id):
+    now = datetime.now(timezone.utc)
+    get_backfill_collection().update_one(
+        {"_id": range_id},
+        {"$set": {"status": STATUS_DONE, "updated_at": now, "done_at": now}},
+    )
+
+
+def backfill_progress() -> Dict[str, Any]:
+    """
+    Tổng hợp tiến độ backfill cho API
+    """
+    pending, done = [], 0
+    processed_total = 0
+    estimated_remaining = 0
+
+    for doc in get_backfill_collection().find({}, {"status": 1, "processed": 1, "estimated_events": 1, "start": 1, "end": 1, "cursor": 1, "created_at": 1}):
+        processed_total += doc.get("processed") or 0
+        if doc.get("status") == STATUS_DONE:
+            done += 1
+            continue
+
+        estimated = doc.get("estimated_events")
+        if estimated is not None:
+            estimated_remaining += max(0, estimated - (doc.get("processed") or 0))
+        pending.append({
+            "id": str(doc["_id"]),
+            "start": doc.get("start"),
+            "end": doc.get("end"),
+            "cursor": doc.get("cursor"),
+            "processed": doc.get("processed") or 0,
+            "estimated_events": estimated,
+            "created_at": doc.get("created_at"),
+        })
+
+    pending.sort(key=lambda r: r["created_at"], reverse=True)
+    return {
+        "pending_ranges": len(pending),
+        "done_ranges": done,
+        "processed_events": processed_total,
+        "estimated_remaining_events": estimated_remaining,
+        "pending": pending,
+    }
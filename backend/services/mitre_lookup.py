@@ -1,18 +1,13 @@
 # services/mitre_lookup.py
 
-from pymongo import MongoClient
-import config
-
-client = MongoClient(config.MONGO_URI)
-db = client[config.MONGO_DB]
-mitre_col = db[config.MONGO_COL_MITRE]
+from services.mitre_storage import get_mitre_collection
 
 
 def get_mitre_by_elastic_id(elastic_id: str) -> dict | None:
     """
     Truy xuất mapping MITRE theo elastic_id
     """
-    doc = mitre_col.find_one(
+    doc = get_mitre_collection().find_one(
         {"elastic_id": elastic_id},
         {
             "_id": 0,  # không cần Mongo internal id
@@ -0,0 +1,204 @@
+# services/mitre_prefilter.py
+"""
+Prefilter trước MitreEngine: alert Snort thuộc nhóm biết trước là benign / informational
+(Misc activity, UPnP 1900, multicast...) không đi qua model CatBoost.
+Event khớp được ghi mitre_mapped=False, mitre_reason="prefiltered".
+
+File JSON (MITRE_PREFILTER), đổi file -> tự reload:
+    {
+      "rules": [
+        {"name": "misc_activity", "class": ["Misc activity"]},
+        {"name": "upnp_ssdp", "dst_port": [1900]},
+        {"name": "multicast", "dst_cidr": ["224.0.0.0/4", "ff00::/8"]},
+        {"name": "decoder", "gid": [116]},
+        {"name": "noisy_sids", "sid": ["1:2000419", 2013504]},
+        {"name": "low_priority", "priority_gte": 4}
+      ]
+    }
+Trong 1 rule: mọi điều kiện phải khớp (AND). Giữa các rule: khớp 1 rule là đủ (OR).
+sid: "gid:sid" hoặc số (mọi gid). priority Snort: 1 = cao nhất.
+"""
+
+import ipaddress
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from AI_MITRE.AI.schema.snort_event_normalizer import parse_rule_id
+
+PREFILTERED = "prefiltered"
+
+RULE_CONDITIONS = ("class", "gid", "sid", "dst_cidr", "dst_port", "priority_gte")
+
+
+def _split_ap(value) -> tuple:
+    if not isinstance(value, str) or ":" not in value:
+        return None, None
+    ip, port = value.rsplit(":", 1)
+    try:
+        return ip.strip("[]"), int(port)
+    except ValueError:
+        return ip.strip("[]"), None
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+class PrefilterRule:
+    def __init__(self, spec: Dict[str, Any]):
+        conditions = [c for c in RULE_CONDITIONS if spec.get(c) is not None]
+        if not conditions:
+            raise ValueError(f"rule {spec.get('name')!r} has no condition ({', '.join(RULE_CONDITIONS)})")
+
+        self.name = str(spec.get("name") or "+".join(conditions))
+        self.classes = {str(c).strip().lower() for c in _as_list(spec["class"])} if "class" in conditions else None
+        self.gids = {int(g) for g in _as_list(spec["gid"])} if "gid" in conditions else None
+        self.dst_ports = {int(p) for p in _as_list(spec["dst_port"])} if "dst_port" in conditions else None
+        self.priority_gte = int(spec["priority_gte"]) if "priority_gte" in conditions else None
+        self.networks = (
+            [ipaddress.ip_network(c, strict=False) for c in _as_list(spec["dst_cidr"])]
+            if "dst_cidr" in conditions else None
+        )
+
+        # sid: (gid, sid) chính xác, hoặc sid với mọi gid
+        self.gid_sids = None
+        self.any_gid_sids = None
+        if "sid" in conditions:
+            self.gid_sids, self.any_gid_sids = set(), set()
+            for value in _as_list(spec["sid"]):
+                if isinstance(value, str) and ":" in value:
+                    gid, _, sid = value.partition(":")
+                    self.gid_sids.add((int(gid), int(sid)))
+                else:
+                    self.any_gid_sids.add(int(value))
+
+    def matches(self, snort: Dict[str, Any], rule_info: Dict[str, Optional[int]], dst: tuple) -> bool:
+        if self.classes is not None and str(snort.get("class") or "").strip().lower() not in self.classes:
+            return False
+        if self.gids is not None and rule_info["gid"] not in self.gids:
+            return False
+        if self.gid_sids is not None:
+            key = (rule_info["gid"], rule_info["sid"])
+            if key not in self.gid_sids and rule_info["sid"] not in self.any_gid_sids:
+                return False
+        if self.priority_gte is not None:
+            try:
+                if int(snort.get("priority")) < self.priority_gte:
+                    return False
+            except (TypeError, ValueError):
+                return False
+        if self.dst_ports is not None and dst[1] not in self.dst_ports:
+            return False
+        if self.networks is not None:
+            try:
+                ip = ipaddress.ip_address(dst[0])
+            except ValueError:
+                return False
+            if not any(ip in net for net in self.networks):
+                return False
+        return True
+
+
+def load_prefilter_rules(path: str) -> List[PrefilterRule]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [PrefilterRule(spec) for spec in data.get("rules") or [] if spec.get("enabled", True)]
+
+
+class AlertPrefilter:
+    """
+    Rule prefilter (giống SidLookupTable):
+    - match(hit) -> tên rule khớp hoặc None
+    - maybe_reload(): file đổi mtime -> load rule mới rồi swap (file lỗi -> giữ rule cũ)
+    - đếm số event đã kiểm tra / bỏ qua theo từng rule
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = float(check_interval)
+
+        self._rules: List[PrefilterRule] = []
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+        self.checked = 0
+        self.skipped: Dict[str, int] = {}
+        self.reloads = 0
+
+        self.reload()
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def match(self, hit: Dict[str, Any]) -> Optional[str]:
+        rules = self._rules
+        self.checked += 1
+        if not rules:
+            return None
+
+        src = hit.get("_source", hit)
+        snort = src.get("snort") or {}
+        rule_info = parse_rule_id(snort.get("rule"))
+        dst = _split_ap(snort.get("dst_ap"))
+
+        for rule in rules:
+            if rule.matches(snort, rule_info, dst):
+                self.skipped[rule.name] = self.skipped.get(rule.name, 0) + 1
+                return rule.name
+        return None
+
+    def reload(self) -> bool:
+        """
+        Load lại file. File thiếu / lỗi -> giữ rule cũ, return False.
+        """
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+                rules = load_prefilter_rules(self.path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[PREFILTER] ⚠️ Cannot load {self.path}: {e}")
+                return False
+
+            self._rules = rules
+            self._mtime = mtime
+            self.reloads += 1
+            print(f"[PREFILTER] Loaded {len(rules)} rules from {self.path}")
+            return True
+
+    def maybe_reload(self) -> bool:
+        """
+        Gọi mỗi batch: chỉ stat file tối đa 1 lần / check_interval giây.
+        """
+        if time.monotonic() - self._last_check < self.check_interval:
+            return False
+
+        self._last_check = time.monotonic()
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+
+        if mtime == self._mtime:
+            return False
+        return self.reload()
+
+    def reset_stats(self):
+        self.checked = 0
+        self.skipped = {}
+
+    def stats(self) -> Dict[str, Any]:
+        skipped = sum(self.skipped.values())
+        return {
+            "path": self.path,
+            "rules": [rule.name for rule in self._rules],
+            "checked": self.checked,
+            "skipped": skipped,
+            "skip_rate": (skipped / self.checked) if self.checked else 0.0,
+            "skipped_by_rule": dict(self.skipped),
+            "reloads": self.reloads,
+        }
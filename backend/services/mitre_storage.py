@@ -1,16 +1,21 @@
 # services/mitre_storage.py
 
 from datetime import datetime
-from pymongo import MongoClient
+from typing import List, Tuple
+from pymongo import InsertOne, UpdateOne
 import config
+from core.db import get_db
+from core.metrics import get_metrics
 
-client = MongoClient(config.MONGO_URI)
-db = client[config.MONGO_DB]
-mitre_col = db[config.MONGO_COL_MITRE]
+_indexes_ready = False
 
 
-def save_mitre_result(meta: dict, mitre_result: dict):
-    doc = {
+def get_mitre_collection():
+    return get_db()[config.MONGO_COL_MITRE]
+
+
+def build_mitre_result_doc(meta: dict, mitre_result: dict) -> dict:
+    return {
         # ===== Elastic link =====
         "elastic_index": meta.get("elastic_index"),
         "elastic_id": meta.get("elastic_id"),
@@ -33,11 +38,67 @@ def save_mitre_result(meta: dict, mitre_result: dict):
         # ===== MITRE =====
         "mitre_processed": mitre_result.get("mitre_processed", True),
         "mitre_mapped": mitre_result.get("mitre_mapped", False),
+        "mitre_reason": mitre_result.get("mitre_reason"),
+        "prefilter_rule": mitre_result.get("prefilter_rule"),
         "tactic": mitre_result.get("tactic"),
         "technique": mitre_result.get("technique"),
         "confidence": mitre_result.get("confidence"),
         "tactic_confidence": mitre_result.get("tactic_confidence"),
         "technique_confidence": mitre_result.get("technique_confidence"),
+        "technique_skipped": mitre_result.get("technique_skipped"),
+        "model_version": mitre_result.get("model_version"),
     }
 
-    mitre_col.insert_one(doc)
+
+def ensure_mitre_indexes():
+    """
+    Gọi 1 lần lúc worker start (không nằm trên đường ghi).
+    Index (elastic_id, elastic_index): upsert theo cặp này (bulk) + mitre_lookup theo elastic_id (prefix).
+    Không unique để không lỗi với dữ liệu trùng cũ.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    get_mitre_collection().create_index([("elastic_id", 1), ("elastic_index", 1)])
+    _indexes_ready = True
+
+
+def save_mitre_result(meta: dict, mitre_result: dict):
+    get_mitre_collection().insert_one(build_mitre_result_doc(meta, mitre_result))
+
+
+def save_mitre_results(items: List[Tuple[dict, dict]]):
+    """
+    Ghi cả 1 page kết quả bằng 1 bulk_write (unordered).
+    - items: list (meta, mitre_result)
+    - Upsert theo (elastic_index, elastic_id): _id ES chỉ unique trong 1 index,
+      các index snort-alert-* theo ngày có thể trùng _id
+    - Ghi lại cùng page (retry) không tạo bản trùng
+    Raise nếu ghi lỗi -> caller KHÔNG được commit offset.
+    """
+    if not items:
+        return
+
+    ops = []
+    for meta, mitre_result in items:
+        doc = build_mitre_result_doc(meta, mitre_result)
+        elastic_id = doc.get("elastic_id")
+
+        if not elastic_id:
+            ops.append(InsertOne(doc))
+            continue
+
+        created_at = doc.pop("created_at")
+        ops.append(
+            UpdateOne(
+                {"elastic_id": elastic_id, "elastic_index": doc.get("elastic_index")},
+                {
+                    "$set": doc,
+                    "$setOnInsert": {"created_at": created_at},
+                },
+                upsert=True,
+            )
+        )
+
+    with get_metrics("mitre").timer("storage"):
+        get_mitre_collection().bulk_write(ops, ordered=False)
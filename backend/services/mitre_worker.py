@@ -1,13 +1,29 @@
 # services/mitre_worker.py
 
+import multiprocessing
+import os
+import queue
+import signal
+import threading
 import time
 import warnings
+from datetime import datetime, timezone
 from elasticsearch import Elasticsearch, ElasticsearchWarning
 
-from AI_MITRE.Catboost.preprocessing.normalize_elastic import normalize_elastic_log
-from AI_MITRE.Catboost.inference.engine import MitreEngine
-from services.mitre_storage import save_mitre_result
-from services.pipeline_offset import set_mitre_offset
+from core.lazy import LazyResource
+from core.metrics import get_metrics
+from AI_MITRE.Catboost.inference.combine_rule import is_mapped
+from services.micro_batcher import MicroBatcher
+from services.mitre_backfill import (
+    advance_range,
+    finish_range,
+    next_pending_range,
+    record_skipped_range,
+    sort_key_before,
+)
+from services.mitre_prefilter import PREFILTERED, AlertPrefilter
+from services.mitre_storage import ensure_mitre_indexes, save_mitre_results
+from services.pipeline_offset import get_mitre_offset, set_mitre_offset
 
 # =========================
 # CONFIG
@@ -17,15 +33,243 @@ ELASTIC_INDEX = "snort-alert-*"
 BATCH_SIZE = 200
 POLL_INTERVAL = 0.1  # seconds
 
+# Micro-batching: gom hit tới MICRO_BATCH_MAX event hoặc MICRO_BATCH_MAX_WAIT_MS,
+# batch size tự điều chỉnh để p99 latency classify < LATENCY_SLO_MS.
+# Opt-in (MITRE_MICRO_BATCH=1); mặc định page cố định BATCH_SIZE như cũ.
+MICRO_BATCH = os.getenv("MITRE_MICRO_BATCH", "0") == "1"
+MICRO_BATCH_MIN = 20
+MICRO_BATCH_MAX = 1000
+MICRO_BATCH_MAX_WAIT_MS = 100.0
+LATENCY_SLO_MS = float(os.getenv("MITRE_LATENCY_SLO_MS", "500"))
+
+# Prediction cache (0 = tắt). Timestamp: "exact" | "bucket" | "exclude"
+PREDICTION_CACHE_SIZE = int(os.getenv("MITRE_PREDICTION_CACHE_SIZE", "0"))
+PREDICTION_CACHE_TIMESTAMP = os.getenv("MITRE_PREDICTION_CACHE_TIMESTAMP", "exact")
+PREDICTION_CACHE_BUCKET_SEC = float(os.getenv("MITRE_PREDICTION_CACHE_BUCKET_SEC", "60"))
+
+# Process pool cho inference (0 = classify ngay trong worker thread).
+# Mỗi vòng lấy tối đa INFERENCE_PROCESSES page, mỗi process classify 1 page.
+# Process con start bằng forkserver / spawn (KHÔNG fork từ process Flask nhiều thread:
+# lock đang bị thread khác giữ lúc fork -> process con deadlock), mỗi process tự load
+# model cùng version với process cha. Page không xong sau INFERENCE_TIMEOUT_SEC
+# (process con chết / treo) -> tạo lại pool, classify page đó ngay trong worker thread.
+# Bộ nhớ: không có copy-on-write như fork -> mỗi process tự import catboost / sklearn
+# và load 1 bản model riêng (~250 MB RSS / process với model technique hiện tại,
+# + model tactic + prediction cache nếu bật) -> RAM tăng ~ INFERENCE_PROCESSES x engine.
+INFERENCE_PROCESSES = int(os.getenv("MITRE_INFERENCE_PROCESSES", "0"))
+INFERENCE_START_METHOD = os.getenv("MITRE_INFERENCE_START_METHOD", "forkserver")
+INFERENCE_TIMEOUT_SEC = float(os.getenv("MITRE_INFERENCE_TIMEOUT_SEC", "60"))
+
+# Joint model (1 model predict cặp tactic+technique, train_jointmodel.py).
+# Đặt MITRE_JOINT_MODEL + MITRE_JOINT_ENCODER -> engine dùng joint mode thay cho 2 model.
+JOINT_MODEL_PATH = os.getenv("MITRE_JOINT_MODEL")
+JOINT_ENCODER_PATH = os.getenv("MITRE_JOINT_ENCODER", "AI_MITRE/Catboost/models/label_encoder_joint.pkl")
+
+# Bảng SID -> MITRE (build_sid_table.py), tra trước model. File đổi -> tự reload.
+SID_TABLE_PATH = os.getenv("MITRE_SID_TABLE")
+SID_TABLE_CHECK_SEC = 5.0
+
+# Prefilter (mitre_prefilter.py): alert benign / informational theo snort class, gid, SID,
+# dải IP đích, priority -> ghi mitre_mapped=False (mitre_reason="prefiltered"), không chạy model.
+# File đổi -> tự reload.
+PREFILTER_PATH = os.getenv("MITRE_PREFILTER")
+PREFILTER_CHECK_SEC = 5.0
+
+# Cascade: bỏ qua model technique khi tactic_conf < MIN_TACTIC_CONF
+# hoặc tactic chỉ có 1 technique hợp lệ (lý do ghi ở technique_skipped)
+CASCADE = os.getenv("MITRE_CASCADE", "0") == "1"
+MIN_TACTIC_CONF = float(os.getenv("MITRE_MIN_TACTIC_CONF", "0"))
+
+# Model registry (model_registry.py). Đặt MITRE_MODEL_REGISTRY -> load model theo version ACTIVE,
+# version đổi -> load engine mới ở background thread, swap giữa 2 batch (không dừng ingest).
+MODEL_REGISTRY_DIR = os.getenv("MITRE_MODEL_REGISTRY")
+MODEL_CHECK_INTERVAL = 10.0  # seconds
+
+# Load shedding theo lag (giờ log mới nhất trên ES - giờ của offset live).
+# lag > LAG_SHED_SEC -> live nhảy tới (head - SHED_KEEP_RECENT_SEC), range bỏ qua ghi vào
+# mitre_backfill_ranges; backfill xử lý các range đó khi live đã bắt kịp (lag < LAG_RESUME_SEC).
+# LAG_SHED_SEC = 0 -> tắt (classify tuần tự như cũ). Bật: LAG_SHED_SEC > SHED_KEEP_RECENT_SEC,
+# 0 < LAG_RESUME_SEC <= LAG_SHED_SEC (kiểm tra lúc start_worker).
+LAG_SHED_SEC = float(os.getenv("MITRE_LAG_SHED_SEC", "0"))
+LAG_RESUME_SEC = float(os.getenv("MITRE_LAG_RESUME_SEC", "60"))
+SHED_KEEP_RECENT_SEC = 60.0
+LAG_CHECK_INTERVAL = 5.0  # seconds
+BACKFILL_PAGE_SIZE = 200
+
+# Điểm bắt đầu khi worker start:
+#   "resume"    : tiếp tục từ offset đã lưu (mitre_snort); chưa có -> từ đầu
+#   "start"     : từ đầu index (classify lại toàn bộ lịch sử)
+#   "now"       : bỏ qua lịch sử, chỉ classify log mới
+#   "timestamp" : từ START_TIMESTAMP (ISO 8601, vd "2025-12-29T07:00:00Z")
+START_FROM = os.getenv("MITRE_START_FROM", "resume")
+START_TIMESTAMP = os.getenv("MITRE_START_TIMESTAMP")
+
+START_MODES = ("resume", "start", "now", "timestamp")
+
 # =========================
 # INIT
 # =========================
-es = Elasticsearch(ELASTIC_URL)
-engine = MitreEngine()
+# Lazy: import module không tạo client / load model
+_es = LazyResource("mitre_elasticsearch", lambda: Elasticsearch(ELASTIC_URL))
+
+
+def _get_registry():
+    from AI_MITRE.Catboost.inference.model_registry import ModelRegistry
+
+    return ModelRegistry(MODEL_REGISTRY_DIR)
+
+
+def _build_engine(sid_table=None, versions=None):
+    # import ở đây: catboost / sklearn chỉ được load khi worker thật sự chạy
+    from AI_MITRE.Catboost.inference.engine import MitreEngine
+    from AI_MITRE.Catboost.inference.joint_predictor import JointPredictor
+    from AI_MITRE.Catboost.inference.sid_lookup import SidLookupTable
+
+    if MODEL_REGISTRY_DIR:
+        predictors = _get_registry().load_engine_predictors(versions)
+    elif JOINT_MODEL_PATH:
+        predictors = {"joint_predictor": JointPredictor(JOINT_MODEL_PATH, JOINT_ENCODER_PATH)}
+    else:
+        predictors = {}
+
+    if sid_table is None and SID_TABLE_PATH:
+        sid_table = SidLookupTable(SID_TABLE_PATH, check_interval=SID_TABLE_CHECK_SEC)
+
+    return MitreEngine(
+        min_tactic_conf=MIN_TACTIC_CONF,
+        cascade=CASCADE,
+        cache_size=PREDICTION_CACHE_SIZE,
+        cache_timestamp=PREDICTION_CACHE_TIMESTAMP,
+        cache_timestamp_bucket_sec=PREDICTION_CACHE_BUCKET_SEC,
+        sid_table=sid_table,
+        **predictors,
+    )
+
+
+_engine = LazyResource("mitre_engine", _build_engine)
+
+_prefilter = LazyResource(
+    "mitre_prefilter",
+    lambda: AlertPrefilter(PREFILTER_PATH, check_interval=PREFILTER_CHECK_SEC),
+) if PREFILTER_PATH else None
+
+# Latency / counter dùng chung với MitreEngine (stage es_fetch, classify, storage, offset_commit).
+# INFERENCE_PROCESSES > 0: stage bên trong engine chạy ở process con, gửi về cùng kết quả
+# mỗi page rồi merge vào đây.
+_metrics = get_metrics("mitre")
+
+# marker cho event classify lỗi (khác None = benign / không map)
+# dùng string để còn so sánh được sau khi pickle qua process pool
+EVENT_FAILED = "__mitre_event_failed__"
+
+_inference_pool = None
+# process con gửi pid khi start (initializer) -> process cha kill được khi pool treo
+_inference_pid_queue = None
+_inference_pids = set()
+# pid process con -> stats (cache / SID table / model version) của page gần nhất
+_inference_children = {}
+
+_batcher = MicroBatcher(
+    max_batch=MICRO_BATCH_MAX,
+    min_batch=MICRO_BATCH_MIN,
+    initial_batch=BATCH_SIZE,
+    max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+    latency_slo_ms=LATENCY_SLO_MS,
+) if MICRO_BATCH else None
+
+# Hot reload model (registry)
+_reload_lock = threading.Lock()
+_reload_thread = None
+_pending_engine = None
+_last_model_check = 0.0
+_failed_versions = None
+
+# Trạng thái live / shedding (đọc bởi API qua lag_stats)
+_lag_state = {
+    "enabled": LAG_SHED_SEC > 0,
+    "overloaded": False,
+    "lag_seconds": None,
+    "head": None,
+    "offset": None,
+    "checked_at": None,
+    "sheds": 0,
+    "last_shed_at": None,
+}
+_last_lag_check = 0.0
 
 warnings.filterwarnings("ignore", category=ElasticsearchWarning)
 
 
+def get_es() -> Elasticsearch:
+    return _es.get()
+
+
+def get_engine():
+    return _engine.get()
+
+
+def _load_engine_background(versions: dict, sid_table):
+    global _pending_engine, _failed_versions
+    try:
+        engine = _build_engine(sid_table=sid_table, versions=versions)
+        with _reload_lock:
+            _pending_engine = engine
+        print(f"[MITRE] Loaded models {versions}, swap ở batch kế tiếp")
+    except Exception as e:
+        # version lỗi (checksum / metadata...) -> không thử lại cho tới khi ACTIVE đổi
+        _failed_versions = versions
+        print(f"[MITRE][MODEL RELOAD ERROR] {versions}: {e}")
+
+
+def maybe_reload_engine() -> bool:
+    """
+    Gọi giữa các batch.
+    - Có engine mới đã load xong -> swap (atomic), restart inference pool
+    - Tối đa 1 lần / MODEL_CHECK_INTERVAL: version ACTIVE khác engine -> load ở background
+    Return True nếu vừa swap.
+    """
+    global _pending_engine, _reload_thread, _last_model_check
+
+    if not MODEL_REGISTRY_DIR:
+        return False
+
+    with _reload_lock:
+        engine, _pending_engine = _pending_engine, None
+
+    if engine is not None:
+        old = _engine.swap(engine)
+        print(f"[MITRE] Model swapped {old.model_version if old else None} -> {engine.model_version}")
+
+        # process con đang giữ model cũ -> tạo pool mới (version mới) ở lần classify sau
+        reset_inference_pool()
+        return True
+
+    if _reload_thread is not None and _reload_thread.is_alive():
+        return False
+    if time.monotonic() - _last_model_check < MODEL_CHECK_INTERVAL:
+        return False
+    _last_model_check = time.monotonic()
+
+    try:
+        versions = _get_registry().engine_versions()
+    except Exception as e:
+        print("[MITRE][MODEL CHECK ERROR]", e)
+        return False
+
+    current = get_engine()
+    if versions == current.model_version or versions == _failed_versions:
+        return False
+
+    _reload_thread = threading.Thread(
+        target=_load_engine_background,
+        args=(versions, current.sid_table),
+        daemon=True,
+        name="mitre-model-reload",
+    )
+    _reload_thread.start()
+    return False
+
+
 def extract_metadata(hit: dict) -> dict:
     src = hit.get("_source", {})
     snort = src.get("snort", {})
@@ -59,13 +303,13 @@ def extract_metadata(hit: dict) -> dict:
     }
 
 
-def fetch_logs(search_after=None):
+def fetch_logs(search_after=None, size: int = None):
     """
     IMPORTANT: No PIT here -> do NOT use _shard_doc.
     Use @timestamp + _id so search_after is stable.
     """
     query = {
-        "size": BATCH_SIZE,
+        "size": size or BATCH_SIZE,
         "sort": [
             {"@timestamp": "asc"},
             {"_id": "asc"},
@@ -75,73 +319,585 @@ def fetch_logs(search_after=None):
     if search_after:
         query["search_after"] = search_after
 
-    resp = es.search(index=ELASTIC_INDEX, body=query)
+    with _metrics.timer("es_fetch"):
+        resp = get_es().search(index=ELASTIC_INDEX, body=query)
     return resp["hits"]["hits"]
 
 
-def run_forever():
-    print("[MITRE] Worker started")
-    search_after = None
+def count_logs_between(start, end) -> int:
+    """
+    Số log (ước lượng theo @timestamp) trong range bị shed -> hiển thị tiến độ backfill
+    """
+    time_range = {"lt": end[0], "format": "epoch_millis"}
+    if start:
+        time_range["gte"] = start[0]
+    resp = get_es().count(index=ELASTIC_INDEX, body={"query": {"range": {"@timestamp": time_range}}})
+    return resp["count"]
+
+
+def prefiltered_result(rule_name: str) -> dict:
+    return {"mitre_reason": PREFILTERED, "prefilter_rule": rule_name}
+
+
+def build_mitre_doc(mitre_result: dict, model_version: dict = None) -> dict:
+    # ===== PREFILTER: không chạy model =====
+    if mitre_result and mitre_result.get("mitre_reason") == PREFILTERED:
+        return {
+            "mitre_processed": True,
+            "mitre_mapped": False,
+            "mitre_reason": PREFILTERED,
+            "prefilter_rule": mitre_result.get("prefilter_rule"),
+            "tactic": None,
+            "technique": None,
+            "confidence": 0,
+            "tactic_confidence": 0,
+            "technique_confidence": 0,
+            "technique_skipped": None,
+            "model_version": None,
+        }
+
+    # ===== CASCADE: tactic confidence thấp, model technique không chạy -> chưa map =====
+    # giữ tactic / confidence để xem lại, lý do ở mitre_reason
+    if mitre_result and not is_mapped(mitre_result):
+        return {
+            "mitre_processed": True,
+            "mitre_mapped": False,
+            "mitre_reason": mitre_result.get("technique_skipped"),
+            "tactic": mitre_result.get("tactic"),
+            "technique": None,
+            "confidence": mitre_result.get("confidence", 0),
+            "tactic_confidence": mitre_result.get("tactic_confidence", 0),
+            "technique_confidence": 0,
+            "technique_skipped": mitre_result.get("technique_skipped"),
+            "model_version": mitre_result.get("model_version", model_version),
+        }
+
+    # ===== TÁCH processed vs mapped =====
+    if is_mapped(mitre_result):
+        return {
+            "mitre_processed": True,
+            "mitre_mapped": True,
+            "tactic": mitre_result.get("tactic"),
+            "technique": mitre_result.get("technique"),
+            "confidence": mitre_result.get("confidence", 0),
+            "tactic_confidence": mitre_result.get("tactic_confidence", 0),
+            "technique_confidence": mitre_result.get("technique_confidence", 0),
+            "technique_skipped": mitre_result.get("technique_skipped"),
+            "model_version": mitre_result.get("model_version", model_version),
+        }
+
+    # 🔥 LOG BENIGN / KHÔNG MAP
+    return {
+        "mitre_processed": True,
+        "mitre_mapped": False,
+        "tactic": None,
+        "technique": None,
+        "confidence": 0,
+        "tactic_confidence": 0,
+        "technique_confidence": 0,
+        "technique_skipped": None,
+        "model_version": model_version,
+    }
+
+
+def classify_hits(hits: list) -> list:
+    """
+    Classify 1 page hits bằng batch inference.
+    Nếu batch lỗi -> fallback từng event (giữ hành vi cũ: event lỗi bị bỏ qua).
+    """
+    try:
+        return get_engine().process_batch(hits)
+    except Exception as e:
+        print("[MITRE][BATCH ERROR]", e)
+
+    results = []
+    for hit in hits:
+        try:
+            results.append(get_engine().process_log(hit))
+        except Exception as e:
+            print("[MITRE][EVENT ERROR]", e)
+            results.append(EVENT_FAILED)
+    return results
+
+
+def latest_sort_key():
+    """
+    Sort key [@timestamp, _id] của log mới nhất trong index (None nếu rỗng).
+    """
+    query = {
+        "size": 1,
+        "sort": [
+            {"@timestamp": "desc"},
+            {"_id": "desc"},
+        ],
+        "query": {"match_all": {}},
+    }
+    resp = get_es().search(index=ELASTIC_INDEX, body=query)
+    hits = resp["hits"]["hits"]
+    return hits[0].get("sort") if hits else None
+
+
+def timestamp_sort_key(value: str) -> list:
+    """
+    ISO timestamp -> search_after để lấy mọi log có @timestamp >= value.
+    ES trả sort @timestamp dạng epoch millis; "" nhỏ hơn mọi _id.
+    """
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return [int(dt.timestamp() * 1000), ""]
+
+
+def resolve_start_offset(start_from: str = None, start_timestamp: str = None):
+    """
+    Tính search_after ban đầu theo START_FROM.
+    """
+    start_from = start_from or START_FROM
+    start_timestamp = start_timestamp or START_TIMESTAMP
+
+    if start_from not in START_MODES:
+        raise ValueError(f"Invalid start mode {start_from!r}, expected one of {START_MODES}")
+
+    if start_from == "resume":
+        return get_mitre_offset()
+
+    if start_from == "now":
+        return latest_sort_key()
+
+    if start_from == "timestamp":
+        if not start_timestamp:
+            raise ValueError("start mode 'timestamp' requires a start timestamp")
+        return timestamp_sort_key(start_timestamp)
+
+    return None
+
+
+def _init_inference_process(versions, pid_queue=None):
+    """
+    Initializer của process con: báo pid cho process cha, load engine 1 lần / process,
+    registry mode -> đúng version engine của process cha (không đọc lại ACTIVE).
+    """
+    if pid_queue is not None:
+        pid_queue.put(os.getpid())
+    _engine.swap(_build_engine(versions=versions))
+
+
+def _classify_in_child(hits: list):
+    """
+    Chạy ở process con. Trả kết quả + metrics / stats của page này để process cha merge.
+    """
+    _metrics.reset()
+    results = classify_hits(hits)
+    engine = get_engine()
+    stats = {
+        "pid": os.getpid(),
+        "model_version": engine.model_version,
+        "cache": engine.cache_stats(),
+        "sid_table": engine.sid_table_stats(),
+    }
+    return results, _metrics.snapshot(), stats
+
+
+def get_inference_pool():
+    """
+    Tạo process pool lần đầu được gọi (forkserver / spawn, không fork process hiện tại).
+    """
+    global _inference_pool, _inference_pid_queue
+    if INFERENCE_PROCESSES <= 0:
+        return None
+    if _inference_pool is None:
+        versions = get_engine().model_version if MODEL_REGISTRY_DIR else None
+        ctx = multiprocessing.get_context(INFERENCE_START_METHOD)
+        _inference_pid_queue = ctx.Queue()
+        _inference_pool = ctx.Pool(
+            processes=INFERENCE_PROCESSES,
+            initializer=_init_inference_process,
+            initargs=(versions, _inference_pid_queue),
+        )
+        print(f"[MITRE] Inference pool started: {INFERENCE_PROCESSES} processes ({INFERENCE_START_METHOD})")
+    return _inference_pool
+
+
+def inference_worker_pids() -> set:
+    """
+    Pid mọi process con pool đã start (kể cả process pool tạo lại thay process chết)
+    """
+    while _inference_pid_queue is not None:
+        try:
+            _inference_pids.add(_inference_pid_queue.get_nowait())
+        except queue.Empty:
+            break
+    return set(_inference_pids)
+
+
+def reset_inference_pool():
+    global _inference_pool, _inference_pid_queue
+    pool, _inference_pool = _inference_pool, None
+    _inference_children.clear()
+    if pool is None:
+        return
+
+    pids = inference_worker_pids()
+    _inference_pids.clear()
+    _inference_pid_queue = None
+
+    # Pool.terminate() treo vĩnh viễn nếu process con chết khi đang giữ lock của queue
+    # -> terminate + join ở thread nền, quá hạn thì kill các process con đã đăng ký pid
+    def stop():
+        pool.terminate()
+        pool.join()
+
+    stopper = threading.Thread(target=stop, daemon=True, name="mitre-pool-terminate")
+    stopper.start()
+    stopper.join(timeout=5)
+    if stopper.is_alive():
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+
+def fetch_pages(search_after, max_pages: int) -> list:
+    """
+    Lấy liên tiếp tối đa max_pages page (search_after nối tiếp nhau).
+    Dừng sớm khi page không đầy (đã bắt kịp realtime).
+    """
+    pages = []
+    while len(pages) < max_pages:
+        hits = fetch_logs(search_after)
+        if not hits:
+            break
+        pages.append(hits)
+        search_after = hits[-1].get("sort")
+        if len(hits) < BATCH_SIZE:
+            break
+    return pages
+
+
+def split_pages(hits: list, parts: int) -> list:
+    """
+    Chia 1 micro-batch thành tối đa `parts` page liên tiếp (mỗi process classify 1 page)
+    """
+    parts = max(1, min(parts, len(hits)))
+    size = -(-len(hits) // parts)
+    return [hits[i:i + size] for i in range(0, len(hits), size)]
+
+
+def batcher_stats() -> dict:
+    return _batcher.stats() if _batcher is not None else None
+
+
+def engine_stats() -> dict:
+    """
+    Metrics + stats cache / SID table cho API. Không ép load model nếu engine chưa init.
+    """
+    stats = {
+        "metrics": _metrics.snapshot(),
+        "batcher": batcher_stats(),
+        "engine_ready": _engine.ready,
+        "inference_processes": INFERENCE_PROCESSES,
+    }
+    if _inference_children:
+        stats["inference_children"] = list(_inference_children.values())
+    if _prefilter is not None and _prefilter.ready:
+        stats["prefilter"] = _prefilter.get().stats()
+    if _engine.ready:
+        engine = get_engine()
+        stats["model_version"] = engine.model_version
+        stats["cache"] = engine.cache_stats()
+        stats["sid_table"] = engine.sid_table_stats()
+    return stats
+
+
+def classify_pages(pages: list) -> list:
+    """
+    Classify nhiều page; kết quả trả về đúng thứ tự page.
+    """
+    pool = get_inference_pool()
+    if pool is None:
+        return [classify_hits(hits) for hits in pages]
+
+    try:
+        outputs = pool.map_async(_classify_in_child, pages, chunksize=1).get(INFERENCE_TIMEOUT_SEC)
+    except Exception as e:
+        # process con chết -> map không bao giờ xong: bỏ pool, classify ngay ở đây
+        print(f"[MITRE][INFERENCE POOL ERROR] {type(e).__name__}: {e} -> restart pool")
+        _metrics.incr("inference_pool_restarts")
+        reset_inference_pool()
+        return [classify_hits(hits) for hits in pages]
+
+    results_per_page = []
+    for results, metrics, stats in outputs:
+        _metrics.merge(metrics)
+        _inference_children[stats["pid"]] = stats
+        results_per_page.append(results)
+    return results_per_page
+
+
+def save_page(hits: list, results: list):
+    """
+    Ghi cả page bằng 1 bulk write (không commit offset).
+    Event classify lỗi bị bỏ qua.
+    """
+    # engine chỉ swap đầu vòng lặp -> page này được classify bởi engine hiện tại
+    model_version = get_engine().model_version
+
+    items = []
+    for hit, mitre_result in zip(hits, results):
+        if mitre_result == EVENT_FAILED:
+            _metrics.incr("failed")
+            continue
+        try:
+            items.append((extract_metadata(hit), build_mitre_doc(mitre_result, model_version)))
+        except Exception as e:
+            print("[MITRE][EVENT ERROR]", e)
+
+    save_mitre_results(items)
+
+
+def classify_batch(pages: list) -> list:
+    """
+    Prefilter (ở process cha) rồi classify_pages phần còn lại.
+    Event bị prefilter -> prefiltered_result(rule), không vào model.
+    """
+    if _prefilter is None:
+        return classify_pages(pages)
+
+    prefilter = _prefilter.get()
+    prefilter.maybe_reload()
+
+    with _metrics.timer("prefilter"):
+        matched = [[prefilter.match(hit) for hit in hits] for hits in pages]
+
+    remaining = [
+        [hit for hit, rule in zip(hits, rules) if rule is None]
+        for hits, rules in zip(pages, matched)
+    ]
+    to_classify = [hits for hits in remaining if hits]
+    classified = iter(classify_pages(to_classify) if to_classify else [])
+
+    skipped = 0
+    results_per_page = []
+    for hits, rules in zip(remaining, matched):
+        page_results = iter(next(classified) if hits else [])
+        results = []
+        for rule in rules:
+            if rule is None:
+                results.append(next(page_results))
+            else:
+                results.append(prefiltered_result(rule))
+                skipped += 1
+        results_per_page.append(results)
+
+    # prefilter không qua engine -> tự cộng events / unmapped (mapped + unmapped = events)
+    _metrics.incr("prefiltered", skipped)
+    _metrics.incr("events", skipped)
+    _metrics.incr("unmapped", skipped)
+    return results_per_page
+
+
+def store_page(hits: list, results: list):
+    """
+    save_page, sau đó commit offset 1 lần (hit cuối page).
+    Ghi lỗi -> raise, offset KHÔNG đi -> page được xử lý lại (upsert, không trùng).
+    Event classify lỗi bị bỏ qua nhưng offset vẫn đi qua.
+    """
+    save_page(hits, results)
+
+    sort_key = hits[-1].get("sort")
+    if sort_key:
+        with _metrics.timer("offset_commit"):
+            set_mitre_offset(sort_key)
+
+
+# =========================
+# LOAD SHEDDING / BACKFILL
+# =========================
+def lag_stats() -> dict:
+    return dict(_lag_state)
+
+
+def validate_lag_config():
+    """
+    Cấu hình shedding sai -> ValueError lúc start (không phải lúc đang quá tải).
+    """
+    if LAG_SHED_SEC <= 0:
+        return
+    if LAG_SHED_SEC <= SHED_KEEP_RECENT_SEC:
+        raise ValueError(
+            f"MITRE_LAG_SHED_SEC ({LAG_SHED_SEC:g}) must be > {SHED_KEEP_RECENT_SEC:g}s "
+            f"(live keeps the last {SHED_KEEP_RECENT_SEC:g}s after a shed)"
+        )
+    if not 0 < LAG_RESUME_SEC <= LAG_SHED_SEC:
+        raise ValueError(
+            f"MITRE_LAG_RESUME_SEC ({LAG_RESUME_SEC:g}) must be in (0, MITRE_LAG_SHED_SEC={LAG_SHED_SEC:g}]"
+        )
+
+
+def maybe_shed(search_after):
+    """
+    Gọi giữa các batch, đo lag tối đa 1 lần / LAG_CHECK_INTERVAL.
+    lag > LAG_SHED_SEC -> ghi range [search_after, head - SHED_KEEP_RECENT_SEC) để backfill,
+    commit offset live mới. Return search_after mới (không đổi nếu không shed).
+    """
+    global _last_lag_check
+
+    if LAG_SHED_SEC <= 0:
+        return search_after
+    if time.monotonic() - _last_lag_check < LAG_CHECK_INTERVAL:
+        return search_after
+    _last_lag_check = time.monotonic()
+
+    head = latest_sort_key()
+    _lag_state["head"] = head
+    _lag_state["offset"] = search_after
+    _lag_state["checked_at"] = time.time()
+
+    # chưa có offset (classify lại từ đầu index theo START_FROM) -> không đo được lag
+    if not head or not search_after:
+        _lag_state["lag_seconds"] = None
+        return search_after
+
+    lag = max(0.0, (head[0] - search_after[0]) / 1000.0)
+    _lag_state["lag_seconds"] = lag
+
+    if lag < LAG_RESUME_SEC:
+        _lag_state["overloaded"] = False
+    if lag <= LAG_SHED_SEC:
+        return search_after
+
+    # live không bao giờ lùi: jump = max(offset hiện tại, head - SHED_KEEP_RECENT_SEC);
+    # range rỗng -> không ghi range, không đổi offset
+    jump = [int(head[0] - SHED_KEEP_RECENT_SEC * 1000), ""]
+    if not sort_key_before(search_after, jump):
+        return search_after
+
+    try:
+        estimated = count_logs_between(search_after, jump)
+    except Exception as e:
+        print("[MITRE][LAG COUNT ERROR]", e)
+        estimated = None
+
+    # ghi range trước, offset sau -> crash giữa chừng không mất range
+    record_skipped_range(search_after, jump, lag_seconds=lag, estimated_events=estimated)
+    set_mitre_offset(jump)
+
+    _lag_state.update(overloaded=True, offset=jump, sheds=_lag_state["sheds"] + 1, last_shed_at=time.time())
+    _metrics.incr("shed_ranges")
+    if estimated:
+        _metrics.incr("shed_events_estimated", estimated)
+    print(f"[MITRE] ⚠️ Lag {lag:.0f}s > {LAG_SHED_SEC:.0f}s: skip ~{estimated} logs -> backfill, live jump to {jump}")
+    return jump
+
+
+def backfill_step() -> int:
+    """
+    Xử lý 1 page của range pending mới nhất (ưu tiên thấp: chỉ gọi khi live rảnh).
+    Return số log đã xử lý (0 = không có gì để backfill).
+    """
+    if LAG_SHED_SEC <= 0 or _lag_state["overloaded"]:
+        return 0
+
+    pending = next_pending_range()
+    if pending is None:
+        return 0
+
+    hits = fetch_logs(pending.get("cursor"), BACKFILL_PAGE_SIZE)
+    in_range = [hit for hit in hits if sort_key_before(hit.get("sort"), pending["end"])]
+
+    if in_range:
+        results = classify_batch([in_range])[0]
+        with _metrics.timer("backfill_page"):
+            save_page(in_range, results)
+        advance_range(pending["_id"], in_range[-1].get("sort"), len(in_range))
+        _metrics.incr("backfill_events", len(in_range))
+
+    # hết range (hit vượt end / hết log) -> done
+    if len(in_range) < len(hits) or len(hits) < BACKFILL_PAGE_SIZE:
+        finish_range(pending["_id"])
+        print(f"[MITRE] Backfill range {pending['_id']} done")
+
+    return len(in_range)
+
+
+def run_forever(search_after=None):
+    print(f"[MITRE] Worker started search_after={search_after}")
 
     while True:
         try:
-            hits = fetch_logs(search_after)
-            if not hits:
-                time.sleep(POLL_INTERVAL)
+            # model mới (registry) -> swap giữa 2 batch
+            maybe_reload_engine()
+
+            # quá tải -> bỏ qua backlog cũ (ghi range để backfill), classify log mới trước
+            search_after = maybe_shed(search_after)
+
+            if _batcher is not None:
+                hits, started_at = _batcher.collect(fetch_logs, search_after)
+                pages = split_pages(hits, max(1, INFERENCE_PROCESSES)) if hits else []
+            else:
+                pages = fetch_pages(search_after, max(1, INFERENCE_PROCESSES))
+                started_at = time.perf_counter()
+
+            if not pages:
+                # live đã bắt kịp -> dùng thời gian rảnh cho backfill
+                if not backfill_step():
+                    time.sleep(POLL_INTERVAL)
                 continue
 
+            n_logs = sum(len(hits) for hits in pages)
+
+            classify_start = time.perf_counter()
+            results_per_page = classify_batch(pages)
+            _metrics.observe("classify", time.perf_counter() - classify_start)
+
+            if _batcher is not None:
+                _batcher.observe(n_logs, started_at, time.perf_counter() - classify_start)
+
             # debug nhẹ
-            print(f"[MITRE] Got {len(hits)} logs")
-
-            for hit in hits:
-                sort_key = hit.get("sort")
-
-                try:
-                    meta = extract_metadata(hit)
-                    features = normalize_elastic_log(hit)
-                    mitre_result = engine.process_log(features)
-
-                    # ===== TÁCH processed vs mapped =====
-                    if mitre_result:
-                        mitre_doc = {
-                            "mitre_processed": True,
-                            "mitre_mapped": True,
-                            "tactic": mitre_result.get("tactic"),
-                            "technique": mitre_result.get("technique"),
-                            "confidence": mitre_result.get("confidence", 0),
-                            "tactic_confidence": mitre_result.get("tactic_confidence", 0),
-                            "technique_confidence": mitre_result.get("technique_confidence", 0),
-                        }
-                    else:
-                        # 🔥 LOG BENIGN / KHÔNG MAP
-                        mitre_doc = {
-                            "mitre_processed": True,
-                            "mitre_mapped": False,
-                            "tactic": None,
-                            "technique": None,
-                            "confidence": 0,
-                            "tactic_confidence": 0,
-                            "technique_confidence": 0,
-                        }
-
-                    save_mitre_result(meta, mitre_doc)
-
-                except Exception as e:
-                    print("[MITRE][EVENT ERROR]", e)
-
-                finally:
-                    # OFFSET LUÔN PHẢI ĐI
-                    if sort_key:
-                        set_mitre_offset(sort_key)
-
-            # advance local cursor too
-            search_after = hits[-1].get("sort")
-            time.sleep(0.05)
+            print(
+                f"[MITRE] Got {n_logs} logs ({len(pages)} pages)"
+                + (f" next_batch={_batcher.batch_size}" if _batcher is not None else "")
+            )
+
+            # lưu + commit offset theo đúng thứ tự page
+            for hits, results in zip(pages, results_per_page):
+                store_page(hits, results)
+
+                # advance local cursor chỉ khi page đã ghi xong
+                search_after = hits[-1].get("sort")
+
+            # batch chưa đầy (gần realtime) -> xen 1 page backfill
+            live_target = _batcher.batch_size if _batcher is not None else BATCH_SIZE * max(1, INFERENCE_PROCESSES)
+            if n_logs < live_target:
+                backfill_step()
+
+            # micro-batcher tự điều tiết nhịp fetch
+            if _batcher is None:
+                time.sleep(0.05)
 
         except Exception as e:
             print("[MITRE][ERROR]", e)
             time.sleep(POLL_INTERVAL)
 
 
-def start_worker():
-    run_forever()
+def start_worker(start_from: str = None, start_timestamp: str = None):
+    validate_lag_config()
+
+    # load model trong worker thread (không block Flask lúc start)
+    get_engine()
+
+    # ES / Mongo chưa sẵn sàng -> thử lại; cấu hình sai (ValueError) -> dừng
+    while True:
+        try:
+            ensure_mitre_indexes()
+            search_after = resolve_start_offset(start_from, start_timestamp)
+            break
+        except ValueError:
+            raise
+        except Exception as e:
+            print("[MITRE][START ERROR]", e)
+            time.sleep(1)
+
+    print(f"[MITRE] Start mode={start_from or START_FROM}")
+    run_forever(search_after)
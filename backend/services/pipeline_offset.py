@@ -1,17 +1,15 @@
 # services/pipeline_offset.py
 
 from datetime import datetime, timezone
-from pymongo import MongoClient
 from typing import Optional, List
-import config
+from core.db import get_db
 
 # =========================
-# DB INIT
+# DB INIT (lazy)
 # =========================
 
-client = MongoClient(config.MONGO_URI)
-db = client[config.MONGO_DB]
-col = db["pipeline_offsets"]
+def get_offset_collection():
+    return get_db()["pipeline_offsets"]
 
 # =========================
 # OFFSET IDS (RÕ RÀNG)
@@ -35,7 +33,7 @@ def set_offset(offset_id: str, sort_value: List):
     if not sort_value:
         return
 
-    col.update_one(
+    get_offset_collection().update_one(
         {"_id": offset_id},
         {
             "$set": {
@@ -48,7 +46,7 @@ def set_offset(offset_id: str, sort_value: List):
 
 
 def get_offset(offset_id: str) -> Optional[List]:
-    doc = col.find_one({"_id": offset_id})
+    doc = get_offset_collection().find_one({"_id": offset_id})
     return doc.get("sort") if doc else None
 
 # =========================